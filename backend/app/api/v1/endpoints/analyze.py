@@ -3,29 +3,263 @@ Analysis Endpoints
 Code and diagram security analysis endpoints
 """
 
+import asyncio
+import math
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
 import structlog
-from fastapi import APIRouter, File, UploadFile, HTTPException, status, Depends
-from fastapi.responses import JSONResponse
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Request, Response, status, Depends
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 
 from app.core.config import settings
+from app.core import metrics, offload
+from app.core.clients import bind_client_context, get_client_id
+from app.core.deadline import ClientDisconnected, DeadlineExceeded, run_with_deadline
+from app.core.rate_limit import (
+    RateLimitExceeded,
+    TokenCharge,
+    estimate_tokens,
+    rate_limiter
+)
 from app.schemas.analysis import (
     CodeAnalysisRequest,
     CodeAnalysisResponse,
+    CodeBatchRequest,
     DiagramAnalysisResponse
 )
-from app.services.code_analyzer import CodeAnalyzerService
+from app.services.code_analyzer import PROMPT_VERSION, CodeAnalyzerService
 from app.services.diagram_analyzer import DiagramAnalyzerService
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.inference_backend import InferenceError
+from app.services.prompts import CODE_ANALYSIS_PROMPT, DIAGRAM_ANALYSIS_PROMPT
+from app.services.analysis_store import analysis_store
+from app.services.dependency_index import get_dependency_index
+from app.services.report_writers import ReportWriter, report_format, report_writer
+from app.services.source_files import language_for, read_archive
+from app.services.usage_ledger import record_usage
 
 logger = structlog.get_logger(__name__)
 router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+
+
+def _wants_timings(request: Request) -> bool:
+    """Whether the client asked for per-stage timings in the response metadata"""
+    return request.headers.get(settings.DEBUG_TIMINGS_HEADER, "").lower() in ("1", "true", "yes")
+
+
+async def _acquire_tokens(request: Request, estimated_tokens: int) -> TokenCharge:
+    """Charge the estimated tokens to the client's bucket, or reject with 429"""
+    client = bind_client_context(request)
+    try:
+        return await rate_limiter.acquire(client.client_id, client.client_class, estimated_tokens)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Analysis rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+
+
+def _generated_tokens(metadata: Dict[str, Any]) -> int:
+    """Prompt plus completion tokens an analysis actually used"""
+    generation = metadata.get("generation")
+    if generation is None:
+        return 0
+    return generation["prompt_tokens"] + generation["completion_tokens"]
+
+
+def _etag(analysis_id: str) -> str:
+    """Strong validator of an analysis result: stored results never change"""
+    return f'"{analysis_id}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match lists the ETag (weak comparison, as RFC 9110 requires)"""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+async def _stored_result(request: Request, analysis_id: str) -> Response:
+    """
+    A stored result with its ETag, or 304 if the client already holds it
+
+    The analysis must exist before If-None-Match is evaluated, so "*" never
+    turns a missing ID into a 304. Revalidations only check the primary key;
+    the result itself is read when it is sent.
+    """
+    etag = _etag(analysis_id)
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Analysis {analysis_id} not found"
+    )
+    if request.headers.get("if-none-match") is not None:
+        if not await analysis_store.has_result(analysis_id):
+            raise not_found
+        if _etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    result = await analysis_store.get_result(analysis_id)
+    if result is None:
+        raise not_found
+    return ORJSONResponse(result, headers={"ETag": etag})
+
+
+def _store_unavailable(e: Exception) -> HTTPException:
+    logger.error("Failed to read stored analyses", error=str(e))
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Stored analyses unavailable"
+    )
+
+
+async def _run_analysis(
+    request: Request,
+    analyzer: str,
+    work: Awaitable[Dict[str, Any]],
+    timeout: float,
+    charge: TokenCharge
+) -> Dict[str, Any]:
+    """
+    Run an analysis under its deadline and settle its token charge
+
+    Analyses cut short by the deadline or a disconnect keep their estimated
+    charge: the GPU worked on them until they were cancelled.
+    """
+    try:
+        result = await run_with_deadline(request, work, timeout)
+    except DeadlineExceeded:
+        metrics.ANALYSES_ABORTED.labels(analyzer, "deadline").inc()
+        logger.warning("Analysis deadline exceeded", analyzer=analyzer, timeout=timeout)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Analysis did not complete within {timeout} seconds"
+        )
+    except ClientDisconnected:
+        metrics.ANALYSES_ABORTED.labels(analyzer, "disconnect").inc()
+        logger.info("Client disconnected, analysis cancelled", analyzer=analyzer)
+        # Nobody reads the response; 499 (client closed request) is for the access log
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except CircuitOpenError as e:
+        await charge.settle(0)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except InferenceError as e:
+        await charge.settle(0)
+        # Transient failures outlasted the retries: the backend is unavailable
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE if e.retryable else status.HTTP_502_BAD_GATEWAY,
+            detail=f"Inference backend error: {e}"
+        )
+    except Exception:
+        await charge.settle(0)
+        raise
+
+    await charge.settle(_generated_tokens(result["metadata"]))
+    return result
+
+
+def _single_file_report(report: str, path: str, result: Dict[str, Any]) -> Response:
+    """One analysis as a SARIF or JSON Lines report"""
+    writer = report_writer(report)
+    body = writer.start() + writer.add(path, result) + writer.finish()
+    return Response(body, media_type=writer.media_type, headers={"Vary": "Accept"})
+
+
+async def _report_stream(
+    request: Request,
+    files: List[Tuple[str, str, str]],
+    writer: ReportWriter,
+    charge: TokenCharge
+) -> AsyncIterator[bytes]:
+    """
+    Analyze files BATCH_CONCURRENCY at a time, writing each to the report as it completes
+
+    A file that fails or outlasts CODE_ANALYSIS_TIMEOUT is reported as an
+    error and the others go on. If the client disconnects, the analyses
+    still running are cancelled and the estimated charge stays.
+    """
+    client_id = get_client_id(request)
+    analyzer = CodeAnalyzerService()
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    include_timings = _wants_timings(request)
+
+    async def analyze(path: str, code: str, language: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await asyncio.wait_for(
+                analyzer.analyze(code=code, language=language, filename=path, include_timings=include_timings),
+                settings.CODE_ANALYSIS_TIMEOUT
+            )
+
+    tasks = {asyncio.ensure_future(analyze(*file)): file[0] for file in files}
+    pending = set(tasks)
+    generated = 0
+    completed = False
+    try:
+        yield writer.start()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                path = tasks[task]
+                try:
+                    result = task.result()
+                except asyncio.TimeoutError:
+                    metrics.ANALYSES_ABORTED.labels("code", "deadline").inc()
+                    chunk = writer.add_error(
+                        path, f"Analysis did not complete within {settings.CODE_ANALYSIS_TIMEOUT} seconds"
+                    )
+                except Exception as e:
+                    logger.warning("Batch file analysis failed", path=path, error=str(e))
+                    chunk = writer.add_error(path, str(e) or type(e).__name__)
+                else:
+                    generated += _generated_tokens(result["metadata"])
+                    await record_usage(client_id, result["metadata"])
+                    analysis_store.submit("code", client_id, result)
+                    chunk = writer.add(path, result)
+                if chunk:
+                    yield chunk
+        yield writer.finish()
+        completed = True
+        logger.info("Batch analysis completed", **writer.summary.to_dict())
+    finally:
+        if completed:
+            await charge.settle(generated)
+        elif pending:
+            metrics.ANALYSES_ABORTED.labels("code", "disconnect").inc(len(pending))
+            logger.info("Client disconnected, batch analysis cancelled", remaining=len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _streamed_report(request: Request, files: List[Tuple[str, str, str]]) -> StreamingResponse:
+    """
+    Charge a batch of (path, code, language) and stream its report
+
+    The report is SARIF if the Accept header asks for it, JSON Lines otherwise.
+    """
+    writer = report_writer(report_format(request.headers.get("accept")) or "jsonl")
+    charge = await _acquire_tokens(
+        request,
+        sum(estimate_tokens(len(CODE_ANALYSIS_PROMPT) + len(code)) for _, code, _ in files)
+    )
+    logger.info("Batch analysis requested", files=len(files), media_type=writer.media_type)
+    return StreamingResponse(
+        _report_stream(request, files, writer, charge),
+        media_type=writer.media_type,
+        headers={"Vary": "Accept"}
+    )
 
 
 @router.post("/code", response_model=CodeAnalysisResponse)
-@limiter.limit(settings.ANALYSIS_RATE_LIMIT)
-async def analyze_code(request: CodeAnalysisRequest):
+async def analyze_code(request: Request, response: Response, payload: CodeAnalysisRequest):
     """
     Analyze code for security vulnerabilities
 
@@ -36,29 +270,45 @@ async def analyze_code(request: CodeAnalysisRequest):
     - Dependency vulnerabilities
     - Code quality issues
 
-    **Rate Limit:** 10 requests per hour
+    **Rate Limit:** token bucket per client (X-API-Key, else the address) and
+    its configured class, charged the estimated prompt and completion tokens
+
+    **Reports:** Accept: application/sarif+json returns a SARIF 2.1.0 log,
+    application/x-ndjson a JSON Lines report, instead of the JSON result
     """
     try:
         logger.info(
             "Code analysis requested",
-            language=request.language,
-            code_length=len(request.code)
+            language=payload.language,
+            code_length=len(payload.code)
         )
 
         # Validate code length
-        lines = request.code.count('\n') + 1
+        lines = payload.code.count('\n') + 1
         if lines > settings.CODE_MAX_LINES:
             raise HTTPException(
                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
                 detail=f"Code exceeds maximum {settings.CODE_MAX_LINES} lines"
             )
 
+        charge = await _acquire_tokens(
+            request,
+            estimate_tokens(len(CODE_ANALYSIS_PROMPT) + len(payload.code))
+        )
+
         # Perform analysis
         analyzer = CodeAnalyzerService()
-        result = await analyzer.analyze(
-            code=request.code,
-            language=request.language,
-            filename=request.filename
+        result = await _run_analysis(
+            request,
+            "code",
+            analyzer.analyze(
+                code=payload.code,
+                language=payload.language,
+                filename=payload.filename,
+                include_timings=_wants_timings(request)
+            ),
+            settings.CODE_ANALYSIS_TIMEOUT,
+            charge
         )
 
         logger.info(
@@ -66,6 +316,13 @@ async def analyze_code(request: CodeAnalysisRequest):
             vulnerabilities=len(result.get("vulnerabilities", [])),
             severity_summary=result.get("summary")
         )
+        await record_usage(get_client_id(request), result["metadata"])
+        analysis_store.submit("code", get_client_id(request), result)
+
+        report = report_format(request.headers.get("accept"))
+        if report is not None:
+            return _single_file_report(report, payload.filename or "code", result)
+        response.headers["ETag"] = _etag(result["analysis_id"])
 
         return result
 
@@ -80,8 +337,7 @@ async def analyze_code(request: CodeAnalysisRequest):
 
 
 @router.post("/diagram", response_model=DiagramAnalysisResponse)
-@limiter.limit(settings.ANALYSIS_RATE_LIMIT)
-async def analyze_diagram(file: UploadFile = File(...)):
+async def analyze_diagram(request: Request, response: Response, file: UploadFile = File(...)):
     """
     Analyze architecture diagram for security issues
 
@@ -92,7 +348,7 @@ async def analyze_diagram(file: UploadFile = File(...)):
     - Secure-by-Design proposals
     - Compliance gaps
 
-    **Rate Limit:** 10 requests per hour
+    **Rate Limit:** token bucket per client and client class, as for code
     **Max File Size:** 50MB
     """
     try:
@@ -109,11 +365,17 @@ async def analyze_diagram(file: UploadFile = File(...)):
                 detail=f"Unsupported file type: {file.content_type}"
             )
 
+        charge = await _acquire_tokens(
+            request,
+            estimate_tokens(len(DIAGRAM_ANALYSIS_PROMPT)) + settings.RATE_LIMIT_IMAGE_TOKENS
+        )
+
         # Read file
         file_content = await file.read()
 
         # Validate file size
         if len(file_content) > settings.MAX_UPLOAD_SIZE:
+            await charge.settle(0)
             raise HTTPException(
                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
                 detail=f"File size exceeds maximum {settings.MAX_UPLOAD_SIZE} bytes"
@@ -121,10 +383,18 @@ async def analyze_diagram(file: UploadFile = File(...)):
 
         # Perform analysis
         analyzer = DiagramAnalyzerService()
-        result = await analyzer.analyze(
-            file_content=file_content,
-            filename=file.filename,
-            content_type=file.content_type
+        result = await _run_analysis(
+            request,
+            "diagram",
+            analyzer.analyze(
+                file_content=file_content,
+                filename=file.filename,
+                content_type=file.content_type,
+                include_timings=_wants_timings(request),
+                client_id=get_client_id(request)
+            ),
+            settings.DIAGRAM_ANALYSIS_TIMEOUT,
+            charge
         )
 
         logger.info(
@@ -132,6 +402,9 @@ async def analyze_diagram(file: UploadFile = File(...)):
             components=len(result.get("components", [])),
             weaknesses=len(result.get("weaknesses", []))
         )
+        await record_usage(get_client_id(request), result["metadata"])
+        analysis_store.submit("diagram", get_client_id(request), result)
+        response.headers["ETag"] = _etag(result["analysis_id"])
 
         return result
 
@@ -145,6 +418,134 @@ async def analyze_diagram(file: UploadFile = File(...)):
         )
 
 
+@router.post("/batch")
+async def analyze_batch(request: Request, payload: CodeBatchRequest):
+    """
+    Analyze several files, streaming the report as each file completes
+
+    Files are analyzed BATCH_CONCURRENCY at a time. Send Accept:
+    application/sarif+json for a SARIF 2.1.0 log (for code scanning
+    uploads); otherwise the report is JSON Lines: a line per file, then a
+    summary line. A file that fails is reported as an error; the status
+    stays 200 once the report has started.
+
+    **Rate Limit:** charged the estimate for all files up front
+    """
+    if len(payload.files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds maximum {settings.BATCH_MAX_FILES} files"
+        )
+    files = []
+    for number, file in enumerate(payload.files, 1):
+        path = file.filename or f"file-{number}"
+        if file.code.count('\n') + 1 > settings.CODE_MAX_LINES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"{path} exceeds maximum {settings.CODE_MAX_LINES} lines"
+            )
+        files.append((path, file.code, file.language))
+    return await _streamed_report(request, files)
+
+
+@router.post("/archive")
+async def analyze_archive(request: Request, file: UploadFile = File(...)):
+    """
+    Analyze the source files of a zip or tar(.gz, .bz2, .xz) archive, streaming the report
+
+    Files with an extension in ALLOWED_CODE_EXTENSIONS are analyzed, and
+    dependency manifests when a dependency index is installed; binary,
+    empty and oversized files are left out. The report is as for /batch.
+
+    **Max File Size:** MAX_UPLOAD_SIZE for the archive, REQUEST_DECOMPRESSED_MAX_SIZE for its source files
+    """
+    data = await file.read()
+    if len(data) > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum {settings.MAX_UPLOAD_SIZE} bytes"
+        )
+
+    include_manifests = settings.ENABLE_DEPENDENCY_SCANNING and get_dependency_index() is not None
+    try:
+        sources, skipped = await offload.run(
+            "archive",
+            read_archive,
+            data,
+            include_manifests,
+            settings.BATCH_MAX_FILES,
+            settings.REQUEST_DECOMPRESSED_MAX_SIZE,
+            settings.ARCHIVE_MAX_ENTRIES,
+            settings.ARCHIVE_MAX_EXPANDED_SIZE,
+            # Small archives can still expand a lot: always off the loop
+            size=max(len(data), settings.OFFLOAD_MIN_BYTES)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not sources:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Archive holds no source files")
+
+    logger.info("Archive read", filename=file.filename, files=len(sources), skipped=len(skipped))
+    return await _streamed_report(request, [(path, code, language_for(path)) for path, code in sources])
+
+
+@router.get("/code/{code_hash}", response_model=CodeAnalysisResponse)
+async def lookup_code_analysis(
+    request: Request,
+    code_hash: str,
+    language: str = Query(..., min_length=1, max_length=50),
+    model: Optional[str] = Query(None, max_length=100)
+):
+    """
+    Stored analysis of unchanged code, without uploading it
+
+    Hash the code as the server does (SHA-256 of its UTF-8 bytes, hex, as in
+    metadata.code_hash) and look it up here first; upload it to POST /code
+    only on 404. model defaults to the configured code model; only analyses
+    made with the current prompts are returned, and dependency manifests
+    match whatever the model. Send the ETag of a result already held in
+    If-None-Match to get 304 instead of the body.
+    """
+    code_hash = code_hash.lower()
+    if not settings.ANALYSIS_STORE_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analyses are not stored")
+
+    try:
+        analysis_id = await analysis_store.find_code_analysis(
+            code_hash, language.lower().strip(), model or settings.OLLAMA_MODEL_CODE, PROMPT_VERSION
+        )
+        if analysis_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No stored analysis of code hash {code_hash}"
+            )
+        return await _stored_result(request, analysis_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _store_unavailable(e)
+
+
+@router.get("/results/{analysis_id}")
+async def get_analysis_result(request: Request, analysis_id: str):
+    """
+    Stored result of a code or diagram analysis, with If-None-Match support
+    """
+    try:
+        analysis_id = str(uuid.UUID(analysis_id))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Analysis {analysis_id} not found")
+    if not settings.ANALYSIS_STORE_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Analyses are not stored")
+
+    try:
+        return await _stored_result(request, analysis_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _store_unavailable(e)
+
+
 @router.get("/status/{analysis_id}")
 async def get_analysis_status(analysis_id: str):
     """
@@ -0,0 +1,76 @@
+"""
+Findings Endpoints
+Organization-wide history of stored findings, served from daily rollups
+"""
+
+from typing import Optional
+
+import structlog
+from fastapi import APIRouter, HTTPException, Query, status
+
+from app.services import findings_history
+
+logger = structlog.get_logger(__name__)
+router = APIRouter()
+
+ANALYZER_PATTERN = "^(code|diagram)$"
+
+
+def _unavailable(error: Exception) -> HTTPException:
+    logger.error("Failed to read findings history", error=str(error))
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Findings history unavailable"
+    )
+
+
+@router.get("/top-cwes")
+async def top_cwes(
+    days: int = Query(7, ge=1, le=366),
+    limit: int = Query(10, ge=1, le=100),
+    analyzer: Optional[str] = Query(None, pattern=ANALYZER_PATTERN)
+):
+    """
+    Most frequent CWE / vulnerability IDs over the last days (7: this week)
+    """
+    try:
+        rules = await findings_history.top_rules(days, limit, analyzer)
+    except Exception as e:
+        raise _unavailable(e)
+    return {"days": days, "cwes": rules}
+
+
+@router.get("/trends")
+async def severity_trends(
+    days: int = Query(30, ge=1, le=366),
+    analyzer: Optional[str] = Query(None, pattern=ANALYZER_PATTERN),
+    language: Optional[str] = Query(None, max_length=50)
+):
+    """
+    Analyses and findings per severity, per day and language
+    """
+    try:
+        points = await findings_history.severity_trends(
+            days, analyzer, language.lower().strip() if language else None
+        )
+    except Exception as e:
+        raise _unavailable(e)
+    return {"days": days, "trends": points}
+
+
+@router.get("/by-hash/{code_hash}")
+async def findings_by_code_hash(code_hash: str, limit: int = Query(20, ge=1, le=100)):
+    """
+    Stored analyses of a code hash (metadata.code_hash) and their findings, newest first
+    """
+    try:
+        analyses = await findings_history.findings_by_code_hash(code_hash.lower(), limit)
+    except Exception as e:
+        raise _unavailable(e)
+
+    if not analyses:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No analyses stored for code hash {code_hash}"
+        )
+    return {"code_hash": code_hash.lower(), "analyses": analyses}
@@ -0,0 +1,68 @@
+"""
+Usage Endpoints
+Per-client token and GPU-time totals
+
+Callers see their own totals only (as identified by core.clients), unless
+their client ID is one of USAGE_ADMIN_CLIENTS.
+"""
+
+import structlog
+from fastapi import APIRouter, HTTPException, Request, status
+
+from app.core.clients import get_client_id
+from app.core.config import settings
+from app.services.usage_ledger import usage_ledger
+
+logger = structlog.get_logger(__name__)
+router = APIRouter()
+
+
+def _unavailable(e: Exception) -> HTTPException:
+    logger.error("Failed to read usage", error=str(e))
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Usage data unavailable"
+    )
+
+
+@router.get("")
+async def list_usage(request: Request):
+    """
+    Usage totals of every client for usage admins, of the caller otherwise
+
+    GPU-seconds count prompt evaluation and generation time; model load time
+    is reported separately as load_seconds.
+    """
+    caller = get_client_id(request)
+    try:
+        if caller in settings.USAGE_ADMIN_CLIENTS:
+            return {"clients": await usage_ledger.all()}
+        usage = await usage_ledger.get(caller)
+    except Exception as e:
+        raise _unavailable(e)
+    return {"clients": {caller: usage} if usage is not None else {}}
+
+
+@router.get("/{client_id}")
+async def get_usage(request: Request, client_id: str):
+    """
+    Usage totals of one client: the caller's own, or any for usage admins
+    """
+    caller = get_client_id(request)
+    if client_id != caller and caller not in settings.USAGE_ADMIN_CLIENTS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Usage of other clients is only visible to usage admins"
+        )
+
+    try:
+        usage = await usage_ledger.get(client_id)
+    except Exception as e:
+        raise _unavailable(e)
+
+    if usage is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No usage recorded for client {client_id}"
+        )
+    return {"client_id": client_id, **usage}
@@ -4,7 +4,7 @@ Central router for all v1 endpoints
 """
 
 from fastapi import APIRouter
-from app.api.v1.endpoints import analyze
+from app.api.v1.endpoints import analyze, findings, usage
 
 api_router = APIRouter()
 
@@ -14,6 +14,16 @@ api_router.include_router(
     prefix="/analyze",
     tags=["Analysis"]
 )
+api_router.include_router(
+    findings.router,
+    prefix="/findings",
+    tags=["Findings"]
+)
+api_router.include_router(
+    usage.router,
+    prefix="/usage",
+    tags=["Usage"]
+)
 
 # Health check for API v1
 @api_router.get("/health", tags=["Health"])
@@ -0,0 +1,204 @@
+"""
+ShadowScan command line
+
+Usage:
+    python -m app.cli scan ./repo --fail-on high
+    python -m app.cli scan . --format sarif -o shadowscan.sarif
+    python -m app.cli osv-index ./osv/PyPI.zip ./osv/npm.zip -o ./storage/osv.idx
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from app.core.config import settings
+
+
+FAIL_ON = ("critical", "high", "medium", "low", "info")
+
+
+def _configure_logging(verbose: bool):
+    """Log to stderr, warnings only unless --verbose"""
+    import structlog
+
+    structlog.configure(
+        processors=[
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.dev.ConsoleRenderer(colors=False)
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(
+            logging.getLevelName(settings.LOG_LEVEL) if verbose else logging.WARNING
+        ),
+        logger_factory=structlog.PrintLoggerFactory(sys.stderr)
+    )
+
+
+def _print_file(file_result):
+    if file_result.skipped is not None:
+        line = f"{file_result.path}: skipped ({file_result.skipped})"
+    elif file_result.error is not None:
+        line = f"{file_result.path}: failed ({file_result.error})"
+    else:
+        summary = file_result.result.get("summary", {})
+        counts = ", ".join(f"{summary[s]} {s}" for s in FAIL_ON if summary.get(s))
+        line = f"{file_result.path}: {summary.get('total_issues', 0)} issues" + (f" ({counts})" if counts else "")
+        dependencies = file_result.result.get("dependencies", [])
+        if dependencies:
+            line += f", {len(dependencies)} vulnerable dependencies"
+        if file_result.cached:
+            line += " [cached]"
+    print(line, flush=True)
+
+
+class _ReportOutput:
+    """Writes each file's part of a report as soon as the file completes"""
+
+    def __init__(self, writer, stream):
+        self.writer = writer
+        self.stream = stream
+        self._write(writer.start())
+
+    def _write(self, chunk: bytes):
+        if chunk:
+            self.stream.write(chunk)
+            self.stream.flush()
+
+    def __call__(self, file_result):
+        if file_result.skipped is not None:
+            return
+        if file_result.error is not None:
+            self._write(self.writer.add_error(file_result.path, file_result.error))
+        else:
+            self._write(self.writer.add(file_result.path, file_result.result))
+
+    def finish(self):
+        self._write(self.writer.finish())
+
+
+async def _scan(args: argparse.Namespace, on_result):
+    from app.cli.scan import Scanner, default_concurrency
+    from app.cli.scan_cache import ScanCache
+
+    cache = None if args.no_cache else ScanCache(args.cache)
+    scanner = Scanner(
+        args.path,
+        concurrency=args.concurrency or default_concurrency(),
+        cache=cache,
+        use_gitignore=not args.no_gitignore
+    )
+    try:
+        return await scanner.run(on_result)
+    finally:
+        await scanner.close()
+
+
+def scan(args: argparse.Namespace) -> int:
+    """
+    Analyze a directory tree without the API
+
+    Exit status: 0 clean, 1 findings at or above --fail-on, 2 files that
+    could not be analyzed.
+    """
+    if not os.path.isdir(args.path):
+        print(f"{args.path}: not a directory", file=sys.stderr)
+        return 2
+
+    if args.format == "text":
+        summary = asyncio.run(_scan(args, _print_file))
+        summary_stream = sys.stdout
+    else:
+        from app.services.report_writers import report_writer
+
+        stream = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            output = _ReportOutput(report_writer(args.format), stream)
+            summary = asyncio.run(_scan(args, output))
+            output.finish()
+        finally:
+            if args.output:
+                stream.close()
+        # Keep stdout a valid report
+        summary_stream = sys.stdout if args.output else sys.stderr
+
+    findings = ", ".join(f"{summary.findings[s]} {s}" for s in FAIL_ON)
+    print(
+        f"{summary.files} files: {summary.analyzed} analyzed, {summary.cached} cached, "
+        f"{summary.skipped} skipped, {summary.failed} failed; findings: {findings}; "
+        f"vulnerable dependencies: {summary.vulnerable_dependencies}",
+        file=summary_stream
+    )
+    if summary.failed:
+        return 2
+    if args.fail_on:
+        threshold = FAIL_ON[:FAIL_ON.index(args.fail_on) + 1]
+        if any(summary.findings[s] for s in threshold):
+            return 1
+    return 0
+
+
+def osv_index(args: argparse.Namespace) -> int:
+    """Build the offline dependency index from OSV exports"""
+    from app.services.dependency_index import build_index
+
+    counts = build_index(args.sources, args.output)
+    print(
+        f"{args.output}: {counts['advisories']} advisories, "
+        f"{counts['packages']} packages, {counts['ranges']} ranges"
+    )
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="ShadowScan command line")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser(
+        "scan",
+        help="Analyze a directory tree in-process",
+        description="Analyze the code files of a directory tree (ALLOWED_CODE_EXTENSIONS, honouring "
+                    ".gitignore) with the configured inference backend. Results are cached by file "
+                    "content, model and prompt version, so repeat runs only analyze changed files."
+    )
+    scan_parser.add_argument("path", help="Directory to scan")
+    scan_parser.add_argument(
+        "-j", "--concurrency", type=int, default=0,
+        help="Files analyzed at once (default: MODEL_SCHEDULER_MAX_CONCURRENCY, "
+             "or OPENAI_COMPAT_MAX_CONCURRENCY with INFERENCE_BACKEND=openai)"
+    )
+    scan_parser.add_argument("--cache", default=settings.SCAN_CACHE_PATH, help="Cache file (default: SCAN_CACHE_PATH)")
+    scan_parser.add_argument("--no-cache", action="store_true", help="Analyze every file, store nothing")
+    scan_parser.add_argument("--no-gitignore", action="store_true", help="Also scan files .gitignore excludes")
+    scan_parser.add_argument(
+        "-f", "--format", choices=("text", "jsonl", "sarif"), default="text",
+        help="text: a line per file; jsonl: JSON Lines; sarif: SARIF 2.1.0 for code scanning uploads"
+    )
+    scan_parser.add_argument("-o", "--output", help="Report file (default: standard output)")
+    scan_parser.add_argument(
+        "--fail-on", choices=FAIL_ON, help="Exit with status 1 on findings of this severity or above"
+    )
+    scan_parser.add_argument("-v", "--verbose", action="store_true", help="Log at LOG_LEVEL instead of warnings only")
+    scan_parser.set_defaults(handler=scan)
+
+    index_parser = commands.add_parser(
+        "osv-index",
+        help="Build the dependency index from OSV advisories",
+        description="Build the dependency index from OSV JSON files, directories or zip exports "
+                    "(https://osv-vulnerabilities.storage.googleapis.com/<ecosystem>/all.zip)"
+    )
+    index_parser.add_argument("sources", nargs="+", help="OSV JSON files, directories or zip archives")
+    index_parser.add_argument(
+        "-o", "--output", default=settings.DEPENDENCY_INDEX_PATH,
+        help="Index file to write (default: DEPENDENCY_INDEX_PATH)"
+    )
+    index_parser.set_defaults(handler=osv_index)
+
+    args = parser.parse_args(argv)
+    _configure_logging(getattr(args, "verbose", False))
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
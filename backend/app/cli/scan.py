@@ -0,0 +1,171 @@
+"""
+Headless Scanner
+Analyze a source tree in-process with CodeAnalyzerService, reusing cached results of unchanged files
+"""
+
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import structlog
+
+from app.cli.scan_cache import ScanCache
+from app.cli.walk import walk
+from app.core import offload
+from app.core.config import settings
+from app.services.code_analyzer import ANALYZER_VERSION, PROMPT_VERSION, CodeAnalyzerService
+from app.services.dependency_index import get_dependency_index
+from app.services.dependency_manifests import manifest_parser
+from app.services.source_files import MAX_SOURCE_BYTES, SourceSkipped, decode_source, is_source_file, language_for
+
+logger = structlog.get_logger(__name__)
+
+SEVERITIES = ("critical", "high", "medium", "low", "info")
+
+
+@dataclass
+class FileResult:
+    """Outcome of one file: a result (analyzed or cached), a skip reason or an error"""
+    path: str
+    language: str
+    result: Optional[Dict[str, Any]] = None
+    cached: bool = False
+    skipped: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ScanSummary:
+    """Counts over the files scanned so far"""
+    files: int = 0
+    analyzed: int = 0
+    cached: int = 0
+    skipped: int = 0
+    failed: int = 0
+    findings: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(SEVERITIES, 0))
+    vulnerable_dependencies: int = 0
+
+    def add(self, file_result: FileResult):
+        self.files += 1
+        if file_result.skipped is not None:
+            self.skipped += 1
+        elif file_result.error is not None:
+            self.failed += 1
+        else:
+            if file_result.cached:
+                self.cached += 1
+            else:
+                self.analyzed += 1
+            summary = file_result.result.get("summary", {})
+            for severity in SEVERITIES:
+                self.findings[severity] += summary.get(severity, 0)
+            self.vulnerable_dependencies += len(file_result.result.get("dependencies", []))
+
+
+def _read_source(path: str) -> Tuple[str, str]:
+    """(text, sha256 of the bytes) of a file the API would accept"""
+    with open(path, "rb") as file:
+        data = file.read(MAX_SOURCE_BYTES + 1)
+    return decode_source(data), hashlib.sha256(data).hexdigest()
+
+
+def default_concurrency() -> int:
+    """Calls the configured backend runs at once"""
+    if settings.INFERENCE_BACKEND == "openai":
+        return settings.OPENAI_COMPAT_MAX_CONCURRENCY
+    return settings.MODEL_SCHEDULER_MAX_CONCURRENCY
+
+
+class Scanner:
+    """
+    Scan the code files of a directory tree
+
+    Files are listed by a parallel walk (ALLOWED_CODE_EXTENSIONS, plus
+    dependency manifests when a dependency index is installed), then
+    analyzed by `concurrency` workers, so no more calls than that are in
+    flight against the inference backend.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        concurrency: int,
+        cache: Optional[ScanCache] = None,
+        use_gitignore: bool = True
+    ):
+        self.root = root
+        self.concurrency = max(concurrency, 1)
+        self.cache = cache
+        self.use_gitignore = use_gitignore
+        self.scan_manifests = settings.ENABLE_DEPENDENCY_SCANNING and get_dependency_index() is not None
+        self.analyzer = CodeAnalyzerService()
+        # Cached results are only reused from the same model, analyzer and prompts
+        self.cache_model = f"{self.analyzer.llm.name}:{self.analyzer.llm.model}"
+        self.cache_version = f"{ANALYZER_VERSION}:{PROMPT_VERSION}"
+
+    def _include(self, path: str) -> bool:
+        return is_source_file(path, self.scan_manifests)
+
+    def files(self) -> List[str]:
+        """Paths to scan, relative to the root"""
+        return sorted(walk(self.root, self._include, self.use_gitignore))
+
+    async def run(self, on_result: Callable[[FileResult], None]) -> ScanSummary:
+        """
+        Scan every file
+
+        Args:
+            on_result: Called with each file's outcome as it completes
+
+        Returns:
+            Counts over all files
+        """
+        paths = await asyncio.to_thread(self.files)
+        logger.info("Scanning", root=self.root, files=len(paths), concurrency=self.concurrency)
+        summary = ScanSummary()
+        remaining = iter(paths)
+
+        async def worker():
+            # Workers share the iterator; each takes the next path when it is free
+            for path in remaining:
+                file_result = await self._scan_file(path)
+                summary.add(file_result)
+                on_result(file_result)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(paths)))))
+        return summary
+
+    async def _scan_file(self, path: str) -> FileResult:
+        language = language_for(path)
+        try:
+            code, file_hash = await asyncio.to_thread(_read_source, os.path.join(self.root, path))
+        except SourceSkipped as e:
+            return FileResult(path, language, skipped=str(e))
+        except OSError as e:
+            return FileResult(path, language, error=str(e))
+
+        # Manifest results follow the dependency index, not the file alone
+        cache = None if manifest_parser(path) is not None else self.cache
+        if cache is not None:
+            cached = cache.get(file_hash, language, self.cache_model, self.cache_version)
+            if cached is not None:
+                cached["metadata"]["cache_hit"] = True
+                return FileResult(path, language, result=cached, cached=True)
+
+        try:
+            result = await self.analyzer.analyze(code, language, path)
+        except Exception as e:
+            logger.warning("File analysis failed", path=path, error=str(e))
+            return FileResult(path, language, error=str(e) or type(e).__name__)
+
+        if cache is not None:
+            cache.put(file_hash, language, self.cache_model, self.cache_version, result)
+        return FileResult(path, language, result=result)
+
+    async def close(self):
+        await self.analyzer.llm.close()
+        if self.cache is not None:
+            self.cache.close()
+        offload.shutdown_pools()
@@ -0,0 +1,75 @@
+"""
+Scan Cache
+On-disk results of earlier scans, so repeat runs only analyze changed files
+"""
+
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    file_hash TEXT NOT NULL,
+    language TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    result BLOB NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (file_hash, language, model, prompt_version)
+) WITHOUT ROWID
+"""
+
+
+class ScanCache:
+    """
+    SQLite table of analysis results keyed by file content hash, language, model and prompt version
+
+    The file path is not part of the key: a file that is moved, or copied
+    elsewhere in the tree, is not analyzed again. Keep the file in the CI
+    cache (actions/cache, GitLab cache:) between runs.
+    """
+
+    def __init__(self, path: str, max_age_days: float = 30.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(SCHEMA)
+        # Drop what no run has used for a while
+        self.connection.execute("DELETE FROM results WHERE used_at < ?", (time.time() - max_age_days * 86400,))
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_hash: str, language: str, model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        key = (file_hash, language, model, prompt_version)
+        row = self.connection.execute(
+            "SELECT result FROM results WHERE file_hash = ? AND language = ? AND model = ? AND prompt_version = ?",
+            key
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute(
+            "UPDATE results SET used_at = ? WHERE file_hash = ? AND language = ? AND model = ? AND prompt_version = ?",
+            (time.time(), *key)
+        )
+        return orjson.loads(row[0])
+
+    def put(self, file_hash: str, language: str, model: str, prompt_version: str, result: Dict[str, Any]):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            (file_hash, language, model, prompt_version, orjson.dumps(result), time.time())
+        )
+        # Committed per result, so an interrupted run keeps what it analyzed
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,176 @@
+"""
+Source Tree Walk
+Parallel directory walk that honours .gitignore files
+"""
+
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Pattern, Tuple
+
+# Never descended into, ignored or not
+SKIPPED_DIRECTORIES = {".git", ".hg", ".svn"}
+
+
+@dataclass
+class IgnoreRule:
+    """One .gitignore pattern, matched against paths relative to its file's directory"""
+    base: str  # Directory of the .gitignore, relative to the walk root ("" for the root)
+    regex: Pattern[str]
+    negated: bool
+    directory_only: bool
+
+    def matches(self, path: str, is_directory: bool) -> bool:
+        if self.directory_only and not is_directory:
+            return False
+        if self.base:
+            if not path.startswith(self.base + "/"):
+                return False
+            path = path[len(self.base) + 1:]
+        return self.regex.fullmatch(path) is not None
+
+
+def _translate_segment(segment: str) -> str:
+    """Glob segment to regex: * and ? stop at slashes, [...] classes, backslash escapes"""
+    out = []
+    i = 0
+    while i < len(segment):
+        char = segment[i]
+        if char == "\\" and i + 1 < len(segment):
+            out.append(re.escape(segment[i + 1]))
+            i += 2
+            continue
+        if char == "*":
+            out.append("[^/]*")
+        elif char == "?":
+            out.append("[^/]")
+        elif char == "[":
+            end = segment.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape(char))
+            else:
+                body = segment[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            out.append(re.escape(char))
+        i += 1
+    return "".join(out)
+
+
+def parse_gitignore(text: str, base: str) -> List[IgnoreRule]:
+    """
+    Rules of one .gitignore file
+
+    Args:
+        text: File contents
+        base: Directory of the file, relative to the walk root
+    """
+    rules = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        # Trailing spaces are ignored unless escaped
+        line = re.sub(r"(?<!\\) +$", "", line)
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:] if line[1:2] in ("#", "!") else line
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+
+        # A slash at the start or in the middle anchors the pattern to the file's directory
+        anchored = "/" in line
+        segments = line.lstrip("/").split("/")
+        parts = []
+        for index, segment in enumerate(segments):
+            last = index == len(segments) - 1
+            if segment == "**":
+                parts.append(".*" if last else "(?:.*/)?")
+            else:
+                parts.append(_translate_segment(segment) + ("" if last else "/"))
+        pattern = "".join(parts)
+        if not anchored:
+            pattern = "(?:.*/)?" + pattern
+        rules.append(IgnoreRule(base, re.compile(pattern, re.DOTALL), negated, directory_only))
+    return rules
+
+
+def is_ignored(rules: List[IgnoreRule], path: str, is_directory: bool) -> bool:
+    """The last matching rule decides; rules of deeper .gitignore files come later"""
+    ignored = False
+    for rule in rules:
+        if rule.matches(path, is_directory):
+            ignored = not rule.negated
+    return ignored
+
+
+def _scan_directory(
+    root: str,
+    relative: str,
+    rules: List[IgnoreRule],
+    use_gitignore: bool
+) -> Tuple[List[str], List[str], List[IgnoreRule]]:
+    """(files, subdirectories, rules in force below) of one directory, paths relative to the root"""
+    directory = os.path.join(root, relative) if relative else root
+    if use_gitignore:
+        try:
+            with open(os.path.join(directory, ".gitignore"), encoding="utf-8", errors="replace") as file:
+                rules = rules + parse_gitignore(file.read(), relative)
+        except OSError:
+            pass
+
+    files, directories = [], []
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return files, directories, rules
+    for entry in entries:
+        path = f"{relative}/{entry.name}" if relative else entry.name
+        # Symlinks are not followed, so the walk cannot loop or leave the tree
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name not in SKIPPED_DIRECTORIES and not is_ignored(rules, path, True):
+                directories.append(path)
+        elif entry.is_file(follow_symlinks=False) and not is_ignored(rules, path, False):
+            files.append(path)
+    return files, directories, rules
+
+
+def walk(
+    root: str,
+    include: Callable[[str], bool],
+    use_gitignore: bool = True,
+    workers: Optional[int] = None
+) -> Iterator[str]:
+    """
+    Files under a directory, listed by a thread pool one directory per task
+
+    Ignored directories are not entered, so a negated rule cannot re-include
+    a file below them (as in git).
+
+    Args:
+        root: Directory to walk
+        include: Whether to yield a file, given its path relative to the root
+        use_gitignore: Honour .gitignore files found along the way
+        workers: Threads listing directories (default: the executor's)
+
+    Yields:
+        Paths relative to the root, with forward slashes, in no particular order
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk") as executor:
+        pending = {executor.submit(_scan_directory, root, "", [], use_gitignore)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, directories, rules = future.result()
+                for directory in directories:
+                    pending.add(executor.submit(_scan_directory, root, directory, rules, use_gitignore))
+                for path in files:
+                    if include(path):
+                        yield path
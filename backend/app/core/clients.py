@@ -0,0 +1,63 @@
+"""
+Client Identification
+Stable client identity and priority class for usage accounting, rate limiting and scheduling
+"""
+
+import hashlib
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Request
+from slowapi.util import get_remote_address
+
+from app.core.config import settings
+
+# Highest priority first
+CLIENT_CLASSES = ("interactive", "ci", "bulk")
+
+
+@dataclass(frozen=True)
+class ClientContext:
+    """Who the current request's work is done for"""
+    client_id: str
+    client_class: str
+
+
+_client_context: ContextVar[Optional[ClientContext]] = ContextVar("client_context", default=None)
+
+
+def get_client_id(request: Request) -> str:
+    """
+    Identify the calling client
+
+    Teams and CI pipelines are identified by an API key sent in the
+    CLIENT_API_KEY_HEADER header and listed (by SHA-256) in CLIENT_API_KEYS;
+    other callers, and unknown keys, are identified by address. Nothing the
+    caller merely claims is trusted, so a client cannot pick a fresh
+    identity (and a fresh rate limit bucket) per request.
+    """
+    api_key = request.headers.get(settings.CLIENT_API_KEY_HEADER)
+    if api_key:
+        client_id = settings.CLIENT_API_KEYS.get(hashlib.sha256(api_key.encode()).hexdigest())
+        if client_id:
+            return client_id
+    return get_remote_address(request)
+
+
+def get_client_class(client_id: str) -> str:
+    """Priority class of a client, from CLIENT_CLASS_ASSIGNMENTS (interactive by default)"""
+    client_class = settings.CLIENT_CLASS_ASSIGNMENTS.get(client_id, "interactive")
+    return client_class if client_class in CLIENT_CLASSES else "interactive"
+
+
+def bind_client_context(request: Request) -> ClientContext:
+    """Identify the request's client and make it visible to downstream calls"""
+    client_id = get_client_id(request)
+    context = ClientContext(client_id, get_client_class(client_id))
+    _client_context.set(context)
+    return context
+
+
+def get_client_context() -> Optional[ClientContext]:
+    return _client_context.get()
@@ -3,7 +3,7 @@ Application Configuration
 Centralized configuration using Pydantic Settings
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -55,21 +55,79 @@ class Settings(BaseSettings):
     DB_ECHO: bool = False
     DB_POOL_SIZE: int = 10
     DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a pooled connection
+    DB_CREATE_TABLES: bool = True  # Create missing tables on first write
+
+    # Analysis persistence - write-behind to the database, off the response path
+    ANALYSIS_STORE_ENABLED: bool = True
+    ANALYSIS_STORE_QUEUE_SIZE: int = Field(default=1000, ge=1)  # Buffered analyses; more are dropped, not waited for
+    ANALYSIS_STORE_BATCH_SIZE: int = Field(default=100, ge=1)  # Analyses written per transaction
+    ANALYSIS_STORE_FLUSH_INTERVAL: float = 1.0  # Longest an analysis waits for its batch to fill
+    ANALYSIS_STORE_SHUTDOWN_TIMEOUT: float = 10.0  # To flush the buffer on shutdown
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_CACHE_TTL: int = 3600  # 1 hour
+    REDIS_SOCKET_TIMEOUT: float = 1.0
 
     # Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/1"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/2"
 
-    # AI Services - Ollama (Local & Free)
+    # AI Services - Ollama (Local & Free) or an OpenAI-compatible server (vLLM, llama.cpp-server)
+    INFERENCE_BACKEND: str = Field(default="ollama", pattern="^(ollama|openai)$")
     OLLAMA_BASE_URL: str = "http://ollama:11434"
-    OLLAMA_MODEL_CODE: str = "llama3.1:8b"  # For code analysis
-    OLLAMA_MODEL_VISION: str = "llava:13b"  # For diagram analysis
+    OLLAMA_MODEL_CODE: str = "llama3.1:8b"  # For code analysis (model name on either backend)
+    OLLAMA_MODEL_VISION: str = "llava:13b"  # For diagram analysis (model name on either backend)
     AI_MAX_TOKENS: int = 4096
     AI_TEMPERATURE: float = 0.1
+    AI_JSON_MODE: bool = True  # Constrain model output to a JSON object
+    OLLAMA_KEEP_ALIVE: str = "30m"  # How long Ollama keeps the resident model loaded
+    OLLAMA_FALLBACK_URLS: List[str] = []  # Further backends for retries and hedged requests
+
+    # OpenAI-compatible backend (INFERENCE_BACKEND=openai) - /v1/chat/completions
+    OPENAI_COMPAT_BASE_URL: str = "http://vllm:8000"
+    OPENAI_COMPAT_API_KEY: Optional[str] = None
+    OPENAI_COMPAT_FALLBACK_URLS: List[str] = []
+    OPENAI_COMPAT_MAX_CONCURRENCY: int = 64  # Calls in flight per model; the server batches them
+
+    # Record / replay inference calls for deterministic benchmarks
+    INFERENCE_MODE: str = Field(default="live", pattern="^(live|record|replay)$")
+    INFERENCE_CORPUS_PATH: str = "./storage/inference_corpus.jsonl.gz"
+    INFERENCE_REPLAY_LATENCY_SCALE: float = Field(default=1.0, ge=0)  # 0 replays without delay
+
+    # Inference retries - transient failures only, exponential backoff with full jitter
+    OLLAMA_RETRY_ATTEMPTS: int = Field(default=3, ge=1)
+    OLLAMA_RETRY_BACKOFF: float = 0.5  # Seconds, doubled per attempt
+    OLLAMA_RETRY_BACKOFF_MAX: float = 8.0
+
+    # Hedging - duplicate a slow call on the next backend, keep the first answer
+    OLLAMA_HEDGE_ENABLED: bool = False
+    OLLAMA_HEDGE_PERCENTILE: float = Field(default=95.0, gt=0, lt=100)  # Of recent call latencies
+    OLLAMA_HEDGE_MIN_DELAY: float = 2.0  # Never hedge sooner than this
+
+    # Circuit breaker per backend - fail fast while a backend is failing or hanging
+    OLLAMA_BREAKER_ENABLED: bool = True
+    OLLAMA_BREAKER_WINDOW: int = 20  # Recent calls considered
+    OLLAMA_BREAKER_MIN_CALLS: int = 5  # Calls in the window before the breaker may open
+    OLLAMA_BREAKER_FAILURE_RATE: float = Field(default=0.5, gt=0, le=1)
+    OLLAMA_BREAKER_SLOW_CALL_SECONDS: float = 120.0
+    OLLAMA_BREAKER_SLOW_CALL_RATE: float = Field(default=0.8, gt=0, le=1)
+    OLLAMA_BREAKER_OPEN_SECONDS: float = 30.0  # Before a trial call is let through
+    OLLAMA_BREAKER_HALF_OPEN_CALLS: int = 1
+
+    # Model scheduler - groups calls by model when the GPU holds one model at a time
+    MODEL_SCHEDULER_ENABLED: bool = True  # Groups calls by model within one worker process only
+    MODEL_SCHEDULER_BATCH_WINDOW: float = 1.0  # Idle seconds before swapping to a waiting model
+    MODEL_SCHEDULER_MAX_WAIT: float = 30.0  # Longest a call waits while another model is resident
+    MODEL_SCHEDULER_MAX_CONCURRENCY: int = 4  # Match OLLAMA_NUM_PARALLEL
+    MODEL_SCHEDULER_SJF: bool = False  # Each client's calls shortest prompt first
+    MODEL_SCHEDULER_CLIENT_WEIGHTS: Dict[str, float] = {}  # Fair-share weight per client ID (default 1)
+
+    # Startup warm-up - /readiness stays false until configured models answer
+    WARMUP_ENABLED: bool = True
+    WARMUP_RETRY_INTERVAL: int = 10
+    READINESS_CACHE_TTL: int = 15  # Seconds a model availability check is reused
 
     # Legacy API keys (optional, Ollama is default)
     ANTHROPIC_API_KEY: Optional[str] = None
@@ -77,6 +135,8 @@ class Settings(BaseSettings):
 
     # File Upload
     MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50MB
+    REQUEST_DECOMPRESSED_MAX_SIZE: int = Field(default=64 * 1024 * 1024, ge=1)  # gzip/zstd request bodies, once decoded
+    REQUEST_DECOMPRESSION_MAX_RATIO: float = Field(default=100.0, gt=1)  # Decoded / received size
     ALLOWED_IMAGE_TYPES: List[str] = ["image/png", "image/jpeg", "image/svg+xml"]
     ALLOWED_CODE_EXTENSIONS: List[str] = [
         ".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".go",
@@ -86,16 +146,66 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 100
     RATE_LIMIT_PER_HOUR: int = 1000
-    ANALYSIS_RATE_LIMIT: str = "10/hour"  # Max 10 analyses per hour per user
+
+    # Analysis rate limits - token buckets charged in estimated LLM tokens, settled on actual usage
+    RATE_LIMIT_BACKEND: str = Field(default="redis", pattern="^(redis|memory)$")
+    CLIENT_CLASS_ASSIGNMENTS: Dict[str, str] = {}  # Client ID -> "interactive" (default), "ci" or "bulk"
+    RATE_LIMIT_INTERACTIVE_CAPACITY: float = Field(default=30_000, gt=0)  # Burst size in tokens
+    RATE_LIMIT_INTERACTIVE_REFILL_RATE: float = Field(default=10.0, gt=0)  # Tokens per second
+    RATE_LIMIT_CI_CAPACITY: float = Field(default=120_000, gt=0)
+    RATE_LIMIT_CI_REFILL_RATE: float = Field(default=40.0, gt=0)
+    RATE_LIMIT_CHARS_PER_TOKEN: float = Field(default=3.0, gt=0)  # Prompt size estimate (code is dense)
+    RATE_LIMIT_COMPLETION_ESTIMATE: int = 1024  # Tokens charged upfront for the response
+    RATE_LIMIT_IMAGE_TOKENS: int = 1024  # Prompt tokens charged upfront for an image
+
+    # Usage accounting - per-client tokens and GPU-seconds
+    CLIENT_API_KEY_HEADER: str = "X-API-Key"  # Identifies teams / pipelines, else the client address
+    CLIENT_API_KEYS: Dict[str, str] = {}  # SHA-256 hex of an API key -> client ID
+    USAGE_ADMIN_CLIENTS: List[str] = []  # Client IDs (from CLIENT_API_KEYS) that may read every client's usage
+    USAGE_LEDGER_BACKEND: str = Field(default="redis", pattern="^(redis|memory)$")
+    USAGE_LEDGER_TTL: int = Field(default=90 * 86400, gt=0)  # Seconds a client's totals outlive its last request
+    USAGE_LEDGER_MAX_CLIENTS: int = Field(default=10_000, ge=1)  # Most recently active clients kept
 
     # Security Analysis
     CODE_MAX_LINES: int = 10000
     CODE_ANALYSIS_TIMEOUT: int = 300  # 5 minutes
+    SECURITY_TOOLS_TIMEOUT: int = 60  # Static analysis tool stage, shortened to the time the request has left
     DIAGRAM_ANALYSIS_TIMEOUT: int = 300
+    DISCONNECT_POLL_INTERVAL: float = 0.5  # Seconds between client disconnect checks
+    BATCH_MAX_FILES: int = Field(default=500, ge=1)  # Files in one /analyze/batch or /analyze/archive request
+    BATCH_CONCURRENCY: int = Field(default=4, ge=1)  # Files of one batch analyzed at once
+    ARCHIVE_MAX_ENTRIES: int = Field(default=20_000, ge=1)  # Entries of any kind walked in an /analyze/archive upload
+    ARCHIVE_MAX_EXPANDED_SIZE: int = Field(default=512 * 1024 * 1024, ge=1)  # Uncompressed tar bytes walked
+    SVG_FAST_PATH_ENABLED: bool = True  # Analyze SVG topology with the text model
+    # Raster diagrams: "vision" sends the image to LLaVA, "ocr" tries OCR + text model first
+    DIAGRAM_ANALYSIS_MODE: str = Field(default="vision", pattern="^(vision|ocr)$")
+    OCR_MIN_CONFIDENCE: float = 70.0  # Mean Tesseract confidence (0-100) to trust OCR
+    OCR_MIN_LABELS: int = 3
+    OCR_WORKERS: int = 2
+    OCR_TIMEOUT: int = 60
+    # Offline OSV index (python -m app.cli osv-index); manifests are matched against it without the LLM
+    DEPENDENCY_INDEX_PATH: str = "./storage/osv.idx"
+    SCAN_CACHE_PATH: str = "./storage/scan_cache.sqlite3"  # python -m app.cli scan: results of unchanged files
+
+    # Diagram cache - near-identical raster uploads reuse a stored analysis
+    DIAGRAM_CACHE_ENABLED: bool = True
+    DIAGRAM_CACHE_MAX_DISTANCE: int = Field(default=6, ge=0, le=15)  # Hamming distance of 64-bit dHash
+    DIAGRAM_CACHE_MAX_ENTRIES: int = 20_000
+    DIAGRAM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # Serialized analyses held per process
+    DIAGRAM_CACHE_TTL: int = 7 * 24 * 3600  # 1 week
+
+    # CPU-bound work on large inputs leaves the event loop (hashing, encoding, parsing, scans)
+    OFFLOAD_MIN_BYTES: int = Field(default=64 * 1024, ge=0)  # Smaller inputs run inline
+    OFFLOAD_THREADS: int = 4  # Work that releases the GIL or yields between chunks
+    OFFLOAD_PROCESSES: int = 2  # Pure-Python work that holds the GIL
+    EVENT_LOOP_LAG_INTERVAL: float = 0.25  # Seconds between lag samples, 0 disables
 
     # Monitoring
     ENABLE_METRICS: bool = True
     LOG_LEVEL: str = "INFO"
+    TRACING_EXPORTER: str = Field(default="none", pattern="^(none|memory|file|log)$")
+    TRACING_FILE_PATH: str = "./storage/traces.jsonl"
+    DEBUG_TIMINGS_HEADER: str = "X-Debug-Timings"  # Per-stage timings in response metadata
 
     # External Services
     SEMGREP_TIMEOUT: int = 120
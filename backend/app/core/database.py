@@ -0,0 +1,54 @@
+"""
+Database Connection
+Shared async SQLAlchemy engine and its connection pool
+"""
+
+from typing import Optional
+
+import orjson
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.core.config import settings
+
+_engine: Optional[AsyncEngine] = None
+
+
+def _json_serializer(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+def get_engine() -> AsyncEngine:
+    """
+    Get the process-wide async engine (created on first use)
+
+    Connections are pooled (DB_POOL_SIZE kept open, DB_MAX_OVERFLOW more
+    under load) and checked before use, so a database restart costs one
+    failed ping rather than one failed request per stale connection.
+    """
+    global _engine
+    if _engine is None:
+        options = {}
+        if make_url(settings.DATABASE_URL).get_backend_name() != "sqlite":
+            options.update(
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT
+            )
+        _engine = create_async_engine(
+            settings.DATABASE_URL,
+            echo=settings.DB_ECHO,
+            pool_pre_ping=True,
+            json_serializer=_json_serializer,
+            json_deserializer=orjson.loads,
+            **options
+        )
+    return _engine
+
+
+async def close_db():
+    """Close every pooled connection"""
+    global _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
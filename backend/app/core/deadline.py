@@ -0,0 +1,93 @@
+"""
+Request Deadlines
+Per-request deadline propagated to downstream calls, and cancellation when the client goes away
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+import structlog
+from fastapi import Request
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() by which the current request must finish
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request ran past its deadline"""
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the response was ready"""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, None without a deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def timeout(default: float) -> float:
+    """
+    Timeout for a downstream call: its own limit, shortened to the time left
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded before the call started")
+    return min(default, left)
+
+
+async def run_with_deadline(request: Request, work: Awaitable[T], seconds: float) -> T:
+    """
+    Run a request's work under a deadline, cancelling it if the client disconnects
+
+    The deadline is visible to everything the work calls (see timeout()), and
+    cancelling the work closes in-flight Ollama streams so generation stops.
+
+    Args:
+        request: Request the work is done for
+        work: Coroutine doing the work
+        seconds: Time allowed for the work
+
+    Raises:
+        DeadlineExceeded: If the work did not finish in time
+        ClientDisconnected: If the client went away first
+    """
+    deadline = time.monotonic() + seconds
+    parent = _deadline.get()
+    token = _deadline.set(deadline if parent is None else min(parent, deadline))
+    try:
+        # The task copies the current context, deadline included
+        task = asyncio.ensure_future(work)
+    finally:
+        _deadline.reset(token)
+
+    try:
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise DeadlineExceeded(f"Analysis exceeded its {seconds}s deadline")
+            done, _ = await asyncio.wait({task}, timeout=min(settings.DISCONNECT_POLL_INTERVAL, left))
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected("Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
@@ -0,0 +1,182 @@
+"""
+Prometheus Metrics
+Inference, cache and findings metrics with bounded label values
+"""
+
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, make_asgi_app, multiprocess
+
+from app.core.config import settings
+
+SEVERITIES = ("CRITICAL", "HIGH", "MEDIUM", "LOW", "INFO")
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+TOKENS_PER_SECOND_BUCKETS = (1, 2.5, 5, 10, 20, 40, 80, 160)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+DB_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+OLLAMA_REQUEST_DURATION = Histogram(
+    "shadowscan_ollama_request_duration_seconds",
+    "Wall-clock duration of Ollama /api/chat calls",
+    ["model", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+OLLAMA_QUEUE_WAIT = Histogram(
+    "shadowscan_ollama_queue_wait_seconds",
+    "Time calls wait in the model scheduler before reaching Ollama",
+    ["model"],
+    buckets=LATENCY_BUCKETS
+)
+OLLAMA_PROMPT_TOKENS = Histogram(
+    "shadowscan_ollama_prompt_tokens",
+    "Prompt tokens evaluated per call (prompt_eval_count)",
+    ["model"],
+    buckets=TOKEN_BUCKETS
+)
+OLLAMA_COMPLETION_TOKENS = Histogram(
+    "shadowscan_ollama_completion_tokens",
+    "Tokens generated per call (eval_count)",
+    ["model"],
+    buckets=TOKEN_BUCKETS
+)
+OLLAMA_LOAD_DURATION = Histogram(
+    "shadowscan_ollama_load_duration_seconds",
+    "Model load time reported by Ollama (load_duration)",
+    ["model"],
+    buckets=LATENCY_BUCKETS
+)
+OLLAMA_EVAL_DURATION = Histogram(
+    "shadowscan_ollama_eval_duration_seconds",
+    "Generation time reported by Ollama (eval_duration)",
+    ["model"],
+    buckets=LATENCY_BUCKETS
+)
+OLLAMA_TOKENS_PER_SECOND = Histogram(
+    "shadowscan_ollama_tokens_per_second",
+    "Generation throughput (eval_count / eval_duration)",
+    ["model"],
+    buckets=TOKENS_PER_SECOND_BUCKETS
+)
+OLLAMA_RETRIES = Counter(
+    "shadowscan_ollama_retries_total",
+    "Ollama calls retried after a transient failure",
+    ["model"]
+)
+OLLAMA_HEDGED_REQUESTS = Counter(
+    "shadowscan_ollama_hedged_requests_total",
+    "Duplicate calls sent to another backend because the first was slow",
+    ["model"]
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "shadowscan_circuit_breaker_state",
+    "Inference backend circuit breaker state (0 closed, 1 half-open, 2 open), worst worker",
+    ["backend"],
+    multiprocess_mode="max"
+)
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "shadowscan_circuit_breaker_transitions_total",
+    "Circuit breaker state changes, by new state",
+    ["backend", "state"]
+)
+MODEL_SWAPS = Counter(
+    "shadowscan_model_swaps_total",
+    "Resident model swaps performed by the model scheduler",
+    ["model", "reason"]
+)
+CACHE_REQUESTS = Counter(
+    "shadowscan_cache_requests_total",
+    "Analysis cache lookups",
+    ["cache", "result"]
+)
+AI_PARSE_FAILURES = Counter(
+    "shadowscan_ai_parse_failures_total",
+    "Model responses that could not be parsed as JSON",
+    ["analyzer"]
+)
+ANALYSES = Counter(
+    "shadowscan_analyses_total",
+    "Completed analyses",
+    ["analyzer", "mode"]
+)
+ANALYSES_ABORTED = Counter(
+    "shadowscan_analyses_aborted_total",
+    "Analyses cancelled before completion",
+    ["analyzer", "reason"]
+)
+FINDINGS = Counter(
+    "shadowscan_findings_total",
+    "Findings reported, by severity",
+    ["analyzer", "severity"]
+)
+EVENT_LOOP_LAG = Histogram(
+    "shadowscan_event_loop_lag_seconds",
+    "How late the event loop ran a timer, i.e. how long it was blocked",
+    buckets=LAG_BUCKETS
+)
+ANALYSES_PERSISTED = Counter(
+    "shadowscan_analyses_persisted_total",
+    "Analyses given to the write-behind store, by outcome (stored, dropped, failed)",
+    ["outcome"]
+)
+ANALYSIS_STORE_FLUSH_DURATION = Histogram(
+    "shadowscan_analysis_store_flush_seconds",
+    "Time to write one batch of analyses and their findings",
+    buckets=DB_BUCKETS
+)
+REQUEST_DECOMPRESSION = Counter(
+    "shadowscan_request_decompression_total",
+    "Compressed request bodies, by encoding and outcome (ok, too_large, ratio, invalid)",
+    ["encoding", "outcome"]
+)
+REQUEST_COMPRESSED_BYTES = Counter(
+    "shadowscan_request_compressed_bytes_total",
+    "Size of accepted compressed request bodies, as received and decompressed",
+    ["encoding", "form"]
+)
+OFFLOADED_TASKS = Counter(
+    "shadowscan_offloaded_tasks_total",
+    "CPU-bound steps by where they ran (inline, thread or process pool)",
+    ["task", "pool"]
+)
+
+
+def model_label(model: str) -> str:
+    """Bound the model label to the configured models"""
+    if model in (settings.OLLAMA_MODEL_CODE, settings.OLLAMA_MODEL_VISION):
+        return model
+    return "other"
+
+
+def severity_label(severity: str) -> str:
+    """Bound the severity label to the known severities"""
+    severity = str(severity).upper()
+    return severity if severity in SEVERITIES else "OTHER"
+
+
+def observe_findings(analyzer: str, findings: list):
+    """Count findings by severity"""
+    for finding in findings:
+        FINDINGS.labels(analyzer, severity_label(finding.get("severity", ""))).inc()
+
+
+def metrics_asgi_app():
+    """
+    ASGI app serving the metrics
+
+    With several workers, set PROMETHEUS_MULTIPROC_DIR to a directory that is
+    emptied before the server starts; every worker then writes its samples
+    there and any worker can serve the aggregate.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return make_asgi_app(registry=registry)
+    return make_asgi_app()
+
+
+def mark_worker_dead():
+    """Let the multi-process collector drop this worker's live samples"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
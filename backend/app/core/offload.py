@@ -0,0 +1,167 @@
+"""
+Event Loop Offload
+Size-aware policy for running CPU-bound steps off the event loop, and event loop lag monitoring
+"""
+
+import asyncio
+import base64
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar, Union
+
+import structlog
+
+from app.core.config import settings
+from app.core import metrics, serialization
+from app.core.serialization import SegmentedText
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+# base64 runs in slices of this many bytes (a multiple of 3, so slices encode
+# without padding); the loop gets the GIL back between slices
+B64_CHUNK = 3 * 256 * 1024
+
+# A lag this long is logged as well as observed
+LAG_WARNING_SECONDS = 0.5
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_lag_task: Optional[asyncio.Task] = None
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Get the offload thread pool, creating it on first use"""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=settings.OFFLOAD_THREADS, thread_name_prefix="offload")
+    return _thread_pool
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the offload process pool, creating it on first use"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.OFFLOAD_PROCESSES)
+    return _process_pool
+
+
+def shutdown_pools():
+    """Shut down the offload pools"""
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+async def run(task: str, func: Callable[..., T], *args: Any, size: int, pool: str = "thread") -> T:
+    """
+    Run a CPU-bound call inline, or in a pool when its input is large
+
+    Below OFFLOAD_MIN_BYTES the call runs inline: handing it to a pool costs
+    more than it blocks the loop. Larger inputs go to the thread pool, for
+    work that releases the GIL (hashing) or yields it between chunks, or to
+    the process pool for pure-Python work that would hold the GIL throughout
+    (parsing, regex scans). Process pool calls must be picklable and should
+    return small results.
+
+    Args:
+        task: Name of the step, for the offload metric
+        func: Function to call
+        size: Input size in bytes (or characters)
+        pool: "thread" or "process"
+
+    Returns:
+        The result of func(*args)
+    """
+    if size < settings.OFFLOAD_MIN_BYTES:
+        metrics.OFFLOADED_TASKS.labels(task, "inline").inc()
+        return func(*args)
+
+    metrics.OFFLOADED_TASKS.labels(task, pool).inc()
+    executor = get_process_pool() if pool == "process" else get_thread_pool()
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def _sha256_hexdigest(data: Union[str, bytes]) -> str:
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+async def sha256_hexdigest(data: Union[str, bytes]) -> str:
+    """SHA-256 of text or bytes; hashlib releases the GIL, so large inputs hash in a thread"""
+    return await run("sha256", _sha256_hexdigest, data, size=len(data))
+
+
+def _b64encode(data: bytes) -> SegmentedText:
+    view = memoryview(data)
+    return SegmentedText(*(base64.b64encode(view[i:i + B64_CHUNK]) for i in range(0, len(view), B64_CHUNK)))
+
+
+async def b64encode(data: bytes) -> SegmentedText:
+    """
+    Base64 text of bytes, as one segment per slice
+
+    binascii holds the GIL for a whole call, so large inputs are encoded in
+    slices in a thread and the loop runs between slices. The slices are
+    spliced into the request body as they are, never joined.
+    """
+    return await run("base64", _b64encode, data, size=len(data))
+
+
+async def loads(text: Union[str, bytes]) -> Any:
+    """
+    Parse JSON, in the thread pool when large
+
+    orjson holds the GIL while it parses, so no pool frees the loop for the
+    whole parse. The thread pool still stalls it least: parsing 1.5 MB took
+    8 ms in a thread (7 ms stall) against 11 ms inline and 50 ms in the
+    process pool (12 ms stall), because the parsed result is unpickled on
+    the loop's side (benchmarks/json_offload_benchmark.py). Model responses
+    are capped by max_tokens, so they usually stay under OFFLOAD_MIN_BYTES
+    and parse inline.
+
+    Raises:
+        serialization.JSONDecodeError: If the text is not valid JSON
+    """
+    return await run("json_loads", serialization.loads, text, size=len(text))
+
+
+async def _monitor_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - started - interval, 0.0)
+        metrics.EVENT_LOOP_LAG.observe(lag)
+        if lag >= LAG_WARNING_SECONDS:
+            logger.warning("Event loop blocked", lag_ms=round(lag * 1000, 1))
+
+
+def start_lag_monitor():
+    """
+    Sample event loop lag every EVENT_LOOP_LAG_INTERVAL seconds
+
+    A timer that fires late measures how long the loop was busy with
+    something that did not yield, during which no request made progress.
+    """
+    global _lag_task
+    if settings.EVENT_LOOP_LAG_INTERVAL > 0 and _lag_task is None:
+        _lag_task = asyncio.create_task(_monitor_lag(settings.EVENT_LOOP_LAG_INTERVAL))
+
+
+async def stop_lag_monitor():
+    """Stop sampling event loop lag"""
+    global _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        try:
+            await _lag_task
+        except asyncio.CancelledError:
+            pass
+        _lag_task = None
@@ -0,0 +1,266 @@
+"""
+Rate Limiting
+Token-bucket limits charged in LLM tokens, shared across workers through Redis
+"""
+
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = structlog.get_logger(__name__)
+
+KEY_PREFIX = "shadowscan:ratelimit:"
+
+# Refill, then take the cost if the bucket holds it. Time comes from Redis so
+# that every worker and pod agrees on it.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+# Refill, then charge (positive) or refund (negative) the difference between
+# the estimated and the actual cost. The balance may go negative.
+ADJUST_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local delta = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate - delta)
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return tostring(tokens)
+"""
+
+
+class RateLimitExceeded(Exception):
+    """The client's bucket does not hold the request's cost"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """Bucket size in tokens and refill rate in tokens per second"""
+    capacity: float
+    refill_rate: float
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    remaining: float
+    retry_after: float = 0.0
+
+
+class LocalTokenBuckets:
+    """
+    In-process buckets with the same semantics as the Redis scripts
+
+    Limits then apply per worker; used for tests, single-process setups and
+    while Redis is unreachable. Like the Redis keys expiring, buckets that
+    have refilled to capacity are dropped, so only clients seen within the
+    last capacity / refill_rate seconds are held.
+    """
+
+    def __init__(self):
+        # key -> (tokens, updated, full_at), least recently updated first
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, key: str, bucket: Bucket, now: float) -> float:
+        tokens, updated, _ = self._buckets.get(key, (bucket.capacity, now, now))
+        return min(bucket.capacity, tokens + max(0.0, now - updated) * bucket.refill_rate)
+
+    def _store(self, key: str, bucket: Bucket, tokens: float, now: float):
+        self._buckets[key] = (tokens, now, now + (bucket.capacity - tokens) / bucket.refill_rate)
+        self._buckets.move_to_end(key)
+        # A full bucket is the same as no bucket
+        while self._buckets:
+            oldest = next(iter(self._buckets))
+            if self._buckets[oldest][2] > now:
+                break
+            del self._buckets[oldest]
+
+    async def take(self, key: str, bucket: Bucket, cost: float) -> Decision:
+        now = time.monotonic()
+        tokens = self._refill(key, bucket, now)
+        if tokens >= cost:
+            self._store(key, bucket, tokens - cost, now)
+            return Decision(allowed=True, remaining=tokens - cost)
+        self._store(key, bucket, tokens, now)
+        return Decision(allowed=False, remaining=tokens, retry_after=(cost - tokens) / bucket.refill_rate)
+
+    async def adjust(self, key: str, bucket: Bucket, delta: float) -> float:
+        now = time.monotonic()
+        tokens = min(bucket.capacity, self._refill(key, bucket, now) - delta)
+        self._store(key, bucket, tokens, now)
+        return tokens
+
+
+class RedisTokenBuckets:
+    """Buckets shared by every worker and pod, updated atomically by Lua scripts"""
+
+    def __init__(self):
+        self._take = None
+        self._adjust = None
+
+    def _scripts(self):
+        if self._take is None:
+            redis = get_redis()
+            self._take = redis.register_script(TAKE_SCRIPT)
+            self._adjust = redis.register_script(ADJUST_SCRIPT)
+        return self._take, self._adjust
+
+    async def take(self, key: str, bucket: Bucket, cost: float) -> Decision:
+        take, _ = self._scripts()
+        allowed, remaining, retry_after = await take(
+            keys=[key],
+            args=[bucket.capacity, bucket.refill_rate, cost]
+        )
+        return Decision(allowed=bool(int(allowed)), remaining=float(remaining), retry_after=float(retry_after))
+
+    async def adjust(self, key: str, bucket: Bucket, delta: float) -> float:
+        _, adjust = self._scripts()
+        return float(await adjust(keys=[key], args=[bucket.capacity, bucket.refill_rate, delta]))
+
+
+@dataclass
+class TokenCharge:
+    """Tokens taken for a request, settled once its actual usage is known"""
+    limiter: "TokenBucketLimiter"
+    key: str
+    bucket: Bucket
+    charged: float
+    remaining: float
+    settled: bool = False
+
+    async def settle(self, actual_tokens: float):
+        """
+        Charge or refund the difference between the estimate and actual usage
+
+        Args:
+            actual_tokens: Prompt plus completion tokens the request used (0 if none)
+        """
+        if self.settled:
+            return
+        self.settled = True
+        delta = actual_tokens - self.charged
+        if delta:
+            await self.limiter.adjust(self.key, self.bucket, delta)
+
+
+class TokenBucketLimiter:
+    """
+    Charge each request its estimated prompt plus completion tokens
+
+    Every client has one bucket per client class, so CI pipelines cannot use
+    up the budget of interactive users with the same identity (bulk buckets
+    are sized like CI ones). Requests whose cost exceeds the bucket size are
+    charged the bucket size, so they only need a full bucket rather than
+    never passing.
+    """
+
+    def __init__(self, store, fallback: Optional[LocalTokenBuckets] = None):
+        self.store = store
+        self.fallback = fallback or LocalTokenBuckets()
+        self.buckets = {
+            "interactive": Bucket(
+                settings.RATE_LIMIT_INTERACTIVE_CAPACITY,
+                settings.RATE_LIMIT_INTERACTIVE_REFILL_RATE
+            ),
+            "ci": Bucket(
+                settings.RATE_LIMIT_CI_CAPACITY,
+                settings.RATE_LIMIT_CI_REFILL_RATE
+            )
+        }
+        self.buckets["bulk"] = self.buckets["ci"]
+
+    async def acquire(self, client_id: str, client_class: str, cost: float) -> TokenCharge:
+        """
+        Take the request's cost from the client's bucket
+
+        Raises:
+            RateLimitExceeded: If the bucket does not hold the cost yet
+        """
+        bucket = self.buckets[client_class]
+        key = f"{KEY_PREFIX}{client_class}:{client_id}"
+        cost = min(cost, bucket.capacity)
+
+        try:
+            decision = await self.store.take(key, bucket, cost)
+        except Exception as e:
+            logger.warning("Rate limit store unavailable, limiting per process", error=str(e))
+            decision = await self.fallback.take(key, bucket, cost)
+
+        if not decision.allowed:
+            logger.info(
+                "Rate limit exceeded",
+                client_id=client_id,
+                client_class=client_class,
+                cost=cost,
+                retry_after=round(decision.retry_after, 2)
+            )
+            raise RateLimitExceeded(decision.retry_after)
+        return TokenCharge(self, key, bucket, cost, decision.remaining)
+
+    async def adjust(self, key: str, bucket: Bucket, delta: float):
+        try:
+            await self.store.adjust(key, bucket, delta)
+        except Exception as e:
+            logger.warning("Rate limit store unavailable, limiting per process", error=str(e))
+            await self.fallback.adjust(key, bucket, delta)
+
+
+def estimate_tokens(prompt_chars: int, completion_tokens: Optional[int] = None) -> int:
+    """
+    Estimated cost of a generation
+
+    Args:
+        prompt_chars: Characters of prompt text sent to the model
+        completion_tokens: Expected completion size (defaults to RATE_LIMIT_COMPLETION_ESTIMATE)
+    """
+    if completion_tokens is None:
+        completion_tokens = settings.RATE_LIMIT_COMPLETION_ESTIMATE
+    return math.ceil(prompt_chars / settings.RATE_LIMIT_CHARS_PER_TOKEN) + completion_tokens
+
+
+def _create_limiter() -> TokenBucketLimiter:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return TokenBucketLimiter(RedisTokenBuckets())
+    return TokenBucketLimiter(LocalTokenBuckets())
+
+
+rate_limiter = _create_limiter()
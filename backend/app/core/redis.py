@@ -0,0 +1,38 @@
+"""
+Redis Connection
+Shared async Redis client for state that must be consistent across workers and pods
+"""
+
+from typing import Any, Optional
+
+from app.core.config import settings
+
+_client: Optional[Any] = None
+
+
+def get_redis():
+    """
+    Get the process-wide async Redis client (created on first use)
+
+    Timeouts are short: callers treat Redis as best-effort or fail fast
+    rather than holding a request while Redis is unreachable.
+    """
+    global _client
+    if _client is None:
+        import redis.asyncio as redis
+
+        _client = redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT
+        )
+    return _client
+
+
+async def close_redis():
+    """Close the client's connection pool"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,148 @@
+"""
+JSON Serialization
+orjson encoding of request bodies that splices large text in instead of copying it, and orjson decoding
+"""
+
+import secrets
+from string import Formatter
+from typing import Any, AsyncIterator, Iterator, List, Union
+
+import orjson
+
+# Subclass of json.JSONDecodeError (and ValueError)
+JSONDecodeError = orjson.JSONDecodeError
+
+Chunk = Union[bytes, memoryview]
+
+_formatter = Formatter()
+
+
+class SegmentedText:
+    """
+    Text kept as the segments it was assembled from
+
+    A prompt around a 1 MB submission would be copied into a new string by
+    str.format, and again by the JSON encoder. Request bodies hold
+    SegmentedText instead: encode_json escapes each segment into the body
+    on its own and never joins them. bytes segments must already be
+    JSON-safe ASCII (base64) and are sent as they are.
+
+    len() counts characters; str() joins the segments for the few consumers
+    that need a single string.
+    """
+
+    __slots__ = ("segments",)
+
+    def __init__(self, *segments: Union[str, bytes, "SegmentedText"]):
+        flat: List[Union[str, bytes]] = []
+        for segment in segments:
+            if isinstance(segment, SegmentedText):
+                flat.extend(segment.segments)
+            elif segment:
+                flat.append(segment)
+        self.segments = tuple(flat)
+
+    @classmethod
+    def format(cls, template: str, **fields: Any) -> "SegmentedText":
+        """
+        Fill a str.format template, keeping str field values as segments of their own
+
+        Raises:
+            KeyError: If the template names a field that is not given
+        """
+        segments: List[Union[str, bytes, SegmentedText]] = []
+        for literal, name, spec, conversion in _formatter.parse(template):
+            segments.append(literal)
+            if name is None:
+                continue
+            value = fields[name]
+            if spec or conversion or not isinstance(value, (str, SegmentedText)):
+                value = _formatter.format_field(_formatter.convert_field(value, conversion), spec)
+            segments.append(value)
+        return cls(*segments)
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments)
+
+    def __str__(self) -> str:
+        return "".join(
+            segment if isinstance(segment, str) else segment.decode("ascii")
+            for segment in self.segments
+        )
+
+    def __repr__(self) -> str:
+        return f"SegmentedText({len(self.segments)} segments, {len(self)} characters)"
+
+    def json_chunks(self) -> Iterator[Chunk]:
+        """The text as the inside of a JSON string, segment by segment"""
+        for segment in self.segments:
+            if isinstance(segment, bytes):
+                yield segment
+            else:
+                # Drop the quotes without copying the escaped text
+                yield memoryview(orjson.dumps(segment))[1:-1]
+
+
+# Prompt or image text as the inference backends accept it
+Text = Union[str, SegmentedText]
+
+
+def encode_json(obj: Any) -> List[Chunk]:
+    """
+    Encode a JSON document as chunks, with SegmentedText values spliced in
+
+    The document is encoded with placeholders for the SegmentedText values,
+    then split at the placeholders, so large text is escaped once and never
+    copied into one buffer.
+
+    Args:
+        obj: dicts, lists and JSON scalars, with SegmentedText for any string
+
+    Returns:
+        Chunks whose concatenation is the JSON document
+    """
+    texts: List[SegmentedText] = []
+    # Random per call, so no string in the document can pass for a placeholder
+    marker = secrets.token_hex(8)
+
+    def collect(value: Any) -> Any:
+        if isinstance(value, SegmentedText):
+            texts.append(value)
+            return f"{marker}:{len(texts) - 1}"
+        if isinstance(value, dict):
+            return {key: collect(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [collect(item) for item in value]
+        return value
+
+    skeleton = orjson.dumps(collect(obj))
+    if not texts:
+        return [skeleton]
+
+    chunks: List[Chunk] = []
+    position = 0
+    for index, text in enumerate(texts):
+        placeholder = f'"{marker}:{index}"'.encode()
+        start = skeleton.index(placeholder, position)
+        # Keep the placeholder's quotes around the spliced text
+        chunks.append(skeleton[position:start + 1])
+        chunks.extend(text.json_chunks())
+        position = start + len(placeholder) - 1
+    chunks.append(skeleton[position:])
+    return chunks
+
+
+async def aiter_chunks(chunks: List[Chunk]) -> AsyncIterator[Chunk]:
+    """Chunks as a request body stream for httpx.AsyncClient"""
+    for chunk in chunks:
+        yield chunk
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse JSON
+
+    Raises:
+        JSONDecodeError: If the data is not valid JSON
+    """
+    return orjson.loads(data)
@@ -0,0 +1,221 @@
+"""
+Tracing
+Lightweight span tracing for the analysis pipeline with pluggable exporters
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_recorder: ContextVar[Optional[List["Span"]]] = ContextVar("span_recorder", default=None)
+
+
+@dataclass
+class Span:
+    """A timed stage of a trace"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_time: float  # Unix epoch seconds
+    duration_ms: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class SpanExporter:
+    """Receives every finished span"""
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class NoopSpanExporter(SpanExporter):
+    """Discards spans"""
+
+    def export(self, span: Span):
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps the most recent spans in memory (local debugging, benchmarks)"""
+
+    def __init__(self, max_spans: int = 10_000):
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def trace(self, trace_id: str) -> List[Span]:
+        return [s for s in self.spans if s.trace_id == trace_id]
+
+    def clear(self):
+        self.spans.clear()
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends spans to a JSON Lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def shutdown(self):
+        self._file.close()
+
+
+class LogSpanExporter(SpanExporter):
+    """Emits spans as structured log events"""
+
+    def export(self, span: Span):
+        logger.info("Span finished", **span.to_dict())
+
+
+def _create_exporter() -> SpanExporter:
+    if settings.TRACING_EXPORTER == "memory":
+        return InMemorySpanExporter()
+    if settings.TRACING_EXPORTER == "file":
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+    if settings.TRACING_EXPORTER == "log":
+        return LogSpanExporter()
+    return NoopSpanExporter()
+
+
+_exporter: SpanExporter = _create_exporter()
+
+
+def get_exporter() -> SpanExporter:
+    return _exporter
+
+
+def set_exporter(exporter: SpanExporter):
+    """Replace the span exporter (e.g. with an OpenTelemetry bridge)"""
+    global _exporter
+    _exporter.shutdown()
+    _exporter = exporter
+
+
+def set_trace_id(trace_id: str) -> Token:
+    """Bind a trace ID to the current context (one per request)"""
+    return _trace_id.set(trace_id)
+
+
+def get_trace_id() -> str:
+    trace_id = _trace_id.get()
+    if trace_id is None:
+        trace_id = uuid.uuid4().hex
+        _trace_id.set(trace_id)
+    return trace_id
+
+
+def _finish(span: Span):
+    _exporter.export(span)
+    recorded = _recorder.get()
+    if recorded is not None:
+        recorded.append(span)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a stage as a child of the current span
+
+    Usage:
+        with tracing.span("code.parse", size=len(text)) as s:
+            ...
+            s.set_attribute("vulnerabilities", n)
+    """
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        trace_id=get_trace_id(),
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start_time=time.time(),
+        attributes=attributes
+    )
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - started) * 1000
+        _current_span.reset(token)
+        _finish(current)
+
+
+def record_span(name: str, duration_ms: float, **attributes: Any):
+    """
+    Record a stage timed elsewhere (e.g. durations reported by Ollama) as a
+    child of the current span
+    """
+    parent = _current_span.get()
+    _finish(Span(
+        name=name,
+        trace_id=get_trace_id(),
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start_time=time.time() - duration_ms / 1000,
+        duration_ms=duration_ms,
+        attributes=attributes
+    ))
+
+
+@contextmanager
+def record_stages() -> Iterator[List[Span]]:
+    """Collect the spans finished within this block (for per-request timings)"""
+    recorded: List[Span] = []
+    token = _recorder.set(recorded)
+    try:
+        yield recorded
+    finally:
+        _recorder.reset(token)
+
+
+def stage_timings(spans: List[Span]) -> Dict[str, float]:
+    """Total milliseconds per stage name"""
+    timings: Dict[str, float] = {}
+    for s in spans:
+        timings[s.name] = round(timings.get(s.name, 0.0) + s.duration_ms, 3)
+    return timings
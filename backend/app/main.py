@@ -8,23 +8,31 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.middleware.gzip import GZIPMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
-from prometheus_client import make_asgi_app
 import structlog
 
 from app.core.config import settings
 from app.core.security import setup_security_headers
+from app.core.metrics import mark_worker_dead, metrics_asgi_app
+from app.core import offload
+from app.core.database import close_db
+from app.core.redis import close_redis
+from app.middleware.decompression import RequestDecompressionMiddleware
 from app.middleware.security import (
     AntiSSRFMiddleware,
     SecurityHeadersMiddleware,
     RequestLoggingMiddleware
 )
 from app.api.v1.router import api_router
+from app.services.analysis_store import analysis_store
+from app.services.diagram_ocr import shutdown_ocr_pool
+from app.services.model_readiness import model_readiness
+from app.services.circuit_breaker import breaker_status
 
 # Configure structured logging
 structlog.configure(
@@ -59,15 +67,26 @@ async def lifespan(app: FastAPI):
     logger.info("Starting ShadowScan API", version=settings.VERSION)
 
     # Startup tasks
-    # - Initialize database connection pool
-    # - Load AI models if needed
     # - Start background workers
 
+    # Load AI models in the background; /readiness reports false until done
+    model_readiness.start()
+    offload.start_lag_monitor()
+    # Analyses are written behind the responses through the database pool
+    analysis_store.start()
+
     yield
 
     # Shutdown tasks
     logger.info("Shutting down ShadowScan API")
-    # - Close database connections
+    await model_readiness.stop()
+    await offload.stop_lag_monitor()
+    await analysis_store.stop()
+    await close_db()
+    shutdown_ocr_pool()
+    offload.shutdown_pools()
+    await close_redis()
+    mark_worker_dead()
     # - Cleanup resources
 
 
@@ -79,6 +98,8 @@ app = FastAPI(
     docs_url="/api/docs" if settings.DEBUG else None,
     redoc_url="/api/redoc" if settings.DEBUG else None,
     openapi_url="/api/openapi.json" if settings.DEBUG else None,
+    # orjson serializes large analysis results several times faster than json
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -96,6 +117,13 @@ app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(AntiSSRFMiddleware)
 app.add_middleware(RequestLoggingMiddleware)
 
+# Compressed request bodies - outside the body checks above, so they see the decoded body
+app.add_middleware(
+    RequestDecompressionMiddleware,
+    max_size=settings.REQUEST_DECOMPRESSED_MAX_SIZE,
+    max_ratio=settings.REQUEST_DECOMPRESSION_MAX_RATIO
+)
+
 # CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -106,8 +134,8 @@ app.add_middleware(
     max_age=600,
 )
 
-# GZIP Compression
-app.add_middleware(GZIPMiddleware, minimum_size=1000)
+# GZIP Compression (responses)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 
 # Exception Handlers
@@ -121,7 +149,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         path=request.url.path,
         errors=exc.errors()
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "detail": exc.errors(),
@@ -141,7 +169,7 @@ async def general_exception_handler(request: Request, exc: Exception):
         error=str(exc),
         exc_info=True
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "message": "Internal server error",
@@ -166,24 +194,36 @@ async def health_check():
 async def readiness_check():
     """
     Readiness check for Kubernetes
+
+    Not ready (503) only until the startup model warm-up succeeds. After
+    that an unavailable model or an open circuit breaker is reported in the
+    body but the pod stays ready.
     """
     # Check database connection
     # Check Redis connection
-    # Check AI service availability
 
-    return {
-        "status": "ready",
-        "services": {
-            "database": "ok",
-            "redis": "ok",
-            "ai": "ok"
+    # Check AI service availability (models warmed up, cached between probes)
+    ai = await model_readiness.status()
+
+    return ORJSONResponse(
+        status_code=status.HTTP_200_OK if ai["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ai["ready"] else "not_ready",
+            "services": {
+                "database": "ok",
+                "redis": "ok",
+                "ai": ai["status"]
+            },
+            "models": ai["models"],
+            "circuit_breakers": breaker_status()
         }
-    }
+    )
 
 
 # Metrics endpoint for Prometheus
-metrics_app = make_asgi_app()
-app.mount("/metrics", metrics_app)
+if settings.ENABLE_METRICS:
+    metrics_app = metrics_asgi_app()
+    app.mount("/metrics", metrics_app)
 
 
 # API Router
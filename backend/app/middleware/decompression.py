@@ -0,0 +1,215 @@
+"""
+Request Decompression Middleware
+Streaming gzip / zstd decoding of request bodies, with size and ratio limits
+"""
+
+import zlib
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+import structlog
+from fastapi import status
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+
+logger = structlog.get_logger(__name__)
+
+# The ratio limit applies once the body is this large; small bodies cannot do harm
+RATIO_CHECK_MIN_BYTES = 1024 * 1024
+
+
+def _zstd_decompressor():
+    try:
+        from compression.zstd import ZstdDecompressor  # Python 3.14+
+    except ImportError:
+        from backports.zstd import ZstdDecompressor
+    return ZstdDecompressor()
+
+
+# Content-Encoding -> decoder factory. Every decoder has decompress(data,
+# max_length), eof and unused_data.
+DECODERS: Dict[str, Callable[[], Any]] = {
+    "gzip": lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    "x-gzip": lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    "zstd": _zstd_decompressor,
+}
+
+
+class DecompressionError(Exception):
+    """A compressed request body that is invalid or exceeds a limit"""
+
+    def __init__(self, status_code: int, detail: str, outcome: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.outcome = outcome
+
+
+class _BodyDecoder:
+    """
+    Decoder of one request body
+
+    Output is produced at most one byte beyond the remaining allowance, so
+    a small input cannot expand into more memory than max_size.
+    """
+
+    def __init__(self, encoding: str, max_size: int, max_ratio: float):
+        self.encoding = encoding
+        self.max_size = max_size
+        self.max_ratio = max_ratio
+        self.compressed = 0
+        self.decompressed = 0
+        self._decoder = DECODERS[encoding]()
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        Decompress the next body chunk
+
+        Raises:
+            DecompressionError: If the data is invalid or a limit is exceeded
+        """
+        self.compressed += len(data)
+        output = []
+        while data:
+            allowance = self.max_size - self.decompressed
+            try:
+                chunk = self._decoder.decompress(data, allowance + 1)
+            except Exception as e:
+                raise DecompressionError(
+                    status.HTTP_400_BAD_REQUEST, f"Invalid {self.encoding} request body: {e}", "invalid"
+                )
+            self.decompressed += len(chunk)
+            output.append(chunk)
+            if self.decompressed > self.max_size:
+                raise DecompressionError(
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    f"Decompressed request body exceeds {self.max_size} bytes",
+                    "too_large"
+                )
+            # Several gzip members or zstd frames, one after the other
+            data = self._decoder.unused_data if self._decoder.eof else b""
+            if data:
+                self._decoder = DECODERS[self.encoding]()
+
+        if self.decompressed > RATIO_CHECK_MIN_BYTES and self.decompressed > self.max_ratio * self.compressed:
+            raise DecompressionError(
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                f"Request body compression ratio exceeds {self.max_ratio:g}",
+                "ratio"
+            )
+        return b"".join(output)
+
+    def finish(self):
+        """
+        Raises:
+            DecompressionError: If the body ended inside a compressed stream
+        """
+        if self.compressed and not self._decoder.eof:
+            raise DecompressionError(
+                status.HTTP_400_BAD_REQUEST, f"Truncated {self.encoding} request body", "invalid"
+            )
+
+
+class RequestDecompressionMiddleware:
+    """
+    Decode request bodies sent with Content-Encoding gzip or zstd
+
+    Pure ASGI. The body is decoded chunk by chunk as it arrives, with the
+    limits checked after every chunk, and the application is only called
+    once the whole body has decoded within them - so a rejected body never
+    reaches the body checks or validation, and nothing has to be unwound.
+    The application then sees the decoded body, with its Content-Length
+    and without Content-Encoding.
+
+    Bodies over max_size once decoded, or decoding to more than max_ratio
+    times their compressed size (past 1 MiB), are rejected with 413;
+    corrupt ones with 400; other encodings with 415.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int, max_ratio: float):
+        self.app = app
+        self.max_size = max_size
+        self.max_ratio = max_ratio
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = _content_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        if encoding not in DECODERS:
+            response = JSONResponse(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                content={"detail": f"Unsupported Content-Encoding: {encoding}"},
+                headers={"Accept-Encoding": ", ".join(DECODERS)}
+            )
+            await response(scope, receive, send)
+            return
+
+        decoder = _BodyDecoder(encoding, self.max_size, self.max_ratio)
+        chunks: Deque[bytes] = deque()
+        try:
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] != "http.request":
+                    return  # Client gone before the body was complete
+                chunk = decoder.feed(message.get("body", b""))
+                if chunk:
+                    chunks.append(chunk)
+                more_body = message.get("more_body", False)
+            decoder.finish()
+        except DecompressionError as e:
+            _observe(decoder, e.outcome)
+            logger.warning(
+                "Compressed request body rejected",
+                encoding=encoding,
+                reason=e.outcome,
+                compressed_bytes=decoder.compressed,
+                decompressed_bytes=decoder.decompressed
+            )
+            await JSONResponse(status_code=e.status_code, content={"detail": e.detail})(scope, receive, send)
+            return
+        _observe(decoder, "ok")
+
+        async def decoded_receive() -> Message:
+            if chunks:
+                return {"type": "http.request", "body": chunks.popleft(), "more_body": bool(chunks)}
+            # Body delivered: from here on receive is polled for a disconnect
+            return await receive()
+
+        if not chunks:
+            chunks.append(b"")
+        await self.app(_decoded_scope(scope, decoder.decompressed), decoded_receive, send)
+
+
+def _content_encoding(scope: Scope) -> Optional[str]:
+    """The request's Content-Encoding, None for an unencoded body"""
+    for name, value in scope["headers"]:
+        if name == b"content-encoding":
+            encoding = value.decode("latin-1").strip().lower()
+            return None if encoding in ("", "identity") else encoding
+    return None
+
+
+def _decoded_scope(scope: Scope, length: int) -> Scope:
+    """The scope with the headers describing the decoded body"""
+    headers = [
+        (name, value)
+        for name, value in scope["headers"]
+        if name not in (b"content-encoding", b"content-length")
+    ]
+    headers.append((b"content-length", str(length).encode("latin-1")))
+    return {**scope, "headers": headers}
+
+
+def _observe(decoder: _BodyDecoder, outcome: str):
+    metrics.REQUEST_DECOMPRESSION.labels(decoder.encoding, outcome).inc()
+    if outcome == "ok":
+        metrics.REQUEST_COMPRESSED_BYTES.labels(decoder.encoding, "compressed").inc(decoder.compressed)
+        metrics.REQUEST_COMPRESSED_BYTES.labels(decoder.encoding, "decompressed").inc(decoder.decompressed)
@@ -4,15 +4,19 @@ Implements various security controls including anti-SSRF, security headers, and
 """
 
 import re
+import json
 import time
+import uuid
 import ipaddress
 import structlog
-from typing import Callable
+from typing import Any, Callable
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response, JSONResponse
 from fastapi import status
 
+from app.core import offload, tracing
+
 logger = structlog.get_logger(__name__)
 
 # Private IP ranges (RFC 1918, RFC 4193, loopback, link-local)
@@ -26,6 +30,41 @@ PRIVATE_IP_RANGES = [
     ipaddress.ip_network("::1/128"),
 ]
 
+# Field names that suggest URL content
+URL_KEYS = ["url", "uri", "link", "href", "callback", "webhook"]
+
+IP_PATTERN = re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')
+
+# Localhost and cloud metadata endpoints
+SUSPICIOUS_URL_PATTERN = re.compile(
+    "|".join([
+        r"localhost",
+        r"127\.0\.0\.1",
+        r"0\.0\.0\.0",
+        r"169\.254\.169\.254",  # AWS metadata
+        r"metadata\.google\.internal",  # GCP metadata
+        r"\[::1\]",
+        r"file://",
+    ]),
+    re.IGNORECASE
+)
+
+INJECTION_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in [
+        # SQL injection
+        r"(\bunion\b.*\bselect\b)",
+        r"(\bor\b\s*\d+\s*=\s*\d+)",
+        r"(;\s*drop\s+table)",
+        r"(--\s*$)",
+        r"(/\*.*\*/)",
+        # Command injection
+        r"(\||&&|;)\s*(cat|ls|wget|curl|nc|bash|sh)",
+        r"`.*`",
+        r"\$\(.*\)",
+    ]
+]
+
 
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     """
@@ -45,7 +84,8 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         response.headers["Content-Security-Policy"] = "default-src 'self'; script-src 'self'; style-src 'self' 'unsafe-inline'"
 
         # Remove server header
-        response.headers.pop("Server", None)
+        if "server" in response.headers:
+            del response.headers["server"]
 
         return response
 
@@ -61,8 +101,9 @@ class AntiSSRFMiddleware(BaseHTTPMiddleware):
             try:
                 content_type = request.headers.get("content-type", "")
                 if "application/json" in content_type:
-                    body = await request.json()
-                    if self._contains_suspicious_url(body):
+                    body = await request.body()
+                    # Parsing and scanning a large body holds the GIL; large ones go to a process
+                    if await offload.run("ssrf_scan", contains_suspicious_url, body, size=len(body), pool="process"):
                         logger.warning(
                             "Potential SSRF attempt detected",
                             path=request.url.path,
@@ -78,72 +119,76 @@ class AntiSSRFMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
 
-    def _contains_suspicious_url(self, data: dict) -> bool:
-        """
-        Recursively check for suspicious URLs in request data
-        """
-        if isinstance(data, dict):
-            for key, value in data.items():
-                if self._is_suspicious_url_field(key, value):
-                    return True
-                if isinstance(value, (dict, list)):
-                    if self._contains_suspicious_url(value):
-                        return True
-        elif isinstance(data, list):
-            for item in data:
-                if isinstance(item, (dict, list)):
-                    if self._contains_suspicious_url(item):
-                        return True
-        return False
 
-    def _is_suspicious_url_field(self, key: str, value: any) -> bool:
-        """
-        Check if a field contains a suspicious URL
-        """
-        if not isinstance(value, str):
-            return False
-
-        # Check if key suggests URL content
-        url_keys = ["url", "uri", "link", "href", "callback", "webhook"]
-        if any(k in key.lower() for k in url_keys):
-            # Check for private IP addresses
-            if self._contains_private_ip(value):
-                return True
+def contains_suspicious_url(body: bytes) -> bool:
+    """
+    Check a JSON request body for URLs to internal or metadata endpoints
+
+    Module-level (and taking the raw body) so it can run in a worker process.
+
+    Raises:
+        ValueError: If the body is not valid JSON
+    """
+    return _contains_suspicious_url(json.loads(body))
 
-            # Check for localhost, metadata endpoints
-            suspicious_patterns = [
-                r"localhost",
-                r"127\.0\.0\.1",
-                r"0\.0\.0\.0",
-                r"169\.254\.169\.254",  # AWS metadata
-                r"metadata\.google\.internal",  # GCP metadata
-                r"\[::1\]",
-                r"file://",
-            ]
-            for pattern in suspicious_patterns:
-                if re.search(pattern, value, re.IGNORECASE):
+
+def _contains_suspicious_url(data: Any) -> bool:
+    """
+    Recursively check for suspicious URLs in request data
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if _is_suspicious_url_field(key, value):
+                return True
+            if isinstance(value, (dict, list)):
+                if _contains_suspicious_url(value):
+                    return True
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, (dict, list)):
+                if _contains_suspicious_url(item):
                     return True
+    return False
 
+
+def _is_suspicious_url_field(key: str, value: Any) -> bool:
+    """
+    Check if a field contains a suspicious URL
+    """
+    if not isinstance(value, str):
         return False
 
-    def _contains_private_ip(self, value: str) -> bool:
-        """
-        Check if string contains private IP address
-        """
-        # Extract potential IP addresses
-        ip_pattern = r'\b(?:\d{1,3}\.){3}\d{1,3}\b'
-        potential_ips = re.findall(ip_pattern, value)
+    # Check if key suggests URL content
+    key = key.lower()
+    if any(k in key for k in URL_KEYS):
+        # Check for private IP addresses
+        if _contains_private_ip(value):
+            return True
 
-        for ip_str in potential_ips:
-            try:
-                ip = ipaddress.ip_address(ip_str)
-                for network in PRIVATE_IP_RANGES:
-                    if ip in network:
-                        return True
-            except ValueError:
-                continue
+        # Check for localhost, metadata endpoints
+        if SUSPICIOUS_URL_PATTERN.search(value):
+            return True
 
-        return False
+    return False
+
+
+def _contains_private_ip(value: str) -> bool:
+    """
+    Check if string contains private IP address
+    """
+    # Extract potential IP addresses
+    potential_ips = IP_PATTERN.findall(value)
+
+    for ip_str in potential_ips:
+        try:
+            ip = ipaddress.ip_address(ip_str)
+            for network in PRIVATE_IP_RANGES:
+                if ip in network:
+                    return True
+        except ValueError:
+            continue
+
+    return False
 
 
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
@@ -154,8 +199,9 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         start_time = time.time()
 
-        # Extract request details
-        request_id = request.headers.get("X-Request-ID", "unknown")
+        # Extract request details; the request ID doubles as the trace ID
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        tracing.set_trace_id(request_id)
         user_agent = request.headers.get("User-Agent", "unknown")
         client_ip = request.client.host if request.client else "unknown"
 
@@ -169,7 +215,9 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         )
 
         # Process request
-        response = await call_next(request)
+        with tracing.span("http.request", method=request.method, path=request.url.path) as span:
+            response = await call_next(request)
+            span.set_attribute("status_code", response.status_code)
 
         # Calculate duration
         duration = time.time() - start_time
@@ -201,8 +249,10 @@ class InputSanitizationMiddleware(BaseHTTPMiddleware):
             try:
                 content_type = request.headers.get("content-type", "")
                 if "application/json" in content_type:
-                    body = await request.json()
-                    if self._contains_injection_patterns(body):
+                    body = await request.body()
+                    if await offload.run(
+                        "injection_scan", contains_injection_patterns, body, size=len(body), pool="process"
+                    ):
                         logger.warning(
                             "Potential injection attempt detected",
                             path=request.url.path,
@@ -218,40 +268,31 @@ class InputSanitizationMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
 
-    def _contains_injection_patterns(self, data: any) -> bool:
-        """
-        Check for SQL injection, XSS, and command injection patterns
-        """
-        if isinstance(data, str):
-            # SQL injection patterns
-            sql_patterns = [
-                r"(\bunion\b.*\bselect\b)",
-                r"(\bor\b\s*\d+\s*=\s*\d+)",
-                r"(;\s*drop\s+table)",
-                r"(--\s*$)",
-                r"(/\*.*\*/)",
-            ]
-
-            # Command injection patterns
-            cmd_patterns = [
-                r"(\||&&|;)\s*(cat|ls|wget|curl|nc|bash|sh)",
-                r"`.*`",
-                r"\$\(.*\)",
-            ]
-
-            all_patterns = sql_patterns + cmd_patterns
-            for pattern in all_patterns:
-                if re.search(pattern, data, re.IGNORECASE):
-                    return True
 
-        elif isinstance(data, dict):
-            for value in data.values():
-                if self._contains_injection_patterns(value):
-                    return True
+def contains_injection_patterns(body: bytes) -> bool:
+    """
+    Check a JSON request body for SQL injection, XSS, and command injection patterns
 
-        elif isinstance(data, list):
-            for item in data:
-                if self._contains_injection_patterns(item):
-                    return True
+    Module-level (and taking the raw body) so it can run in a worker process.
 
-        return False
+    Raises:
+        ValueError: If the body is not valid JSON
+    """
+    return _contains_injection_patterns(json.loads(body))
+
+
+def _contains_injection_patterns(data: Any) -> bool:
+    if isinstance(data, str):
+        return any(pattern.search(data) for pattern in INJECTION_PATTERNS)
+
+    elif isinstance(data, dict):
+        for value in data.values():
+            if _contains_injection_patterns(value):
+                return True
+
+    elif isinstance(data, list):
+        for item in data:
+            if _contains_injection_patterns(item):
+                return True
+
+    return False
@@ -0,0 +1,74 @@
+"""
+Analysis Models
+Stored analyses and one row per finding
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import JSON, BigInteger, DateTime, Float, ForeignKey, Index, Integer, String, Uuid
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+# BIGSERIAL on PostgreSQL; SQLite only auto-increments INTEGER primary keys
+BigId = BigInteger().with_variant(Integer(), "sqlite")
+
+
+class Analysis(Base):
+    """A completed code or diagram analysis and the result returned for it"""
+
+    __tablename__ = "analyses"
+    __table_args__ = (
+        # Lookups by content: newest analysis of a hash, per language, model and prompts
+        Index("ix_analyses_code_hash", "code_hash", "language", "model", "prompt_version", "created_at"),
+        Index("ix_analyses_created_at", "created_at"),
+    )
+
+    id: Mapped[str] = mapped_column(Uuid(as_uuid=False), primary_key=True)
+    analyzer: Mapped[str] = mapped_column(String(16))  # "code" or "diagram"
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    client_id: Mapped[str] = mapped_column(String(255))
+    language: Mapped[Optional[str]] = mapped_column(String(50))
+    filename: Mapped[Optional[str]] = mapped_column(String(255))
+    code_hash: Mapped[Optional[str]] = mapped_column(String(64))
+    model: Mapped[Optional[str]] = mapped_column(String(100))
+    prompt_version: Mapped[Optional[str]] = mapped_column(String(16))  # Code analyses by the model
+    mode: Mapped[str] = mapped_column(String(16))  # llm, fallback, cache, ...
+    total_issues: Mapped[int] = mapped_column(Integer, default=0)
+    critical: Mapped[int] = mapped_column(Integer, default=0)
+    high: Mapped[int] = mapped_column(Integer, default=0)
+    medium: Mapped[int] = mapped_column(Integer, default=0)
+    low: Mapped[int] = mapped_column(Integer, default=0)
+    info: Mapped[int] = mapped_column(Integer, default=0)
+    result: Mapped[Dict[str, Any]] = mapped_column(JSON().with_variant(JSONB(), "postgresql"))
+
+
+class Finding(Base):
+    """
+    One vulnerability (code) or weakness (diagram) of an analysis
+
+    Analyzer, language and creation time are copied from the analysis so
+    that history queries filter findings without a join.
+    """
+
+    __tablename__ = "findings"
+    __table_args__ = (
+        # History of one rule, e.g. every CWE-89 finding this month
+        Index("ix_findings_rule_created", "rule_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigId, primary_key=True, autoincrement=True)
+    analysis_id: Mapped[str] = mapped_column(
+        Uuid(as_uuid=False), ForeignKey("analyses.id", ondelete="CASCADE"), index=True
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    analyzer: Mapped[str] = mapped_column(String(16))
+    language: Mapped[Optional[str]] = mapped_column(String(50))
+    rule_id: Mapped[Optional[str]] = mapped_column(String(100))  # CWE or vulnerability ID
+    title: Mapped[str] = mapped_column(String(500))
+    severity: Mapped[str] = mapped_column(String(16))
+    confidence: Mapped[Optional[float]] = mapped_column(Float)
+    file: Mapped[Optional[str]] = mapped_column(String(1024))
+    line: Mapped[Optional[int]] = mapped_column(Integer)
@@ -0,0 +1,10 @@
+"""
+Declarative Base
+Shared metadata for every table
+"""
+
+from sqlalchemy.orm import DeclarativeBase
+
+
+class Base(DeclarativeBase):
+    """Base class of the ORM models"""
@@ -0,0 +1,44 @@
+"""
+Rollup Models
+Daily finding counts, updated in the transaction that stores the analyses
+"""
+
+from datetime import date
+
+from sqlalchemy import Date, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class RuleDailyRollup(Base):
+    """Findings per day, rule (CWE or vulnerability ID) and severity"""
+
+    __tablename__ = "finding_rule_daily"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    analyzer: Mapped[str] = mapped_column(String(16), primary_key=True)
+    rule_id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    severity: Mapped[str] = mapped_column(String(16), primary_key=True)
+    findings: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class SeverityDailyRollup(Base):
+    """
+    Analyses and their severity summary totals per day and language
+
+    Diagram analyses have no language and are counted under "".
+    """
+
+    __tablename__ = "analysis_severity_daily"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    analyzer: Mapped[str] = mapped_column(String(16), primary_key=True)
+    language: Mapped[str] = mapped_column(String(50), primary_key=True)
+    analyses: Mapped[int] = mapped_column(Integer, default=0)
+    total_issues: Mapped[int] = mapped_column(Integer, default=0)
+    critical: Mapped[int] = mapped_column(Integer, default=0)
+    high: Mapped[int] = mapped_column(Integer, default=0)
+    medium: Mapped[int] = mapped_column(Integer, default=0)
+    low: Mapped[int] = mapped_column(Integer, default=0)
+    info: Mapped[int] = mapped_column(Integer, default=0)
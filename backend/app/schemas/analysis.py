@@ -22,6 +22,13 @@ class CodeAnalysisRequest(BaseModel):
         return v.lower().strip()
 
 
+class CodeBatchRequest(BaseModel):
+    """
+    Several files analyzed in one request, reported as each completes
+    """
+    files: List[CodeAnalysisRequest] = Field(..., min_length=1)
+
+
 class VulnerabilityLocation(BaseModel):
     """Location of a vulnerability in code"""
     file: Optional[str] = None
@@ -52,6 +59,7 @@ class DependencyVulnerability(BaseModel):
     vulnerabilities: int
     severity: str
     recommendation: Optional[str] = None
+    advisories: List[str] = Field(default_factory=list)
 
 
 class Secret(BaseModel):
@@ -0,0 +1,343 @@
+"""
+Analysis Store
+Write-behind persistence of analyses and their findings
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import and_, insert, or_, select
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import get_engine
+from app.models.analysis import Analysis, Finding
+from app.models.base import Base
+from app.services.findings_history import update_rollups
+from app.services.report_writers import DEPENDENCY_RULE
+
+logger = structlog.get_logger(__name__)
+
+# Order of the values in a finding row, as sent to COPY
+FINDING_COLUMNS = (
+    "analysis_id", "created_at", "analyzer", "language", "rule_id",
+    "title", "severity", "confidence", "file", "line"
+)
+
+PendingAnalysis = Tuple[str, str, Dict[str, Any]]  # analyzer, client ID, result
+
+
+def _created_at(result: Dict[str, Any]) -> datetime:
+    """The analysis timestamp (naive UTC ISO format) as an aware datetime"""
+    try:
+        created_at = datetime.fromisoformat(result["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return datetime.now(timezone.utc)
+    return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+
+
+def _text(value: Any, length: int) -> Optional[str]:
+    return None if value is None else str(value)[:length]
+
+
+def _number(value: Any, kind: type) -> Optional[Any]:
+    """Model output is not trusted to have the schema's types"""
+    try:
+        return None if value is None else kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rows(analyzer: str, client_id: str, result: Dict[str, Any]) -> Tuple[Dict[str, Any], List[tuple]]:
+    """
+    The analyses row and the findings rows (FINDING_COLUMNS order) of a result
+    """
+    metadata = result.get("metadata", {})
+    created_at = _created_at(result)
+    language = _text(result.get("language"), 50)
+    findings = result.get("vulnerabilities" if analyzer == "code" else "weaknesses", [])
+
+    counts = dict.fromkeys(("critical", "high", "medium", "low", "info"), 0)
+    finding_rows = []
+    for finding in findings:
+        severity = metrics.severity_label(finding.get("severity", ""))
+        if severity.lower() in counts:
+            counts[severity.lower()] += 1
+        location = finding.get("location") or {}
+        finding_rows.append((
+            uuid.UUID(result["analysis_id"]),
+            created_at,
+            analyzer,
+            language,
+            _text(finding.get("id"), 100),
+            _text(finding.get("title"), 500) or "",
+            severity,
+            _number(finding.get("confidence"), float),
+            _text(location.get("file"), 1024),
+            _number(location.get("line"), int)
+        ))
+    total_issues = len(findings)
+
+    # Manifest analyses report their vulnerable dependencies as the findings
+    if metadata.get("analysis_mode") == "dependency_index":
+        for dependency in result.get("dependencies", []):
+            finding_rows.append((
+                uuid.UUID(result["analysis_id"]),
+                created_at,
+                analyzer,
+                language,
+                DEPENDENCY_RULE,
+                _text(
+                    f"{dependency.get('name')} {dependency.get('version')}: "
+                    f"{dependency.get('vulnerabilities', 0)} known vulnerabilities",
+                    500
+                ),
+                metrics.severity_label(dependency.get("severity", "")),
+                None,
+                _text(metadata.get("filename"), 1024),
+                None
+            ))
+
+    # The stored counts are the ones the response reported
+    summary = result.get("summary")
+    if isinstance(summary, dict):
+        counts = {field: _number(summary.get(field), int) or 0 for field in counts}
+        total_issues = _number(summary.get("total_issues"), int) or 0
+
+    if metadata.get("cache_hit"):
+        mode = "cache"
+    else:
+        mode = metadata.get("analysis_mode", "llm")
+
+    analysis_row = {
+        "id": result["analysis_id"],
+        "analyzer": analyzer,
+        "created_at": created_at,
+        "client_id": client_id[:255],
+        "language": language,
+        "filename": _text(metadata.get("filename"), 255),
+        "code_hash": metadata.get("code_hash"),
+        "model": _text(metadata.get("ai_model"), 100),
+        "prompt_version": _text(metadata.get("prompt_version"), 16),
+        "mode": _text(mode, 16),
+        "total_issues": total_issues,
+        **counts,
+        "result": result
+    }
+    return analysis_row, finding_rows
+
+
+class AnalysisStore:
+    """
+    Buffers analyses and writes them to the database in batches
+
+    Endpoints hand results over with submit(), which never waits: a bounded
+    queue absorbs bursts and a single background task writes up to
+    ANALYSIS_STORE_BATCH_SIZE analyses per transaction - one multi-row
+    INSERT for the analyses, one COPY (PostgreSQL) or executemany for all
+    their findings, then the daily rollups. When the queue is full,
+    analyses are dropped and counted rather than slowing responses down; a
+    failed batch is logged and dropped the same way. stop() flushes what is
+    buffered.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Taken off the queue but not yet written
+        self._batch: List[PendingAnalysis] = []
+        self._writing: Optional[asyncio.Task] = None
+        self._schema_ready = not settings.DB_CREATE_TABLES
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        """Start the background writer (no-op when disabled or already running)"""
+        if not settings.ANALYSIS_STORE_ENABLED or self._task is not None:
+            return
+        # A malformed DATABASE_URL fails startup rather than every write
+        get_engine()
+        self._queue = asyncio.Queue(maxsize=settings.ANALYSIS_STORE_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, analyzer: str, client_id: str, result: Dict[str, Any]) -> bool:
+        """
+        Queue an analysis for writing
+
+        Args:
+            analyzer: "code" or "diagram"
+            client_id: Client the analysis was run for
+            result: The analysis result as returned to the client
+
+        Returns:
+            False if the store is not running or its buffer is full
+        """
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait((analyzer, client_id, result))
+        except asyncio.QueueFull:
+            metrics.ANALYSES_PERSISTED.labels("dropped").inc()
+            logger.warning(
+                "Analysis store buffer full, analysis not stored",
+                analysis_id=result.get("analysis_id"),
+                buffered=self._queue.qsize()
+            )
+            return False
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + settings.ANALYSIS_STORE_FLUSH_INTERVAL
+            while len(self._batch) < settings.ANALYSIS_STORE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch, self._batch = self._batch, []
+            # Shielded: stop() cancels this loop, never a transaction in progress
+            self._writing = asyncio.create_task(self._write(batch))
+            await asyncio.shield(self._writing)
+
+    async def _write(self, batch: List[PendingAnalysis]):
+        started = time.perf_counter()
+        try:
+            analysis_rows = []
+            finding_rows = []
+            for analyzer, client_id, result in batch:
+                analysis_row, rows = _rows(analyzer, client_id, result)
+                analysis_rows.append(analysis_row)
+                finding_rows.extend(rows)
+
+            async with get_engine().begin() as conn:
+                if not self._schema_ready:
+                    await conn.run_sync(Base.metadata.create_all)
+                await conn.execute(insert(Analysis), analysis_rows)
+                if finding_rows:
+                    await self._insert_findings(conn, finding_rows)
+                await update_rollups(
+                    conn, analysis_rows, (dict(zip(FINDING_COLUMNS, row)) for row in finding_rows)
+                )
+            self._schema_ready = True
+        except Exception as e:
+            metrics.ANALYSES_PERSISTED.labels("failed").inc(len(batch))
+            logger.error("Failed to store analyses", analyses=len(batch), error=str(e))
+            return
+        finally:
+            metrics.ANALYSIS_STORE_FLUSH_DURATION.observe(time.perf_counter() - started)
+
+        metrics.ANALYSES_PERSISTED.labels("stored").inc(len(batch))
+        logger.debug("Stored analyses", analyses=len(batch), findings=len(finding_rows))
+
+    async def _insert_findings(self, conn, rows: List[tuple]):
+        """COPY on asyncpg (one round trip, no per-row statement), executemany elsewhere"""
+        if conn.dialect.driver == "asyncpg":
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                Finding.__tablename__, records=rows, columns=FINDING_COLUMNS
+            )
+        else:
+            await conn.execute(
+                insert(Finding),
+                [dict(zip(FINDING_COLUMNS, (str(row[0]), *row[1:]))) for row in rows]
+            )
+
+    async def find_code_analysis(
+        self,
+        code_hash: str,
+        language: str,
+        model: str,
+        prompt_version: str
+    ) -> Optional[str]:
+        """
+        ID of the newest stored analysis of this code and language
+
+        Model analyses must come from the same model and prompts; manifests
+        matched against the dependency index (no model) match whatever the
+        model. Answered from the analyses code_hash index alone. Analyses
+        still in the buffer are not found.
+
+        Args:
+            code_hash: SHA-256 of the code, as in metadata.code_hash
+            language: Language the code was analyzed as
+            model: Code model
+            prompt_version: PROMPT_VERSION of the code analyzer
+
+        Returns:
+            The analysis ID, None if there is none
+        """
+        query = (
+            select(Analysis.id)
+            .where(
+                Analysis.code_hash == code_hash,
+                Analysis.language == language,
+                or_(
+                    and_(Analysis.model == model, Analysis.prompt_version == prompt_version),
+                    Analysis.model.is_(None)
+                )
+            )
+            .order_by(Analysis.created_at.desc())
+            .limit(1)
+        )
+        async with get_engine().connect() as conn:
+            return (await conn.execute(query)).scalar_one_or_none()
+
+    async def has_result(self, analysis_id: str) -> bool:
+        """Whether an analysis is stored, from the primary key alone"""
+        async with get_engine().connect() as conn:
+            return (await conn.execute(
+                select(Analysis.id).where(Analysis.id == analysis_id)
+            )).scalar_one_or_none() is not None
+
+    async def get_result(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """The result returned for a stored analysis, None if it is not stored"""
+        async with get_engine().connect() as conn:
+            return (await conn.execute(
+                select(Analysis.result).where(Analysis.id == analysis_id)
+            )).scalar_one_or_none()
+
+    async def stop(self):
+        """Stop the writer and flush the buffer, within ANALYSIS_STORE_SHUTDOWN_TIMEOUT"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        pending = self._batch
+        self._batch = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._queue = None
+
+        async def flush():
+            if self._writing is not None:
+                await self._writing
+            size = settings.ANALYSIS_STORE_BATCH_SIZE
+            for start in range(0, len(pending), size):
+                await self._write(pending[start:start + size])
+
+        try:
+            await asyncio.wait_for(flush(), settings.ANALYSIS_STORE_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error("Analysis store flush timed out on shutdown", buffered=len(pending))
+        finally:
+            self._writing = None
+
+
+analysis_store = AnalysisStore()
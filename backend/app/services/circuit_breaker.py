@@ -0,0 +1,207 @@
+"""
+Circuit Breaker
+Per-backend breaker so calls to a failing inference backend fail fast instead of waiting out timeouts
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+import structlog
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """The backend's breaker is open; the call was not attempted"""
+
+    def __init__(self, backend: str, retry_after: float):
+        super().__init__(f"Inference backend {backend} is unavailable (circuit open)")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker driven by error rate and slow calls
+
+    Closed: calls go through and their outcomes fill a window of the last
+    window_size calls. Once it holds min_calls, the breaker opens when the
+    failure rate or the rate of calls slower than slow_call_seconds reaches
+    its threshold.
+
+    Open: calls are rejected with CircuitOpenError for open_seconds.
+
+    Half-open: up to half_open_calls trial calls go through. If they all
+    succeed in time the breaker closes, otherwise it opens again.
+
+    Each worker process keeps its own breakers.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 120.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1
+    ):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._window: Deque[tuple] = deque(maxlen=window_size)  # (failed, slow)
+        self._trials = 0  # Half-open calls in flight
+        self._trial_successes = 0
+        metrics.CIRCUIT_BREAKER_STATE.labels(name).set(STATE_VALUES[CLOSED])
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a trial call through"""
+        if self.state != OPEN:
+            return 0.0
+        return max(self._opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def is_open(self) -> bool:
+        """Whether a call would be rejected right now"""
+        if self.state == OPEN:
+            return self.retry_after() > 0
+        if self.state == HALF_OPEN:
+            return self._trials >= self.half_open_calls
+        return False
+
+    def acquire(self) -> bool:
+        """
+        Ask to make a call; every acquire must be followed by exactly one
+        record or release, passing its result
+
+        Returns:
+            True if the call is a half-open trial
+
+        Raises:
+            CircuitOpenError: If the call must not be attempted
+        """
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                raise CircuitOpenError(self.name, self.retry_after())
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._trials >= self.half_open_calls:
+                raise CircuitOpenError(self.name, self.open_seconds)
+            self._trials += 1
+            return True
+        return False
+
+    def record(self, trial: bool, duration: float, failed: bool):
+        """Outcome of a call: whether the backend failed it, and how long it took"""
+        self._record(trial, failed=failed, slow=duration >= self.slow_call_seconds)
+
+    def release(self, trial: bool):
+        """The call ended without a verdict on the backend (e.g. it was cancelled)"""
+        if trial and self.state == HALF_OPEN:
+            self._trials -= 1
+
+    def _record(self, trial: bool, failed: bool, slow: bool):
+        if trial:
+            if self.state != HALF_OPEN:
+                return
+            self._trials -= 1
+            if failed or slow:
+                self._transition(OPEN)
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_calls:
+                self._transition(CLOSED)
+            return
+
+        if self.state != CLOSED:
+            # Admitted before the breaker opened; the trials decide now
+            return
+
+        self._window.append((failed, slow))
+        if len(self._window) < self.min_calls:
+            return
+        failures = sum(1 for f, _ in self._window if f) / len(self._window)
+        slow_calls = sum(1 for _, s in self._window if s) / len(self._window)
+        if failures >= self.failure_rate or slow_calls >= self.slow_call_rate:
+            logger.warning(
+                "Opening circuit breaker",
+                backend=self.name,
+                failure_rate=round(failures, 2),
+                slow_call_rate=round(slow_calls, 2)
+            )
+            self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.info("Circuit breaker state change", backend=self.name, previous=self.state, state=state)
+        self.state = state
+        self._trials = 0
+        self._trial_successes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == CLOSED:
+            self._window.clear()
+        metrics.CIRCUIT_BREAKER_STATE.labels(self.name).set(STATE_VALUES[state])
+        metrics.CIRCUIT_BREAKER_TRANSITIONS.labels(self.name, state).inc()
+
+    def status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"state": self.state}
+        if self.state == OPEN:
+            status["retry_after"] = round(self.retry_after(), 1)
+        return status
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(base_url: str) -> Optional[CircuitBreaker]:
+    """
+    Get the process-wide breaker for a backend, None when breakers are disabled
+    """
+    if not settings.OLLAMA_BREAKER_ENABLED:
+        return None
+    breaker = _breakers.get(base_url)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            name=urlsplit(base_url).netloc or base_url,
+            window_size=settings.OLLAMA_BREAKER_WINDOW,
+            min_calls=settings.OLLAMA_BREAKER_MIN_CALLS,
+            failure_rate=settings.OLLAMA_BREAKER_FAILURE_RATE,
+            slow_call_seconds=settings.OLLAMA_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate=settings.OLLAMA_BREAKER_SLOW_CALL_RATE,
+            open_seconds=settings.OLLAMA_BREAKER_OPEN_SECONDS,
+            half_open_calls=settings.OLLAMA_BREAKER_HALF_OPEN_CALLS
+        )
+        _breakers[base_url] = breaker
+    return breaker
+
+
+def breaker_status() -> Dict[str, Dict[str, Any]]:
+    """State of every backend's breaker in this process"""
+    from app.services.inference_backend import backend_urls
+
+    for base_url in backend_urls():
+        get_circuit_breaker(base_url)
+    return {breaker.name: breaker.status() for breaker in _breakers.values()}
@@ -3,13 +3,16 @@ Code Analyzer Service
 AI-powered code security analysis using Ollama (Local & Free)
 """
 
-import uuid
+import asyncio
 import hashlib
+import uuid
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 import structlog
 
 from app.core.config import settings
+from app.core import deadline, metrics, offload, tracing
+from app.core.serialization import SegmentedText
 from app.schemas.analysis import (
     CodeAnalysisResponse,
     Vulnerability,
@@ -19,11 +22,31 @@ from app.schemas.analysis import (
     DependencyVulnerability,
     Secret
 )
-from app.services.prompts import CODE_ANALYSIS_PROMPT
-from app.services.ollama_service import OllamaService
+from app.services.dependency_index import scan_manifest
+from app.services.dependency_manifests import manifest_parser
+from app.services.prompts import CODE_ANALYSIS_PROMPT, CODE_SYSTEM_PROMPT
+from app.services.inference_backend import GenerationResult, get_inference_backend
 
 logger = structlog.get_logger(__name__)
 
+ANALYZER_VERSION = "1.0.0"
+# Changes whenever the prompts do, so stored results of older prompts are not reused
+PROMPT_VERSION = hashlib.sha256(
+    f"{ANALYZER_VERSION}\0{CODE_SYSTEM_PROMPT}\0{CODE_ANALYSIS_PROMPT}".encode()
+).hexdigest()[:16]
+
+
+def _summary(severities: List[str]) -> Dict[str, int]:
+    """Finding counts by severity, from each finding's (upper-case) severity"""
+    return {
+        "total_issues": len(severities),
+        "critical": severities.count("CRITICAL"),
+        "high": severities.count("HIGH"),
+        "medium": severities.count("MEDIUM"),
+        "low": severities.count("LOW"),
+        "info": severities.count("INFO")
+    }
+
 
 class CodeAnalyzerService:
     """
@@ -31,17 +54,15 @@ class CodeAnalyzerService:
     """
 
     def __init__(self):
-        # Use Ollama instead of paid APIs
-        self.ollama = OllamaService(
-            base_url=settings.OLLAMA_BASE_URL,
-            model=settings.OLLAMA_MODEL_CODE
-        )
+        # Local inference (Ollama or an OpenAI-compatible server) instead of paid APIs
+        self.llm = get_inference_backend(settings.OLLAMA_MODEL_CODE)
 
     async def analyze(
         self,
         code: str,
         language: str,
-        filename: Optional[str] = None
+        filename: Optional[str] = None,
+        include_timings: bool = False
     ) -> Dict[str, Any]:
         """
         Perform comprehensive security analysis on code using Ollama
@@ -50,83 +71,154 @@ class CodeAnalyzerService:
             code: Source code to analyze
             language: Programming language
             filename: Optional filename
+            include_timings: Add per-stage timings to the response metadata
 
         Returns:
             Analysis results with vulnerabilities, secrets, and recommendations
         """
         try:
+            if settings.ENABLE_DEPENDENCY_SCANNING:
+                result = await self._analyze_manifest(code, language, filename, include_timings)
+                if result is not None:
+                    return result
+
             logger.info("Starting code analysis with Ollama", language=language)
 
-            # Generate analysis ID
-            analysis_id = str(uuid.uuid4())
+            with tracing.record_stages() as spans, tracing.span("code.analyze", language=language):
+                # Generate analysis ID
+                analysis_id = str(uuid.uuid4())
+
+                # Build prompt
+                with tracing.span("code.build_prompt"):
+                    prompt = self._build_analysis_prompt(code, language, filename)
+
+                # Call Ollama model
+                with tracing.span("code.inference"):
+                    generation = await self._call_ollama_model(prompt)
+
+                # Parse AI response
+                with tracing.span("code.parse"):
+                    parsed_results = await self._parse_ai_response(generation.text)
+
+                # Run additional security tools (semgrep, bandit, etc.)
+                with tracing.span("code.tools"):
+                    tool_results = await self._run_security_tools(code, language)
+
+                # Merge results
+                with tracing.span("code.merge"):
+                    final_results = self._merge_results(parsed_results, tool_results)
+
+                metrics.ANALYSES.labels("code", "llm").inc()
+                metrics.observe_findings("code", final_results["vulnerabilities"])
+
+                code_hash = await offload.sha256_hexdigest(code)
+
+                # Add metadata
+                final_results.update({
+                    "analysis_id": analysis_id,
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "language": language,
+                    "metadata": {
+                        "code_hash": code_hash,
+                        "lines_of_code": code.count('\n') + 1,
+                        "analyzer_version": ANALYZER_VERSION,
+                        "prompt_version": PROMPT_VERSION,
+                        "ai_model": settings.OLLAMA_MODEL_CODE,
+                        "analysis_mode": "llm",
+                        "generation": generation.usage()
+                    }
+                })
 
-            # Build prompt
-            prompt = self._build_analysis_prompt(code, language, filename)
+            if include_timings:
+                final_results["metadata"]["timings"] = tracing.stage_timings(spans)
 
-            # Call Ollama model
-            ai_response = await self._call_ollama_model(prompt)
+            return final_results
 
-            # Parse AI response
-            parsed_results = self._parse_ai_response(ai_response)
+        except Exception as e:
+            logger.error("Code analysis failed", error=str(e), exc_info=True)
+            raise
+
+    async def _analyze_manifest(
+        self,
+        code: str,
+        language: str,
+        filename: Optional[str],
+        include_timings: bool
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Match a dependency manifest against the offline advisory index
+
+        Returns:
+            Analysis results with only dependencies filled, None if the file
+            is not a supported manifest or no index is installed
+        """
+        if manifest_parser(filename) is None:
+            return None
 
-            # Run additional security tools (semgrep, bandit, etc.)
-            tool_results = await self._run_security_tools(code, language)
+        with tracing.record_stages() as spans, tracing.span("code.dependencies", filename=filename or ""):
+            dependencies = scan_manifest(filename, code)
+            if dependencies is None:
+                return None
 
-            # Merge results
-            final_results = self._merge_results(parsed_results, tool_results)
+            metrics.ANALYSES.labels("code", "dependency_index").inc()
+            logger.info("Matched manifest against dependency index", filename=filename, vulnerable=len(dependencies))
 
-            # Add metadata
-            final_results.update({
-                "analysis_id": analysis_id,
+            results = {
+                "analysis_id": str(uuid.uuid4()),
                 "timestamp": datetime.utcnow().isoformat(),
                 "language": language,
+                "vulnerabilities": [],
+                # Each vulnerable dependency is one finding, at its worst advisory's severity
+                "summary": _summary([dependency["severity"] for dependency in dependencies]),
+                "secrets": [],
+                "dependencies": dependencies,
+                "compliance": {},
                 "metadata": {
-                    "code_hash": hashlib.sha256(code.encode()).hexdigest(),
+                    "code_hash": await offload.sha256_hexdigest(code),
                     "lines_of_code": code.count('\n') + 1,
-                    "analyzer_version": "1.0.0",
-                    "ai_model": settings.OLLAMA_MODEL_CODE
+                    "analyzer_version": ANALYZER_VERSION,
+                    "ai_model": None,  # Matched against the index, no model involved
+                    "analysis_mode": "dependency_index",
+                    "generation": None
                 }
-            })
-
-            return final_results
+            }
 
-        except Exception as e:
-            logger.error("Code analysis failed", error=str(e), exc_info=True)
-            raise
+        if include_timings:
+            results["metadata"]["timings"] = tracing.stage_timings(spans)
+        return results
 
     def _build_analysis_prompt(
         self,
         code: str,
         language: str,
         filename: Optional[str]
-    ) -> str:
+    ) -> SegmentedText:
         """
         Build the analysis prompt for the AI model
+
+        The code stays a segment of its own rather than being copied into
+        one prompt string; it is escaped straight into the request body.
         """
-        return CODE_ANALYSIS_PROMPT.format(
+        return SegmentedText.format(
+            CODE_ANALYSIS_PROMPT,
             language=language,
             code=code,
             filename=filename or "unknown"
         )
 
-    async def _call_ollama_model(self, prompt: str) -> str:
+    async def _call_ollama_model(self, prompt: SegmentedText) -> GenerationResult:
         """
-        Call Ollama local LLM for analysis
+        Call the local LLM for analysis
         """
         try:
-            logger.debug("Using Ollama for analysis")
+            logger.debug("Using local LLM for analysis", backend=settings.INFERENCE_BACKEND)
 
-            # System prompt for code security analysis
-            system_prompt = """You are an expert security analyst specializing in code security,
-vulnerability detection, and secure coding practices. You have deep knowledge of OWASP Top 10,
-CWE Top 25, and security frameworks. Analyze code thoroughly and provide detailed,
-actionable security findings in JSON format."""
-
-            response = await self.ollama.generate(
+            response = await self.llm.generate(
                 prompt=prompt,
-                system_prompt=system_prompt,
+                system_prompt=CODE_SYSTEM_PROMPT,
                 temperature=settings.AI_TEMPERATURE,
-                max_tokens=settings.AI_MAX_TOKENS
+                max_tokens=settings.AI_MAX_TOKENS,
+                json_mode=settings.AI_JSON_MODE
             )
 
             return response
@@ -135,7 +227,7 @@ actionable security findings in JSON format."""
             logger.error("Ollama model call failed", error=str(e))
             raise
 
-    def _parse_ai_response(self, response: str) -> Dict[str, Any]:
+    async def _parse_ai_response(self, response: str) -> Dict[str, Any]:
         """
         Parse AI response into structured format
 
@@ -154,7 +246,7 @@ actionable security findings in JSON format."""
                 json_end = response.find("```", json_start)
                 response = response[json_start:json_end].strip()
 
-            data = json.loads(response)
+            data = await offload.loads(response)
 
             # Validate and structure the response
             vulnerabilities = []
@@ -174,14 +266,7 @@ actionable security findings in JSON format."""
                 })
 
             # Calculate summary
-            summary = {
-                "total_issues": len(vulnerabilities),
-                "critical": sum(1 for v in vulnerabilities if v["severity"] == "CRITICAL"),
-                "high": sum(1 for v in vulnerabilities if v["severity"] == "HIGH"),
-                "medium": sum(1 for v in vulnerabilities if v["severity"] == "MEDIUM"),
-                "low": sum(1 for v in vulnerabilities if v["severity"] == "LOW"),
-                "info": sum(1 for v in vulnerabilities if v["severity"] == "INFO")
-            }
+            summary = _summary([v["severity"] for v in vulnerabilities])
 
             return {
                 "vulnerabilities": vulnerabilities,
@@ -193,17 +278,11 @@ actionable security findings in JSON format."""
 
         except json.JSONDecodeError as e:
             logger.error("Failed to parse AI response as JSON", error=str(e))
+            metrics.AI_PARSE_FAILURES.labels("code").inc()
             # Return empty results if parsing fails
             return {
                 "vulnerabilities": [],
-                "summary": {
-                    "total_issues": 0,
-                    "critical": 0,
-                    "high": 0,
-                    "medium": 0,
-                    "low": 0,
-                    "info": 0
-                },
+                "summary": _summary([]),
                 "secrets": [],
                 "dependencies": [],
                 "compliance": {}
@@ -217,6 +296,28 @@ actionable security findings in JSON format."""
         """
         Run additional security analysis tools (semgrep, bandit, etc.)
 
+        The stage gets SECURITY_TOOLS_TIMEOUT, shortened to what is left of the
+        request deadline. It is skipped when the deadline has passed and
+        cancelled when its time runs out; the model's findings are returned
+        without tool findings either way.
+        """
+        no_findings = {"tool_vulnerabilities": [], "tool_secrets": []}
+        try:
+            budget = deadline.timeout(settings.SECURITY_TOOLS_TIMEOUT)
+        except deadline.DeadlineExceeded:
+            logger.warning("Skipping security tools, request deadline passed", language=language)
+            return no_findings
+
+        try:
+            return await asyncio.wait_for(self._tool_findings(code, language), timeout=budget)
+        except asyncio.TimeoutError:
+            logger.warning("Security tools cancelled at the deadline", language=language, timeout=round(budget, 2))
+            return no_findings
+
+    async def _tool_findings(self, code: str, language: str) -> Dict[str, Any]:
+        """
+        Findings of the static analysis tools
+
         This is a placeholder for integration with static analysis tools
         """
         # TODO: Integrate with actual security tools
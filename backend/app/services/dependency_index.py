@@ -0,0 +1,410 @@
+"""
+Dependency Index
+Offline vulnerability index built from OSV advisories, memory-mapped for version-range lookups
+"""
+
+import json
+import mmap
+import os
+import struct
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.services.dependency_manifests import (
+    CRATES,
+    GO,
+    NPM,
+    PYPI,
+    ManifestDependency,
+    manifest_parser,
+    normalize_name,
+    version_key,
+)
+
+logger = structlog.get_logger(__name__)
+
+ECOSYSTEMS = (PYPI, NPM, GO, CRATES)
+
+# File layout, little-endian:
+#   header | packages (sorted by key) | ranges | advisories | string pool
+# Packages point at their contiguous run of ranges, ranges at their
+# advisory, and everything variable-length at (offset, length) in the pool.
+MAGIC = b"SSOSVIDX"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIII QQQQ")
+PACKAGE = struct.Struct("<IIII")  # key offset, key length, first range, range count
+RANGE = struct.Struct("<IIIIIB3x")  # advisory, introduced (off, len), end (off, len), end kind
+ADVISORY = struct.Struct("<IIIIIIB3x")  # id, summary, group (off, len each), severity
+
+# A range ends at a fixed version (excluded) or a last affected one (included)
+END_NONE, END_FIXED, END_LAST_AFFECTED = 0, 1, 2
+
+SEVERITIES = ("UNKNOWN", "LOW", "MEDIUM", "HIGH", "CRITICAL")
+SEVERITY_ALIASES = {"MODERATE": "MEDIUM"}
+
+
+@dataclass
+class AdvisoryMatch:
+    """An advisory affecting a dependency version"""
+    id: str
+    summary: str
+    severity: str
+    group: str  # CVE alias (or ID) shared by duplicate advisories from different databases
+    fixed: Optional[str]  # First fixed version above the matched one, if any
+    last_affected: Optional[str] = None  # When the range names no fix, its last affected version
+
+
+class DependencyIndex:
+    """
+    Read-only index over a memory-mapped file
+
+    Opening costs one mmap; the OS pages in what lookups touch. A lookup is
+    a binary search over the package table plus a scan of that package's
+    ranges, a few microseconds.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic, version, self.package_count, self.range_count, self.advisory_count,
+            self._packages, self._ranges, self._advisories, self._strings
+        ) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a dependency index (format {FORMAT_VERSION})")
+
+    def close(self):
+        self._map.close()
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings + offset
+        return self._map[start:start + length].decode("utf-8")
+
+    def _package_key(self, index: int) -> bytes:
+        key_offset, key_length, _, _ = PACKAGE.unpack_from(self._map, self._packages + index * PACKAGE.size)
+        start = self._strings + key_offset
+        return self._map[start:start + key_length]
+
+    def _find_package(self, key: bytes) -> Optional[Tuple[int, int]]:
+        low, high = 0, self.package_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._package_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.package_count and self._package_key(low) == key:
+            _, _, first_range, range_count = PACKAGE.unpack_from(self._map, self._packages + low * PACKAGE.size)
+            return first_range, range_count
+        return None
+
+    def lookup(self, ecosystem: str, name: str, version: str) -> List[AdvisoryMatch]:
+        """
+        Advisories affecting a package version
+
+        Args:
+            ecosystem: OSV ecosystem (PyPI, npm, Go, crates.io)
+            name: Package name (normalized here)
+            version: Version to check
+
+        Returns:
+            One match per advisory, in index order
+        """
+        found = self._find_package(_package_key(ecosystem, normalize_name(ecosystem, name)))
+        if found is None:
+            return []
+
+        current = version_key(version)
+        matches: Dict[int, AdvisoryMatch] = {}
+        first_range, range_count = found
+        for index in range(first_range, first_range + range_count):
+            advisory, introduced_offset, introduced_length, end_offset, end_length, end_kind = RANGE.unpack_from(
+                self._map, self._ranges + index * RANGE.size
+            )
+            if introduced_length and current < version_key(self._string(introduced_offset, introduced_length)):
+                continue
+            end = self._string(end_offset, end_length) if end_kind != END_NONE else None
+            if end is not None:
+                end_key = version_key(end)
+                if current > end_key or (end_kind == END_FIXED and current == end_key):
+                    continue
+
+            fixed = end if end_kind == END_FIXED else None
+            match = matches.get(advisory)
+            if match is None:
+                match = matches[advisory] = self._advisory(advisory, fixed)
+            elif fixed is not None and (match.fixed is None or version_key(fixed) < version_key(match.fixed)):
+                match.fixed = fixed
+            if end_kind == END_LAST_AFFECTED:
+                match.last_affected = end
+        return list(matches.values())
+
+    def _advisory(self, index: int, fixed: Optional[str]) -> AdvisoryMatch:
+        id_offset, id_length, summary_offset, summary_length, group_offset, group_length, severity = (
+            ADVISORY.unpack_from(self._map, self._advisories + index * ADVISORY.size)
+        )
+        return AdvisoryMatch(
+            id=self._string(id_offset, id_length),
+            summary=self._string(summary_offset, summary_length),
+            severity=SEVERITIES[severity],
+            group=self._string(group_offset, group_length),
+            fixed=fixed
+        )
+
+    def scan(self, dependencies: Iterable[ManifestDependency]) -> List[Dict[str, Any]]:
+        """
+        Vulnerable dependencies, as DependencyVulnerability dicts
+
+        Advisories published by several databases for one CVE (PYSEC and
+        GHSA, say) count once.
+        """
+        results = []
+        for dependency in dependencies:
+            matches = self.lookup(dependency.ecosystem, dependency.name, dependency.version)
+            if not matches:
+                continue
+
+            severity = max((match.severity for match in matches), key=SEVERITIES.index)
+            fixed = [match.fixed for match in matches if match.fixed]
+            last_affected = [match.last_affected for match in matches if match.last_affected and not match.fixed]
+            if fixed and len(fixed) == len(matches):
+                recommendation = f"Update to {dependency.name}>={max(fixed, key=version_key)}"
+            elif last_affected and len(fixed) + len(last_affected) == len(matches):
+                floor = max(fixed + last_affected, key=version_key)
+                recommendation = f"Update {dependency.name} to a release after {floor}"
+            else:
+                recommendation = f"No fixed version of {dependency.name} is known; consider replacing it"
+            results.append({
+                "name": dependency.name,
+                "version": dependency.version,
+                "vulnerabilities": len({match.group for match in matches}),
+                "severity": severity,
+                "recommendation": recommendation,
+                "advisories": sorted(match.id for match in matches)
+            })
+        return results
+
+
+def _package_key(ecosystem: str, name: str) -> bytes:
+    return f"{ecosystem}\0{name}".encode("utf-8")
+
+
+_index: Optional[DependencyIndex] = None
+_index_missing_logged = False
+
+
+def get_dependency_index() -> Optional[DependencyIndex]:
+    """
+    The process-wide index (opened on first use), None if DEPENDENCY_INDEX_PATH has no index
+    """
+    global _index, _index_missing_logged
+    if _index is None:
+        try:
+            _index = DependencyIndex(settings.DEPENDENCY_INDEX_PATH)
+        except (OSError, ValueError) as e:
+            if not _index_missing_logged:
+                logger.warning("Dependency index unavailable", path=settings.DEPENDENCY_INDEX_PATH, error=str(e))
+                _index_missing_logged = True
+            return None
+        logger.info(
+            "Dependency index opened",
+            path=settings.DEPENDENCY_INDEX_PATH,
+            packages=_index.package_count,
+            advisories=_index.advisory_count
+        )
+    return _index
+
+
+def scan_manifest(filename: Optional[str], text: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Match a manifest's dependencies against the index
+
+    Returns:
+        DependencyVulnerability dicts, None if the file is not a supported
+        manifest or there is no index
+    """
+    parser = manifest_parser(filename)
+    if parser is None:
+        return None
+    index = get_dependency_index()
+    if index is None:
+        return None
+    return index.scan(parser(text))
+
+
+# Building
+
+
+def _iter_advisories(sources: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """OSV JSON documents from files, directories (recursively) and zip archives (OSV's all.zip)"""
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            files = sorted(p for p in path.rglob("*") if p.suffix in (".json", ".zip"))
+            yield from _iter_advisories(str(p) for p in files)
+        elif path.suffix == ".zip":
+            with zipfile.ZipFile(path) as archive:
+                for name in sorted(archive.namelist()):
+                    if name.endswith(".json"):
+                        yield json.loads(archive.read(name))
+        else:
+            yield json.loads(path.read_bytes())
+
+
+def _severity(advisory: Dict[str, Any]) -> int:
+    """Severity from the GHSA-style database_specific field, else from the affected entries"""
+    candidates = [advisory.get("database_specific", {}).get("severity")]
+    for affected in advisory.get("affected", []):
+        candidates.append((affected.get("ecosystem_specific") or {}).get("severity"))
+        candidates.append((affected.get("database_specific") or {}).get("severity"))
+    for candidate in candidates:
+        if isinstance(candidate, str):
+            severity = SEVERITY_ALIASES.get(candidate.upper(), candidate.upper())
+            if severity in SEVERITIES:
+                return SEVERITIES.index(severity)
+    return 0
+
+
+def _group(advisory: Dict[str, Any]) -> str:
+    cves = sorted(alias for alias in [advisory["id"], *advisory.get("aliases", [])] if alias.startswith("CVE-"))
+    return cves[0] if cves else advisory["id"]
+
+
+def _affected_ranges(affected: Dict[str, Any]) -> List[Tuple[str, Optional[str], int]]:
+    """(introduced, end, end kind) of one affected package; "" introduced means from the first version"""
+    ranges = []
+    for entry in affected.get("ranges", []):
+        if entry.get("type") not in ("ECOSYSTEM", "SEMVER"):
+            continue  # GIT ranges name commits
+        events = []
+        for event in entry.get("events", []):
+            for kind, version in event.items():
+                events.append((kind, "" if version == "0" else version))
+        events.sort(key=lambda event: version_key(event[1]) if event[1] else ((), -1, ()))
+
+        introduced = None
+        for kind, version in events:
+            if kind == "introduced":
+                if introduced is None:
+                    introduced = version
+            elif introduced is not None:
+                end_kind = END_LAST_AFFECTED if kind == "last_affected" else END_FIXED
+                ranges.append((introduced, version, end_kind))
+                introduced = None
+        if introduced is not None:
+            ranges.append((introduced, None, END_NONE))
+
+    if not ranges:
+        # No usable range: the explicit version list
+        ranges = [(version, version, END_LAST_AFFECTED) for version in affected.get("versions", [])]
+    return ranges
+
+
+class _StringPool:
+    def __init__(self):
+        self.data = bytearray()
+        self._offsets: Dict[bytes, int] = {}
+
+    def add(self, text: Optional[str]) -> Tuple[int, int]:
+        encoded = (text or "").encode("utf-8")
+        offset = self._offsets.get(encoded)
+        if offset is None:
+            offset = self._offsets[encoded] = len(self.data)
+            self.data += encoded
+        return offset, len(encoded)
+
+
+def build_index(sources: Iterable[str], output: str, summary_length: int = 200) -> Dict[str, int]:
+    """
+    Build an index file from OSV advisories
+
+    The file is written next to the output and renamed over it, so a
+    server that has the previous index mapped keeps reading a whole file.
+
+    Args:
+        sources: OSV JSON files, directories of them, or OSV zip exports
+        output: Index file to write
+        summary_length: Characters of each advisory summary kept
+
+    Returns:
+        Counts of packages, ranges and advisories indexed
+    """
+    strings = _StringPool()
+    advisories = bytearray()
+    advisory_count = 0
+    package_ranges: Dict[bytes, List[bytes]] = {}
+    skipped = 0
+
+    for advisory in _iter_advisories(sources):
+        if advisory.get("withdrawn"):
+            skipped += 1
+            continue
+        advisory_index = None
+        for affected in advisory.get("affected", []):
+            package = affected.get("package", {})
+            ecosystem = package.get("ecosystem")
+            if ecosystem not in ECOSYSTEMS or not package.get("name"):
+                continue
+            ranges = _affected_ranges(affected)
+            if not ranges:
+                continue
+            if advisory_index is None:
+                summary = advisory.get("summary") or advisory.get("details", "")
+                advisories += ADVISORY.pack(
+                    *strings.add(advisory["id"]),
+                    *strings.add(summary.strip()[:summary_length]),
+                    *strings.add(_group(advisory)),
+                    _severity(advisory)
+                )
+                advisory_index = advisory_count
+                advisory_count += 1
+
+            key = _package_key(ecosystem, normalize_name(ecosystem, package["name"]))
+            records = package_ranges.setdefault(key, [])
+            for introduced, end, end_kind in ranges:
+                records.append(RANGE.pack(advisory_index, *strings.add(introduced), *strings.add(end), end_kind))
+
+    packages = bytearray()
+    ranges = bytearray()
+    range_count = 0
+    for key in sorted(package_ranges):
+        records = package_ranges[key]
+        key_offset = len(strings.data)
+        strings.data += key  # Not pooled: keys are unique
+        packages += PACKAGE.pack(key_offset, len(key), range_count, len(records))
+        for record in records:
+            ranges += record
+        range_count += len(records)
+
+    packages_offset = HEADER.size
+    ranges_offset = packages_offset + len(packages)
+    advisories_offset = ranges_offset + len(ranges)
+    strings_offset = advisories_offset + len(advisories)
+
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    temporary = f"{output}.tmp-{os.getpid()}"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, len(package_ranges), range_count, advisory_count,
+            packages_offset, ranges_offset, advisories_offset, strings_offset
+        ))
+        for section in (packages, ranges, advisories, strings.data):
+            file.write(section)
+    os.replace(temporary, output)
+
+    logger.info(
+        "Dependency index built",
+        output=output,
+        packages=len(package_ranges),
+        ranges=range_count,
+        advisories=advisory_count,
+        withdrawn=skipped
+    )
+    return {"packages": len(package_ranges), "ranges": range_count, "advisories": advisory_count}
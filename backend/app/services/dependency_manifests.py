@@ -0,0 +1,226 @@
+"""
+Dependency Manifests
+Parsers for requirements.txt, package.json, go.mod and Cargo.toml, and version ordering across ecosystems
+"""
+
+import json
+import re
+import tomllib
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Callable, Dict, List, Optional, Tuple
+
+# OSV ecosystem names
+PYPI = "PyPI"
+NPM = "npm"
+GO = "Go"
+CRATES = "crates.io"
+
+# Leading version number of a requirement or range ("1.2.3" in ">=1.2.3,<2")
+VERSION_NUMBER = re.compile(r"v?(\d+(?:\.\d+)*(?:[-+.]?[0-9A-Za-z][0-9A-Za-z.+-]*)?)")
+
+REQUIREMENT = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*(.*)$")
+GO_REQUIRE = re.compile(r"^(\S+)\s+(v\S+)")
+
+# PEP 440 pre-release spellings
+PRE_RELEASE_TAGS = {"a": 0, "alpha": 0, "b": 1, "beta": 1, "c": 2, "rc": 2, "pre": 2, "preview": 2}
+
+
+@dataclass
+class ManifestDependency:
+    """A declared dependency and the lowest version its declaration allows"""
+    ecosystem: str
+    name: str
+    version: str
+    line: Optional[int] = None
+
+
+def normalize_name(ecosystem: str, name: str) -> str:
+    """Package name as the index stores it (PEP 503 for PyPI, lowercase for crates.io)"""
+    if ecosystem == PYPI:
+        return re.sub(r"[-_.]+", "-", name).lower()
+    if ecosystem == CRATES:
+        return name.lower()
+    return name
+
+
+def version_key(version: str) -> Tuple:
+    """
+    Sort key that orders versions of every supported ecosystem
+
+    Covers semver (npm, Go, crates.io: 1.2.3-rc.1, v1.2.3) and the common
+    PEP 440 forms (1.2, 1.2.3a1, 1.2rc1, 1.2.post1, 1.2.dev0); release
+    numbers compare numerically with trailing zeros ignored, and
+    dev < pre-release < release < post-release. Build metadata and local
+    version labels (+...) are ignored.
+    """
+    version = version.strip().lower().lstrip("v").split("+", 1)[0]
+    match = re.match(r"(\d+(?:\.\d+)*)(.*)$", version)
+    if match is None:
+        return ((), 1, ())
+    release = [int(part) for part in match.group(1).split(".")]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    rest = match.group(2).lstrip(".-_")
+
+    if not rest:
+        return (tuple(release), 2, ())
+    if rest.startswith("dev"):
+        return (tuple(release), 0, (_number(rest[3:]),))
+    if rest.startswith(("post", "r")) and not rest.startswith("rc"):
+        return (tuple(release), 3, (_number(rest.lstrip("postr.-_")),))
+
+    # Pre-release: PEP 440 tag + number, or semver dot-separated identifiers
+    tag = re.match(r"([a-z]+)[.-]?(\d*)$", rest)
+    if tag and tag.group(1) in PRE_RELEASE_TAGS:
+        return (tuple(release), 1, ((0, PRE_RELEASE_TAGS[tag.group(1)]), (0, _number(tag.group(2)))))
+    identifiers = tuple(
+        (0, int(part)) if part.isdigit() else (1, part)
+        for part in re.split(r"[.-]", rest)
+    )
+    return (tuple(release), 1, identifiers)
+
+
+def _number(text: str) -> int:
+    digits = re.match(r"[._-]?(\d+)", text)
+    return int(digits.group(1)) if digits else 0
+
+
+def lowest_version(spec: str) -> Optional[str]:
+    """
+    Lowest version a version requirement allows
+
+    "==1.2.3", ">=1.2.3,<2", "~=1.2.3", "^1.2.3", "~1.2", "1.2" all give the
+    version number they start from; wildcards, tags, URLs and upper bounds
+    alone give None.
+    """
+    # ">= 1.2" -> ">=1.2"
+    spec = re.sub(r"([<>=~^!]=?)\s+", r"\1", spec)
+    for clause in re.split(r"[,\s]+|\|\|", spec):
+        clause = clause.strip()
+        if not clause or clause.startswith(("<", "!")):
+            continue
+        clause = clause.lstrip("=~^>")
+        match = VERSION_NUMBER.fullmatch(clause)
+        if match and "*" not in clause and not clause.endswith((".x", ".X")):
+            return match.group(1)
+        return None
+    return None
+
+
+def parse_requirements(text: str) -> List[ManifestDependency]:
+    """requirements.txt: name[extras] <spec> ; markers; options, URLs and editables are skipped"""
+    dependencies = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.split(" #", 1)[0].split(";", 1)[0].strip()
+        if not line or line.startswith(("#", "-", "git+", "http:", "https:", "file:")) or "@" in line:
+            continue
+        match = REQUIREMENT.match(line)
+        if match is None:
+            continue
+        version = lowest_version(match.group(3))
+        if version is not None:
+            dependencies.append(ManifestDependency(PYPI, normalize_name(PYPI, match.group(1)), version, number))
+    return dependencies
+
+
+def parse_package_json(text: str) -> List[ManifestDependency]:
+    """package.json: dependencies, devDependencies, optionalDependencies and peerDependencies"""
+    try:
+        manifest = json.loads(text)
+    except ValueError:
+        return []
+    if not isinstance(manifest, dict):
+        return []
+
+    dependencies = []
+    for section in ("dependencies", "devDependencies", "optionalDependencies", "peerDependencies"):
+        declared = manifest.get(section)
+        if not isinstance(declared, dict):
+            continue
+        for name, spec in declared.items():
+            # Aliases, git and file references name no registry version
+            if not isinstance(spec, str) or ":" in spec or "/" in spec:
+                continue
+            version = lowest_version(spec)
+            if version is not None:
+                dependencies.append(ManifestDependency(NPM, name, version, _line_of(text, f'"{name}"')))
+    return dependencies
+
+
+def parse_go_mod(text: str) -> List[ManifestDependency]:
+    """go.mod: require directives, single-line and block"""
+    dependencies = []
+    in_block = False
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.split("//", 1)[0].strip()
+        if in_block:
+            if line == ")":
+                in_block = False
+                continue
+        elif line.startswith("require ("):
+            in_block = True
+            continue
+        elif line.startswith("require "):
+            line = line[len("require "):].strip()
+        else:
+            continue
+        match = GO_REQUIRE.match(line)
+        if match:
+            dependencies.append(ManifestDependency(GO, match.group(1), match.group(2), number))
+    return dependencies
+
+
+def parse_cargo_toml(text: str) -> List[ManifestDependency]:
+    """Cargo.toml: [dependencies], [dev-dependencies], [build-dependencies] and target-specific tables"""
+    try:
+        manifest = tomllib.loads(text)
+    except tomllib.TOMLDecodeError:
+        return []
+
+    tables = [manifest]
+    tables.extend(target for target in manifest.get("target", {}).values() if isinstance(target, dict))
+    dependencies = []
+    for table in tables:
+        for section in ("dependencies", "dev-dependencies", "build-dependencies"):
+            for name, spec in table.get(section, {}).items():
+                if isinstance(spec, dict):
+                    name = spec.get("package", name)
+                    spec = spec.get("version")
+                if not isinstance(spec, str):
+                    continue  # path or git dependency
+                version = lowest_version(spec)
+                if version is not None:
+                    dependencies.append(ManifestDependency(
+                        CRATES, normalize_name(CRATES, name), version, _line_of(text, name)
+                    ))
+    return dependencies
+
+
+def _line_of(text: str, needle: str) -> Optional[int]:
+    position = text.find(needle)
+    return None if position < 0 else text.count("\n", 0, position) + 1
+
+
+MANIFEST_PARSERS: Dict[str, Callable[[str], List[ManifestDependency]]] = {
+    "requirements.txt": parse_requirements,
+    "package.json": parse_package_json,
+    "go.mod": parse_go_mod,
+    "cargo.toml": parse_cargo_toml,
+}
+
+
+def manifest_parser(filename: Optional[str]) -> Optional[Callable[[str], List[ManifestDependency]]]:
+    """
+    Parser for a manifest file name, None if the file is not a manifest
+
+    requirements-*.txt and *requirements.txt variants count as requirements files.
+    """
+    if not filename:
+        return None
+    name = PurePosixPath(filename.replace("\\", "/")).name.lower()
+    if name in MANIFEST_PARSERS:
+        return MANIFEST_PARSERS[name]
+    if name.endswith(".txt") and "requirements" in name:
+        return parse_requirements
+    return None
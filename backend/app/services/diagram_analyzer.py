@@ -4,17 +4,33 @@ AI-powered architecture diagram analysis using Ollama LLaVA (Local & Free)
 """
 
 import uuid
-import base64
+import asyncio
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import orjson
 import structlog
 
 from app.core.config import settings
-from app.services.prompts import DIAGRAM_ANALYSIS_PROMPT
-from app.services.ollama_service import OllamaService
+from app.core import metrics, offload, tracing
+from app.core.serialization import SegmentedText
+from app.services.prompts import (
+    DIAGRAM_ANALYSIS_PROMPT,
+    DIAGRAM_OCR_PROMPT,
+    DIAGRAM_TOPOLOGY_PROMPT
+)
+from app.services.diagram_ocr import OCRLayout, extract_ocr_layout
+from app.services.diagram_cache import compute_dhash, diagram_cache, label_set
+from app.services.inference_backend import GenerationResult, get_inference_backend
+from app.services.svg_topology import DiagramTopology, SVGTopologyError, extract_svg_topology
 
 logger = structlog.get_logger(__name__)
 
+# System prompt for architecture analysis
+ARCHITECTURE_SYSTEM_PROMPT = """You are an expert security architect specializing in Zero Trust architecture,
+Secure-by-Design principles, and infrastructure security. You have deep knowledge of cloud security,
+network segmentation, and compliance frameworks. Analyze architecture diagrams thoroughly and provide
+detailed, actionable security findings in JSON format."""
+
 
 class DiagramAnalyzerService:
     """
@@ -22,16 +38,17 @@ class DiagramAnalyzerService:
     """
 
     def __init__(self):
-        self.ollama = OllamaService(
-            base_url=settings.OLLAMA_BASE_URL,
-            model=settings.OLLAMA_MODEL_VISION
-        )
+        self.vision_llm = get_inference_backend(settings.OLLAMA_MODEL_VISION)
+        # Text model for diagrams whose topology can be read without vision
+        self.text_llm = get_inference_backend(settings.OLLAMA_MODEL_CODE)
 
     async def analyze(
         self,
         file_content: bytes,
         filename: str,
-        content_type: str
+        content_type: str,
+        include_timings: bool = False,
+        client_id: str = ""
     ) -> Dict[str, Any]:
         """
         Perform security analysis on architecture diagram using Ollama LLaVA
@@ -40,6 +57,8 @@ class DiagramAnalyzerService:
             file_content: Image file bytes
             filename: Original filename
             content_type: MIME type
+            include_timings: Add per-stage timings to the response metadata
+            client_id: Client the analysis is for; cached analyses are only shared within a client
 
         Returns:
             Analysis results with components, weaknesses, and recommendations
@@ -51,61 +70,212 @@ class DiagramAnalyzerService:
                 content_type=content_type
             )
 
-            # Generate analysis ID
-            analysis_id = str(uuid.uuid4())
+            with tracing.record_stages() as spans, tracing.span("diagram.analyze", content_type=content_type):
+                results = await self._analyze(file_content, filename, content_type, client_id)
+
+            if include_timings:
+                results["metadata"]["timings"] = tracing.stage_timings(spans)
+
+            return results
+
+        except Exception as e:
+            logger.error("Diagram analysis failed", error=str(e), exc_info=True)
+            raise
+
+    async def _analyze(
+        self,
+        file_content: bytes,
+        filename: str,
+        content_type: str,
+        client_id: str
+    ) -> Dict[str, Any]:
+        """
+        Pick the cheapest analysis path for the diagram and run it
+        """
+        # Generate analysis ID
+        analysis_id = str(uuid.uuid4())
+
+        # Raster diagrams with legible labels can go to the text model
+        ocr_mode = settings.DIAGRAM_ANALYSIS_MODE == "ocr" and content_type != "image/svg+xml"
+        layout = None
+        ocr_done = False
+
+        # Re-exports of an already analyzed diagram reuse the client's stored analysis
+        fingerprint = None
+        content_hash = None
+        labels = None
+        label_task = None
+        if settings.DIAGRAM_CACHE_ENABLED and content_type != "image/svg+xml":
+            with tracing.span("diagram.cache_lookup"):
+                fingerprint = await self._fingerprint(file_content)
+                cached = None
+                if fingerprint is not None:
+                    content_hash = await offload.sha256_hexdigest(file_content)
+                    cached = diagram_cache.lookup(client_id, *fingerprint, content_hash)
+            if cached is None and fingerprint is not None:
+                if ocr_mode or diagram_cache.has_near(client_id, *fingerprint):
+                    # Other bytes with the same layout only match with the same labels
+                    with tracing.span("diagram.ocr"):
+                        label_layout = await self._extract_ocr_layout(file_content)
+                    ocr_done = True
+                    if label_layout is not None:
+                        labels = label_set([label.text for label in label_layout.labels])
+                        cached = diagram_cache.lookup(client_id, *fingerprint, content_hash, labels)
+                    if ocr_mode:
+                        layout = label_layout
+                else:
+                    # The stored entry needs labels to confirm later re-exports: OCR during inference
+                    label_task = asyncio.create_task(self._extract_ocr_layout(file_content))
+            metrics.CACHE_REQUESTS.labels("diagram_phash", "miss" if cached is None else "hit").inc()
+            if cached is not None:
+                metrics.ANALYSES.labels("diagram", "cache").inc()
+                return self._from_cache(cached, analysis_id, filename, file_content, content_type)
+
+        # SVGs carry their labels and connectors as text: skip the vision model
+        topology = None
+        if settings.SVG_FAST_PATH_ENABLED and content_type == "image/svg+xml":
+            with tracing.span("diagram.svg_topology"):
+                topology = await self._extract_svg_topology(file_content)
+
+        if topology is None and ocr_mode and not ocr_done:
+            with tracing.span("diagram.ocr"):
+                layout = await self._extract_ocr_layout(file_content)
+
+        if topology is not None:
+            analysis_mode = "svg_topology"
+            ai_model = settings.OLLAMA_MODEL_CODE
+            prompt = DIAGRAM_TOPOLOGY_PROMPT.format(topology=topology.to_prompt())
+            with tracing.span("diagram.inference", mode=analysis_mode):
+                generation = await self._call_text_model(prompt)
+        elif layout is not None:
+            analysis_mode = "ocr"
+            ai_model = settings.OLLAMA_MODEL_CODE
+            prompt = DIAGRAM_OCR_PROMPT.format(layout=layout.to_prompt())
+            with tracing.span("diagram.inference", mode=analysis_mode):
+                generation = await self._call_text_model(prompt)
+        else:
+            analysis_mode = "vision"
+            ai_model = settings.OLLAMA_MODEL_VISION
 
             # Convert image to base64 for Ollama
-            image_b64 = base64.b64encode(file_content).decode('utf-8')
+            with tracing.span("diagram.encode"):
+                image_b64 = await offload.b64encode(file_content)
 
             # Build prompt
             prompt = DIAGRAM_ANALYSIS_PROMPT
 
             # Call Ollama vision model
-            ai_response = await self._call_vision_model(prompt, image_b64)
-
-            # Parse AI response
-            results = self._parse_ai_response(ai_response)
-
-            # Add metadata
-            results.update({
-                "analysis_id": analysis_id,
-                "timestamp": datetime.utcnow().isoformat(),
-                "metadata": {
-                    "filename": filename,
-                    "file_size": len(file_content),
-                    "content_type": content_type,
-                    "analyzer_version": "1.0.0",
-                    "ai_model": settings.OLLAMA_MODEL_VISION
-                }
-            })
+            with tracing.span("diagram.inference", mode=analysis_mode):
+                generation = await self._call_vision_model(prompt, image_b64, content_type)
 
-            return results
+        # Parse AI response
+        with tracing.span("diagram.parse"):
+            results = await self._parse_ai_response(generation.text)
+
+        # Add metadata
+        results.update({
+            "analysis_id": analysis_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "metadata": {
+                "filename": filename,
+                "file_size": len(file_content),
+                "content_type": content_type,
+                "analyzer_version": "1.0.0",
+                "ai_model": ai_model,
+                "analysis_mode": analysis_mode,
+                "generation": generation.usage()
+            }
+        })
+        if topology is not None:
+            results["metadata"]["topology"] = {
+                "components": len(topology.components),
+                "connections": len(topology.edges)
+            }
+        if layout is not None:
+            results["metadata"]["ocr"] = {
+                "labels": len(layout.labels),
+                "confidence": round(layout.confidence, 1)
+            }
+
+        metrics.ANALYSES.labels("diagram", analysis_mode).inc()
+        metrics.observe_findings("diagram", results["weaknesses"])
+
+        # Only cache analyses the model actually produced
+        if label_task is not None:
+            label_layout = await label_task
+            if label_layout is not None:
+                labels = label_set([label.text for label in label_layout.labels])
+        if fingerprint is not None and results["components"]:
+            diagram_cache.add(client_id, *fingerprint, content_hash, labels, orjson.dumps(results))
 
+        return results
+
+    async def _fingerprint(self, file_content: bytes) -> Optional[Tuple[int, float]]:
+        """
+        Perceptual hash of the diagram, or None if the image cannot be decoded
+        """
+        try:
+            # Pillow releases the GIL while decoding: the thread pool suffices
+            return await offload.run("dhash", compute_dhash, file_content, size=len(file_content))
         except Exception as e:
-            logger.error("Diagram analysis failed", error=str(e), exc_info=True)
-            raise
+            logger.warning("Diagram fingerprinting failed", error=str(e))
+            return None
+
+    def _from_cache(
+        self,
+        cached: Tuple[bytes, int],
+        analysis_id: str,
+        filename: str,
+        file_content: bytes,
+        content_type: str
+    ) -> Dict[str, Any]:
+        """
+        Build a response from a cached analysis of a near-identical diagram
+        """
+        stored, distance = cached
+        results = orjson.loads(stored)
+        cached_analysis_id = results["analysis_id"]
+
+        logger.info(
+            "Diagram analysis served from cache",
+            cached_analysis_id=cached_analysis_id,
+            distance=distance
+        )
+
+        results.update({
+            "analysis_id": analysis_id,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        results["metadata"].update({
+            "filename": filename,
+            "file_size": len(file_content),
+            "content_type": content_type,
+            "cache_hit": True,
+            "cache_distance": distance,
+            "cached_analysis_id": cached_analysis_id
+        })
+        # Nothing was generated for this request
+        results["metadata"].pop("generation", None)
+        return results
 
     async def _call_vision_model(
         self,
         prompt: str,
-        image_b64: str
-    ) -> str:
+        image_b64: SegmentedText,
+        image_type: str
+    ) -> GenerationResult:
         """
-        Call Ollama LLaVA vision model
+        Call the vision model (LLaVA by default)
         """
         try:
-            logger.debug("Using Ollama LLaVA for diagram analysis")
-
-            # System prompt for architecture analysis
-            system_prompt = """You are an expert security architect specializing in Zero Trust architecture,
-Secure-by-Design principles, and infrastructure security. You have deep knowledge of cloud security,
-network segmentation, and compliance frameworks. Analyze architecture diagrams thoroughly and provide
-detailed, actionable security findings in JSON format."""
+            logger.debug("Using vision model for diagram analysis")
 
-            response = await self.ollama.generate_with_vision(
+            response = await self.vision_llm.generate_with_vision(
                 prompt=prompt,
                 image_data=image_b64,
-                system_prompt=system_prompt
+                system_prompt=ARCHITECTURE_SYSTEM_PROMPT,
+                image_type=image_type,
+                json_mode=settings.AI_JSON_MODE
             )
 
             return response
@@ -114,7 +284,86 @@ detailed, actionable security findings in JSON format."""
             logger.error("Vision model call failed", error=str(e))
             raise
 
-    def _parse_ai_response(self, response: str) -> Dict[str, Any]:
+    async def _call_text_model(self, prompt: str) -> GenerationResult:
+        """
+        Call the text model with a textual diagram description
+        """
+        try:
+            logger.debug("Using text model for diagram analysis")
+
+            response = await self.text_llm.generate(
+                prompt=prompt,
+                system_prompt=ARCHITECTURE_SYSTEM_PROMPT,
+                temperature=settings.AI_TEMPERATURE,
+                max_tokens=settings.AI_MAX_TOKENS,
+                json_mode=settings.AI_JSON_MODE
+            )
+
+            return response
+
+        except Exception as e:
+            logger.error("Text model call failed", error=str(e))
+            raise
+
+    async def _extract_svg_topology(self, file_content: bytes) -> Optional[DiagramTopology]:
+        """
+        Extract the SVG topology, or None when the vision model should be used instead
+
+        Parsing and label matching hold the GIL, so they run in the process pool.
+        """
+        try:
+            # Cost follows the element count, not the size: even small SVGs leave the loop
+            topology = await offload.run(
+                "svg_topology",
+                extract_svg_topology,
+                file_content,
+                size=max(len(file_content), settings.OFFLOAD_MIN_BYTES),
+                pool="process"
+            )
+        except SVGTopologyError as e:
+            logger.warning("SVG topology extraction failed", error=str(e))
+            return None
+
+        if not topology.components:
+            logger.info("SVG has no labelled components, falling back to vision model")
+            return None
+
+        logger.info(
+            "SVG topology extracted",
+            components=len(topology.components),
+            connections=len(topology.edges)
+        )
+        return topology
+
+    async def _extract_ocr_layout(self, file_content: bytes) -> Optional[OCRLayout]:
+        """
+        OCR the diagram, or None when confidence is too low for the text model
+        """
+        try:
+            layout = await extract_ocr_layout(file_content)
+        except Exception as e:
+            logger.warning("Diagram OCR failed", error=str(e))
+            return None
+
+        if (
+            len(layout.labels) < settings.OCR_MIN_LABELS
+            or layout.confidence < settings.OCR_MIN_CONFIDENCE
+        ):
+            logger.info(
+                "OCR confidence too low, falling back to vision model",
+                labels=len(layout.labels),
+                confidence=round(layout.confidence, 1)
+            )
+            return None
+
+        logger.info(
+            "Diagram labels extracted with OCR",
+            labels=len(layout.labels),
+            confidence=round(layout.confidence, 1)
+        )
+        return layout
+
+    async def _parse_ai_response(self, response: str) -> Dict[str, Any]:
         """
         Parse AI response into structured format
         """
@@ -131,7 +380,7 @@ detailed, actionable security findings in JSON format."""
                 json_end = response.find("```", json_start)
                 response = response[json_start:json_end].strip()
 
-            data = json.loads(response)
+            data = await offload.loads(response)
 
             return {
                 "components": data.get("components", []),
@@ -147,6 +396,7 @@ detailed, actionable security findings in JSON format."""
 
         except json.JSONDecodeError as e:
             logger.error("Failed to parse AI response as JSON", error=str(e))
+            metrics.AI_PARSE_FAILURES.labels("diagram").inc()
             return {
                 "components": [],
                 "security_assessment": {
@@ -0,0 +1,241 @@
+"""
+Diagram Cache
+Perceptual-hash index that returns stored analyses for near-identical diagram uploads
+
+The dHash only captures the layout of boxes and lines, so two diagrams with
+the same shapes but different labels hash alike. A near match is therefore
+only served once its content is confirmed (same bytes, or the same OCR
+labels), and only to the client that stored it.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+from itertools import combinations
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+HASH_BITS = 64
+HASH_CHUNKS = 4
+CHUNK_BITS = HASH_BITS // HASH_CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Re-exports keep the aspect ratio; different diagrams rarely share hash *and* shape
+MAX_ASPECT_RATIO_DELTA = 0.05
+
+
+def compute_dhash(content: bytes) -> Tuple[int, float]:
+    """
+    Compute a 64-bit difference hash of an image
+
+    The image is cropped to its content and contrast-normalised first, so
+    padding, compression and resizing changes from re-exports barely move
+    the hash.
+
+    Args:
+        content: Raster image bytes
+
+    Returns:
+        Tuple of (hash, aspect ratio of the cropped content)
+    """
+    from PIL import Image, ImageChops, ImageOps
+
+    image = Image.open(BytesIO(content))
+    image.draft("L", (256, 256))  # Let JPEG decode at reduced size
+    image = ImageOps.exif_transpose(image).convert("L")
+
+    # Crop away uniform margins (background colour taken from the corner)
+    background = Image.new("L", image.size, image.getpixel((0, 0)))
+    bbox = ImageChops.difference(image, background).getbbox()
+    if bbox:
+        image = image.crop(bbox)
+    aspect_ratio = image.width / max(image.height, 1)
+
+    image = ImageOps.autocontrast(image).resize((9, 8), Image.LANCZOS)
+    pixels = list(image.getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+
+    return value, aspect_ratio
+
+
+def label_set(texts: List[str]) -> FrozenSet[str]:
+    """OCR label texts compared case- and whitespace-insensitively"""
+    return frozenset(filter(None, (" ".join(text.lower().split()) for text in texts)))
+
+
+@dataclass
+class _Entry:
+    client_id: str
+    phash: int
+    aspect_ratio: float
+    content_hash: str
+    labels: Optional[FrozenSet[str]]
+    stored_at: float
+    value: bytes
+
+    def confirms(self, content_hash: str, labels: Optional[FrozenSet[str]]) -> bool:
+        """Whether the upload is the stored diagram: same bytes, or the same OCR labels"""
+        if self.content_hash == content_hash:
+            return True
+        return bool(labels) and self.labels == labels
+
+
+class PerceptualHashIndex:
+    """
+    Near-duplicate lookup over 64-bit perceptual hashes
+
+    Uses multi-index hashing: each hash is split into four 16-bit chunks with
+    one exact-match table per chunk. Two hashes within Hamming distance r
+    agree within floor(r / 4) bits on at least one chunk, so a lookup only
+    probes chunk values within that radius and verifies the candidates.
+    Candidates must belong to the same client and be confirmed by content
+    (see _Entry.confirms). Values are stored serialized, and entries are
+    evicted least-recently-used beyond max_entries or max_bytes of values.
+    """
+
+    def __init__(self, max_distance: int, max_entries: int, max_bytes: int, ttl: int):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._tables: List[Dict[int, set]] = [{} for _ in range(HASH_CHUNKS)]
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(
+        self,
+        client_id: str,
+        phash: int,
+        aspect_ratio: float,
+        content_hash: str,
+        labels: Optional[FrozenSet[str]] = None
+    ) -> Optional[Tuple[bytes, int]]:
+        """
+        Find the closest confirmed entry of the client within max_distance
+
+        Args:
+            client_id: Client the upload is analyzed for
+            phash: Perceptual hash of the upload
+            aspect_ratio: Aspect ratio of its cropped content
+            content_hash: SHA-256 of the upload
+            labels: OCR label set of the upload, None when not OCRed (exact matches only)
+
+        Returns:
+            Tuple of (stored value, Hamming distance), or None on a miss
+        """
+        best: Optional[Tuple[int, int]] = None
+        for candidate_id, entry, distance in self._near(client_id, phash, aspect_ratio):
+            if not entry.confirms(content_hash, labels):
+                continue
+            if best is None or distance < best[1]:
+                best = (candidate_id, distance)
+                if distance == 0:
+                    break
+
+        if best is None:
+            return None
+
+        self._entries.move_to_end(best[0])
+        return self._entries[best[0]].value, best[1]
+
+    def has_near(self, client_id: str, phash: int, aspect_ratio: float) -> bool:
+        """Whether the client has an entry within max_distance, confirmed or not"""
+        return next(self._near(client_id, phash, aspect_ratio), None) is not None
+
+    def add(
+        self,
+        client_id: str,
+        phash: int,
+        aspect_ratio: float,
+        content_hash: str,
+        labels: Optional[FrozenSet[str]],
+        value: bytes
+    ):
+        """Store a client's serialized value under a perceptual hash, with what confirms later matches"""
+        if len(value) > self.max_bytes:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = _Entry(
+            client_id, phash, aspect_ratio, content_hash, labels, time.monotonic(), value
+        )
+        self._bytes += len(value)
+        for table, chunk in zip(self._tables, self._chunks(phash)):
+            table.setdefault(chunk, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._bytes -= len(entry.value)
+        for table, chunk in zip(self._tables, self._chunks(entry.phash)):
+            bucket = table[chunk]
+            bucket.discard(entry_id)
+            if not bucket:
+                del table[chunk]
+
+    def _near(self, client_id: str, phash: int, aspect_ratio: float) -> Iterator[Tuple[int, _Entry, int]]:
+        """(id, entry, Hamming distance) of the client's live entries within max_distance"""
+        now = time.monotonic()
+        seen = set()
+        for candidate_id in self._candidates(phash):
+            if candidate_id in seen:
+                continue
+            seen.add(candidate_id)
+
+            entry = self._entries[candidate_id]
+            if entry.client_id != client_id or now - entry.stored_at > self.ttl:
+                continue
+            if abs(entry.aspect_ratio - aspect_ratio) > MAX_ASPECT_RATIO_DELTA * aspect_ratio:
+                continue
+
+            distance = (entry.phash ^ phash).bit_count()
+            if distance <= self.max_distance:
+                yield candidate_id, entry, distance
+
+    def _candidates(self, phash: int) -> Iterator[int]:
+        radius = self.max_distance // HASH_CHUNKS
+        for table, chunk in zip(self._tables, self._chunks(phash)):
+            for probe in _neighbours(chunk, radius):
+                yield from table.get(probe, ())
+
+    @staticmethod
+    def _chunks(phash: int) -> List[int]:
+        return [(phash >> (i * CHUNK_BITS)) & CHUNK_MASK for i in range(HASH_CHUNKS)]
+
+
+def _neighbours(value: int, radius: int) -> Iterator[int]:
+    """All chunk values within the given Hamming radius of value"""
+    yield value
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), distance):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            yield flipped
+
+
+# Shared per-process index
+diagram_cache = PerceptualHashIndex(
+    max_distance=settings.DIAGRAM_CACHE_MAX_DISTANCE,
+    max_entries=settings.DIAGRAM_CACHE_MAX_ENTRIES,
+    max_bytes=settings.DIAGRAM_CACHE_MAX_BYTES,
+    ttl=settings.DIAGRAM_CACHE_TTL
+)
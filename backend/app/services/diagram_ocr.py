@@ -0,0 +1,171 @@
+"""
+Diagram OCR Service
+Tesseract-based label and layout extraction for raster diagrams, run in a process pool
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.core import deadline
+
+logger = structlog.get_logger(__name__)
+
+# Tesseract works best on text a few dozen pixels high; huge exports are scaled down
+OCR_MAX_DIMENSION = 4000
+OCR_MIN_DIMENSION = 1000
+
+# Page segmentation mode 11: sparse text in no particular order, which suits diagrams
+TESSERACT_CONFIG = "--psm 11"
+OCR_TIMEOUT_GRACE = 5  # Seconds past the Tesseract timeout before the worker is given up on
+
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class OCRLabel:
+    """A line of text recognised in the diagram"""
+    text: str
+    confidence: float
+    # Bounding box relative to the image size (0.0 - 1.0)
+    bbox: Tuple[float, float, float, float]
+
+    @property
+    def region(self) -> str:
+        x = (self.bbox[0] + self.bbox[2]) / 2
+        y = (self.bbox[1] + self.bbox[3]) / 2
+        row = ("top", "middle", "bottom")[min(int(y * 3), 2)]
+        col = ("left", "center", "right")[min(int(x * 3), 2)]
+        return "center" if (row, col) == ("middle", "center") else f"{row}-{col}"
+
+
+@dataclass
+class OCRLayout:
+    """Labels recognised in a diagram and the overall OCR confidence"""
+    labels: List[OCRLabel] = field(default_factory=list)
+    width: int = 0
+    height: int = 0
+
+    @property
+    def confidence(self) -> float:
+        """Mean word confidence weighted by label length"""
+        total = sum(len(label.text) for label in self.labels)
+        if not total:
+            return 0.0
+        return sum(label.confidence * len(label.text) for label in self.labels) / total
+
+    def to_prompt(self) -> str:
+        """
+        Render labels in reading order with coarse and relative positions
+        """
+        lines = [f"Image size: {self.width}x{self.height} px", f"Labels ({len(self.labels)}):"]
+        for label in sorted(self.labels, key=lambda l: (round(l.bbox[1], 2), l.bbox[0])):
+            x0, y0, x1, y1 = label.bbox
+            lines.append(
+                f"- \"{label.text}\" at {label.region} "
+                f"(x {x0:.0%}-{x1:.0%}, y {y0:.0%}-{y1:.0%})"
+            )
+        return "\n".join(lines)
+
+
+def _ocr_image(content: bytes, timeout: float) -> OCRLayout:
+    """
+    Run Tesseract on an image and group words into labels
+
+    Executed in a worker process; imports stay local so the API process does
+    not pay for them. pytesseract kills the tesseract subprocess after
+    `timeout` seconds (raising RuntimeError), so a slow image does not keep
+    the worker busy after the request has given up on it.
+    """
+    import pytesseract
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(content))
+    image = ImageOps.exif_transpose(image).convert("L")
+    width, height = image.size
+
+    longest = max(width, height)
+    if longest > OCR_MAX_DIMENSION:
+        image.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION))
+    elif longest < OCR_MIN_DIMENSION:
+        scale = OCR_MIN_DIMENSION / longest
+        image = image.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+    scaled_width, scaled_height = image.size
+
+    data = pytesseract.image_to_data(
+        image,
+        config=TESSERACT_CONFIG,
+        output_type=pytesseract.Output.DICT,
+        timeout=timeout
+    )
+
+    # Group words by Tesseract's block/paragraph/line numbering
+    lines: Dict[Tuple[int, int, int], List[int]] = {}
+    for i, word in enumerate(data["text"]):
+        if word.strip() and float(data["conf"][i]) >= 0:
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(i)
+
+    layout = OCRLayout(width=width, height=height)
+    for indexes in lines.values():
+        left = min(data["left"][i] for i in indexes)
+        top = min(data["top"][i] for i in indexes)
+        right = max(data["left"][i] + data["width"][i] for i in indexes)
+        bottom = max(data["top"][i] + data["height"][i] for i in indexes)
+        layout.labels.append(OCRLabel(
+            text=" ".join(data["text"][i].strip() for i in indexes),
+            confidence=sum(float(data["conf"][i]) for i in indexes) / len(indexes),
+            bbox=(
+                left / scaled_width,
+                top / scaled_height,
+                right / scaled_width,
+                bottom / scaled_height
+            )
+        ))
+
+    return layout
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """Get the shared OCR process pool, creating it on first use"""
+    global _ocr_pool
+    if _ocr_pool is None:
+        _ocr_pool = ProcessPoolExecutor(max_workers=settings.OCR_WORKERS)
+    return _ocr_pool
+
+
+def shutdown_ocr_pool():
+    """Shut down the OCR process pool"""
+    global _ocr_pool
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown(wait=False, cancel_futures=True)
+        _ocr_pool = None
+
+
+async def extract_ocr_layout(content: bytes) -> OCRLayout:
+    """
+    Extract diagram labels and their layout with OCR
+
+    Args:
+        content: Raster image bytes (PNG, JPEG)
+
+    Returns:
+        Recognised labels with positions and confidences
+
+    Raises:
+        RuntimeError: If Tesseract ran out of time (its process is killed)
+        asyncio.TimeoutError: If the worker did not answer shortly after that
+    """
+    timeout = deadline.timeout(settings.OCR_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    # Tesseract enforces the timeout itself; waiting a little longer leaves
+    # it time to be killed and report, and still bounds a stuck worker
+    return await asyncio.wait_for(
+        loop.run_in_executor(get_ocr_pool(), _ocr_image, content, timeout),
+        timeout=timeout + OCR_TIMEOUT_GRACE
+    )
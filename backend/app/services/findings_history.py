@@ -0,0 +1,204 @@
+"""
+Findings History
+Daily rollups of stored findings and the aggregate queries served from them
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from app.core.database import get_engine
+from app.models.analysis import Analysis, Finding
+from app.models.rollups import RuleDailyRollup, SeverityDailyRollup
+
+SEVERITY_FIELDS = ("critical", "high", "medium", "low", "info")
+SUMMARY_FIELDS = ("total_issues",) + SEVERITY_FIELDS
+
+
+def _upsert(conn, model, keys: Tuple[str, ...], rows: List[Dict[str, Any]]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE adding the counters to the existing row
+
+    Rows are sorted by key so that concurrent writers (other workers) lock
+    rollup rows in the same order and cannot deadlock.
+    """
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = model.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            column.name: column + statement.excluded[column.name]
+            for column in table.columns
+            if column.name not in keys
+        }
+    )
+    rows.sort(key=lambda row: tuple(row[key] for key in keys))
+    return conn.execute(statement, rows)
+
+
+async def update_rollups(conn, analysis_rows: List[Dict[str, Any]], finding_rows: Iterable[Dict[str, Any]]):
+    """
+    Add a batch of stored analyses to the daily rollups
+
+    Called in the transaction that inserts them, so the rollups always
+    match the raw tables.
+
+    Args:
+        conn: Connection with the transaction open
+        analysis_rows: The rows inserted into analyses
+        finding_rows: The rows inserted into findings, as column dicts
+    """
+    severity_totals: Dict[Tuple[date, str, str], Dict[str, int]] = defaultdict(
+        lambda: dict.fromkeys(("analyses",) + SUMMARY_FIELDS, 0)
+    )
+    for row in analysis_rows:
+        totals = severity_totals[(row["created_at"].date(), row["analyzer"], row["language"] or "")]
+        totals["analyses"] += 1
+        for field in SUMMARY_FIELDS:
+            totals[field] += row[field]
+
+    rule_totals: Dict[Tuple[date, str, str, str], int] = defaultdict(int)
+    for row in finding_rows:
+        # Diagram weaknesses have no rule ID
+        if row["rule_id"]:
+            rule_totals[(row["created_at"].date(), row["analyzer"], row["rule_id"], row["severity"])] += 1
+
+    await _upsert(
+        conn,
+        SeverityDailyRollup,
+        ("day", "analyzer", "language"),
+        [
+            {"day": day, "analyzer": analyzer, "language": language, **totals}
+            for (day, analyzer, language), totals in severity_totals.items()
+        ]
+    )
+    if rule_totals:
+        await _upsert(
+            conn,
+            RuleDailyRollup,
+            ("day", "analyzer", "rule_id", "severity"),
+            [
+                {"day": day, "analyzer": analyzer, "rule_id": rule_id, "severity": severity, "findings": count}
+                for (day, analyzer, rule_id, severity), count in rule_totals.items()
+            ]
+        )
+
+
+def _since(days: int) -> date:
+    """First day of a window of `days` days ending today (UTC)"""
+    return datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+
+
+async def top_rules(days: int = 7, limit: int = 10, analyzer: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Most frequent rules (CWE or vulnerability IDs) over the last days
+
+    Returns:
+        Rules by descending finding count, with their counts per severity
+    """
+    query = (
+        select(RuleDailyRollup.rule_id, RuleDailyRollup.severity, func.sum(RuleDailyRollup.findings))
+        .where(RuleDailyRollup.day >= _since(days))
+        .group_by(RuleDailyRollup.rule_id, RuleDailyRollup.severity)
+    )
+    if analyzer is not None:
+        query = query.where(RuleDailyRollup.analyzer == analyzer)
+
+    async with get_engine().connect() as conn:
+        rows = (await conn.execute(query)).all()
+
+    rules: Dict[str, Dict[str, Any]] = {}
+    for rule_id, severity, count in rows:
+        rule = rules.setdefault(rule_id, {"rule_id": rule_id, "findings": 0, "by_severity": {}})
+        rule["findings"] += int(count)
+        rule["by_severity"][severity] = int(count)
+    return sorted(rules.values(), key=lambda rule: (-rule["findings"], rule["rule_id"]))[:limit]
+
+
+async def severity_trends(
+    days: int = 30,
+    analyzer: Optional[str] = None,
+    language: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Analyses and findings per severity, per day and language
+
+    Returns:
+        One point per day and language, oldest first
+    """
+    columns = [SeverityDailyRollup.analyses] + [getattr(SeverityDailyRollup, field) for field in SUMMARY_FIELDS]
+    query = (
+        select(SeverityDailyRollup.day, SeverityDailyRollup.language, *(func.sum(column) for column in columns))
+        .where(SeverityDailyRollup.day >= _since(days))
+        .group_by(SeverityDailyRollup.day, SeverityDailyRollup.language)
+        .order_by(SeverityDailyRollup.day, SeverityDailyRollup.language)
+    )
+    if analyzer is not None:
+        query = query.where(SeverityDailyRollup.analyzer == analyzer)
+    if language is not None:
+        query = query.where(SeverityDailyRollup.language == language)
+
+    async with get_engine().connect() as conn:
+        rows = (await conn.execute(query)).all()
+
+    return [
+        {
+            "day": day.isoformat(),
+            "language": language or None,
+            **dict(zip(("analyses",) + SUMMARY_FIELDS, (int(value) for value in values)))
+        }
+        for day, language, *values in rows
+    ]
+
+
+async def findings_by_code_hash(code_hash: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Stored analyses of one code hash and their findings, newest first
+
+    Uses the analyses code_hash index and the findings analysis_id index.
+    """
+    analyses_query = (
+        select(
+            Analysis.id, Analysis.created_at, Analysis.language, Analysis.model, Analysis.filename,
+            *(getattr(Analysis, field) for field in SUMMARY_FIELDS)
+        )
+        .where(Analysis.code_hash == code_hash)
+        .order_by(Analysis.created_at.desc())
+        .limit(limit)
+    )
+    async with get_engine().connect() as conn:
+        analyses = (await conn.execute(analyses_query)).all()
+        if not analyses:
+            return []
+        findings = (await conn.execute(
+            select(
+                Finding.analysis_id, Finding.rule_id, Finding.title, Finding.severity,
+                Finding.confidence, Finding.file, Finding.line
+            )
+            .where(Finding.analysis_id.in_([analysis.id for analysis in analyses]))
+            .order_by(Finding.id)
+        )).all()
+
+    by_analysis: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for analysis_id, *values in findings:
+        by_analysis[analysis_id].append(dict(zip(("id", "title", "severity", "confidence", "file", "line"), values)))
+
+    return [
+        {
+            "analysis_id": analysis.id,
+            "created_at": analysis.created_at.isoformat(),
+            "language": analysis.language,
+            "model": analysis.model,
+            "filename": analysis.filename,
+            "summary": {field: getattr(analysis, field) for field in SUMMARY_FIELDS},
+            "findings": by_analysis[analysis.id]
+        }
+        for analysis in analyses
+    ]
@@ -0,0 +1,602 @@
+"""
+Inference Backends
+Backend-independent interface to the chat model servers, with the retries, hedging and accounting they share
+"""
+
+import asyncio
+import ssl
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Protocol, Union
+from urllib.parse import urlsplit
+
+import httpx
+import structlog
+
+from app.core.config import settings
+from app.core import deadline, metrics, tracing
+from app.core.serialization import Text, aiter_chunks, encode_json, loads
+from app.core.clients import get_client_context
+from app.services import inference_policy
+from app.services.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from app.services.model_scheduler import ModelScheduler
+
+logger = structlog.get_logger(__name__)
+
+# Statuses worth retrying: overload, gateway errors, and a 500 when a model runner crashes
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@lru_cache(maxsize=None)
+def _ssl_context() -> ssl.SSLContext:
+    """
+    TLS settings shared by every backend client
+
+    Loading the CA bundle takes tens of milliseconds of CPU, and services are
+    created per request; without sharing, each analysis would block the
+    event loop that long.
+    """
+    return httpx.create_ssl_context()
+
+
+class InferenceError(Exception):
+    """
+    Failed inference backend call
+
+    retryable marks transient failures (connection errors, timeouts,
+    overload) that another attempt may not hit.
+    """
+
+    def __init__(self, message: str, retryable: bool = False, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+@dataclass
+class GenerationResult:
+    """
+    Generated text with the token counts and timings of the call
+
+    Durations are in milliseconds. gpu_seconds is the time the model spent on
+    the request itself (prompt evaluation plus generation); model loads are
+    reported separately because they depend on what ran before, not on the
+    request.
+    """
+    text: str
+    model: str
+    backend: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    load_ms: float = 0.0
+    prompt_eval_ms: float = 0.0
+    eval_ms: float = 0.0
+    total_ms: float = 0.0
+
+    @property
+    def gpu_seconds(self) -> float:
+        return (self.prompt_eval_ms + self.eval_ms) / 1000
+
+    def usage(self) -> Dict[str, Any]:
+        """Accounting fields for analysis metadata"""
+        usage = asdict(self)
+        del usage["text"]
+        for key in ("load_ms", "prompt_eval_ms", "eval_ms", "total_ms"):
+            usage[key] = round(usage[key], 3)
+        usage["gpu_seconds"] = round(self.gpu_seconds, 6)
+        return usage
+
+
+@dataclass
+class StreamChunk:
+    """One parsed line of a streamed chat response"""
+    content: str = ""
+    done: bool = False
+    stats: Optional[Dict[str, Any]] = None  # Token counts / timings, usually on the last chunk
+
+
+@dataclass
+class StreamTimings:
+    """Client-side timings of a streamed call, in milliseconds"""
+    first_token_ms: float = 0.0
+    total_ms: float = 0.0
+
+
+class InferenceBackend(Protocol):
+    """What the analyzers need from a chat model server"""
+
+    model: str
+
+    async def generate(
+        self,
+        prompt: Text,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.1,
+        max_tokens: int = 4096,
+        json_mode: bool = False
+    ) -> GenerationResult:
+        ...
+
+    async def generate_with_vision(
+        self,
+        prompt: Text,
+        image_data: Text,
+        system_prompt: Optional[str] = None,
+        image_type: str = "image/png",
+        json_mode: bool = False
+    ) -> GenerationResult:
+        ...
+
+    async def check_model_availability(self, model_name: str) -> bool:
+        ...
+
+    async def close(self):
+        ...
+
+
+class BaseInferenceService(ABC):
+    """
+    Streaming chat client shared by the backends
+
+    Calls go through the model scheduler, the backend's circuit breaker, the
+    retry policy and hedging, are bounded by the request deadline, and are
+    accounted as a GenerationResult. Subclasses describe the wire format:
+    request bodies, stream lines and usage statistics.
+    """
+
+    name = "inference"  # Span prefix and log field
+    label = "Inference"  # For error messages
+    chat_path = ""
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        scheduler: Optional[ModelScheduler] = None,
+        fallback_urls: Optional[List[str]] = None
+    ):
+        self.base_url = base_url
+        self.backend = urlsplit(base_url).netloc or base_url
+        self.model = model
+        self.client = httpx.AsyncClient(timeout=300.0, headers=self._headers(), verify=_ssl_context())
+        if scheduler is None and settings.MODEL_SCHEDULER_ENABLED:
+            scheduler = self._get_scheduler(base_url)
+        self.scheduler = scheduler
+        # Backends for retries and hedged requests, in order
+        self.backends = [base_url] + [url for url in fallback_urls or [] if url != base_url]
+
+    def _headers(self) -> Dict[str, str]:
+        return {}
+
+    @abstractmethod
+    def _get_scheduler(self, base_url: str) -> ModelScheduler:
+        """The process-wide scheduler for calls to this backend"""
+
+    @abstractmethod
+    def _user_message(self, prompt: Text, image_data: Optional[Text], image_type: str) -> Dict[str, Any]:
+        """The user turn, with the image attached when there is one"""
+
+    @abstractmethod
+    def _chat_body(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        json_mode: bool
+    ) -> Dict[str, Any]:
+        """Streaming chat request body"""
+
+    def _apply_keep_alive(self, body: Dict[str, Any], keep_alive: Optional[Union[str, int]]):
+        """Set how long the backend keeps the model loaded, if it supports that"""
+
+    @abstractmethod
+    def _parse_line(self, line: str) -> Optional[StreamChunk]:
+        """
+        Parse one line of the response stream, None for lines without data
+
+        Raises:
+            InferenceError: If the backend reports an error in the stream
+        """
+
+    @abstractmethod
+    def _result(
+        self,
+        text: str,
+        stats: Dict[str, Any],
+        chunks: int,
+        timings: StreamTimings,
+        backend: str
+    ) -> GenerationResult:
+        """Build the result from the accumulated text and the usage statistics"""
+
+    async def generate(
+        self,
+        prompt: Text,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.1,
+        max_tokens: int = 4096,
+        json_mode: bool = False
+    ) -> GenerationResult:
+        """
+        Generate text
+
+        Args:
+            prompt: User prompt
+            system_prompt: System prompt for context
+            temperature: Sampling temperature (0.0 to 1.0)
+            max_tokens: Maximum tokens to generate
+            json_mode: Constrain the output to a JSON object
+
+        Returns:
+            Generated text with token counts and timings
+        """
+        try:
+            logger.info(
+                "Calling inference backend",
+                backend=self.name,
+                model=self.model,
+                prompt_length=len(prompt)
+            )
+
+            result = await self._chat(self._chat_body(
+                self._messages(prompt, system_prompt),
+                temperature,
+                max_tokens,
+                json_mode
+            ))
+
+            logger.info(
+                "Generation complete",
+                backend=self.name,
+                response_length=len(result.text),
+                prompt_tokens=result.prompt_tokens,
+                completion_tokens=result.completion_tokens
+            )
+
+            return result
+
+        except InferenceError as e:
+            logger.error("Inference API error", backend=self.name, error=str(e), retryable=e.retryable)
+            raise
+        except Exception as e:
+            logger.error("Generation failed", backend=self.name, error=str(e))
+            raise
+
+    async def generate_with_vision(
+        self,
+        prompt: Text,
+        image_data: Text,
+        system_prompt: Optional[str] = None,
+        image_type: str = "image/png",
+        json_mode: bool = False
+    ) -> GenerationResult:
+        """
+        Generate text from an image with a vision model
+
+        Args:
+            prompt: Text prompt
+            image_data: Base64 encoded image
+            system_prompt: System prompt
+            image_type: MIME type of the image
+            json_mode: Constrain the output to a JSON object
+
+        Returns:
+            Generated analysis with token counts and timings
+        """
+        try:
+            logger.info("Calling vision model", backend=self.name, model=self.model)
+
+            return await self._chat(self._chat_body(
+                self._messages(prompt, system_prompt, image_data, image_type),
+                None,
+                None,
+                json_mode
+            ))
+
+        except Exception as e:
+            logger.error("Vision generation failed", backend=self.name, error=str(e))
+            raise
+
+    def _messages(
+        self,
+        prompt: Text,
+        system_prompt: Optional[str],
+        image_data: Optional[Text] = None,
+        image_type: str = "image/png"
+    ) -> List[Dict[str, Any]]:
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append(self._user_message(prompt, image_data, image_type))
+        return messages
+
+    async def _chat(self, payload: Dict[str, Any]) -> GenerationResult:
+        """
+        Streaming chat call with retries, and hedging when enabled
+
+        The call is bounded by the request deadline, and cancelling it (deadline,
+        client disconnect) closes the stream so the backend stops generating.
+        Retries move on to the next backend in self.backends; a hedged
+        request goes to the backend after the one being tried. Backends whose
+        circuit breaker is open are skipped.
+
+        Raises:
+            CircuitOpenError: If every backend's breaker is open
+        """
+        model = metrics.model_label(payload["model"])
+
+        def on_retry(retry_state):
+            metrics.OLLAMA_RETRIES.labels(model).inc()
+
+        def on_hedge(index: int):
+            metrics.OLLAMA_HEDGED_REQUESTS.labels(model).inc()
+            logger.info("Hedging slow inference call", backend=self.name, model=payload["model"])
+
+        async def attempt(number: int) -> GenerationResult:
+            start = number % len(self.backends)
+            available = self._available_backends(self.backends[start:] + self.backends[:start])
+            primary = available[0]
+            delay = None
+            if settings.OLLAMA_HEDGE_ENABLED and len(available) > 1:
+                delay = inference_policy.hedge_delay(payload["model"])
+            if delay is None:
+                return await self._call_backend(primary, payload)
+
+            hedge = available[1]
+            return await inference_policy.hedged(
+                [
+                    lambda: self._call_backend(primary, payload),
+                    lambda: self._call_backend(hedge, payload)
+                ],
+                delay,
+                on_hedge=on_hedge
+            )
+
+        try:
+            async with asyncio.timeout(deadline.remaining()):
+                async for retry in inference_policy.retry_policy(before_sleep=on_retry):
+                    with retry:
+                        result = await attempt(retry.retry_state.attempt_number - 1)
+                return result
+        except TimeoutError:
+            raise deadline.DeadlineExceeded("Deadline exceeded waiting for the inference backend")
+
+    @staticmethod
+    def _available_backends(backends: List[str]) -> List[str]:
+        """
+        Backends whose breaker lets calls through, in order
+
+        Raises:
+            CircuitOpenError: If there are none
+        """
+        available = []
+        rejected = []
+        for base_url in backends:
+            breaker = get_circuit_breaker(base_url)
+            if breaker is not None and breaker.is_open():
+                rejected.append(breaker)
+            else:
+                available.append(base_url)
+        if not available:
+            soonest = min(rejected, key=lambda b: b.retry_after())
+            raise CircuitOpenError(soonest.name, soonest.retry_after())
+        return available
+
+    def _scheduler_for(self, base_url: str) -> Optional[ModelScheduler]:
+        if base_url == self.base_url:
+            return self.scheduler
+        if settings.MODEL_SCHEDULER_ENABLED:
+            return self._get_scheduler(base_url)
+        return None
+
+    async def _call_backend(self, base_url: str, payload: Dict[str, Any]) -> GenerationResult:
+        """
+        One chat call to one backend, through its model scheduler when enabled
+
+        The backend's circuit breaker admits the call and learns its outcome.
+        """
+        model = metrics.model_label(payload["model"])
+        backend = urlsplit(base_url).netloc or base_url
+        breaker = get_circuit_breaker(base_url)
+        trial = breaker.acquire() if breaker is not None else False
+        recorded = False
+        enqueued = time.perf_counter()
+
+        async def call(keep_alive: Optional[Union[str, int]] = None) -> GenerationResult:
+            nonlocal recorded
+            body = dict(payload)
+            self._apply_keep_alive(body, keep_alive)
+
+            started = time.perf_counter()
+            metrics.OLLAMA_QUEUE_WAIT.labels(model).observe(started - enqueued)
+            tracing.record_span(f"{self.name}.queue", (started - enqueued) * 1000, model=payload["model"])
+
+            with tracing.span(f"{self.name}.chat", model=payload["model"], backend=backend):
+                try:
+                    generation = await self._stream_chat(base_url, body)
+                except (asyncio.CancelledError, deadline.DeadlineExceeded):
+                    elapsed = time.perf_counter() - started
+                    metrics.OLLAMA_REQUEST_DURATION.labels(model, "cancelled").observe(elapsed)
+                    # Abandoned calls only tell the breaker something if they were already slow
+                    if breaker is not None and elapsed >= breaker.slow_call_seconds:
+                        breaker.record(trial, elapsed, failed=False)
+                        recorded = True
+                    raise
+                except Exception as e:
+                    elapsed = time.perf_counter() - started
+                    metrics.OLLAMA_REQUEST_DURATION.labels(model, "error").observe(elapsed)
+                    # Client errors (bad request, unknown model) say nothing about backend health
+                    if breaker is not None and (
+                        not isinstance(e, InferenceError) or e.retryable or e.status_code is None
+                    ):
+                        breaker.record(trial, elapsed, failed=True)
+                        recorded = True
+                    raise
+
+                elapsed = time.perf_counter() - started
+                metrics.OLLAMA_REQUEST_DURATION.labels(model, "success").observe(elapsed)
+                if breaker is not None:
+                    breaker.record(trial, elapsed, failed=False)
+                    recorded = True
+                generation.model = generation.model or payload["model"]
+                self._observe_usage(model, generation)
+            inference_policy.record_latency(payload["model"], time.perf_counter() - enqueued)
+            return generation
+
+        try:
+            scheduler = self._scheduler_for(base_url)
+            if scheduler is None:
+                return await call(settings.OLLAMA_KEEP_ALIVE)
+            client = get_client_context()
+            return await scheduler.run(
+                payload["model"],
+                call,
+                client=client.client_id if client else "",
+                priority=client.client_class if client else "interactive",
+                cost=sum(self._content_length(m.get("content")) for m in payload["messages"])
+            )
+        finally:
+            if breaker is not None and not recorded:
+                breaker.release(trial)
+
+    @staticmethod
+    def _content_length(content: Union[str, List[Dict[str, Any]], None]) -> int:
+        """Characters of text in a message (content may be a list of parts)"""
+        if isinstance(content, list):
+            return sum(len(part.get("text", "")) for part in content)
+        return len(content or "")
+
+    async def _stream_chat(self, base_url: str, body: Dict[str, Any]) -> GenerationResult:
+        """
+        Stream a chat response, or replay / record it (INFERENCE_MODE)
+
+        Raises:
+            InferenceError: On HTTP, transport or backend-reported errors
+        """
+        from app.services.inference_replay import get_corpus
+
+        corpus = get_corpus()
+        if corpus is None:
+            return await self._stream_from(base_url, body)
+        if settings.INFERENCE_MODE == "replay":
+            return await corpus.replay(self.name, body)
+
+        started = time.perf_counter()
+        generation = await self._stream_from(base_url, body)
+        corpus.record(self.name, body, generation, time.perf_counter() - started)
+        return generation
+
+    async def _stream_from(self, base_url: str, body: Dict[str, Any]) -> GenerationResult:
+        """
+        Stream a chat response and assemble it into one result
+
+        Raises:
+            InferenceError: On HTTP, transport or backend-reported errors
+        """
+        read_timeout = deadline.timeout(self.client.timeout.read)
+        backend = urlsplit(base_url).netloc or base_url
+        # Large prompts and images are spliced into the body, not copied into one buffer
+        chunks = encode_json(body)
+        started = time.perf_counter()
+        first_token = None
+        parts = []
+        stats: Dict[str, Any] = {}
+        try:
+            async with self.client.stream(
+                "POST",
+                f"{base_url}{self.chat_path}",
+                content=aiter_chunks(chunks),
+                headers={
+                    "Content-Type": "application/json",
+                    # A known length rather than chunked transfer encoding
+                    "Content-Length": str(sum(len(chunk) for chunk in chunks))
+                },
+                timeout=httpx.Timeout(read_timeout, connect=10.0)
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    raise InferenceError(
+                        f"{self.label} API error: HTTP {response.status_code} {response.text[:200]}",
+                        retryable=response.status_code in RETRYABLE_STATUS_CODES,
+                        status_code=response.status_code
+                    )
+
+                async for line in response.aiter_lines():
+                    chunk = self._parse_line(line)
+                    if chunk is None:
+                        continue
+                    if chunk.content:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                        parts.append(chunk.content)
+                    if chunk.stats:
+                        stats.update(chunk.stats)
+                    if chunk.done:
+                        finished = time.perf_counter()
+                        timings = StreamTimings(
+                            first_token_ms=((first_token or finished) - started) * 1000,
+                            total_ms=(finished - started) * 1000
+                        )
+                        return self._result("".join(parts), stats, len(parts), timings, backend)
+        except httpx.TransportError as e:
+            # Connection refused or reset, timeouts, truncated responses
+            raise InferenceError(f"{self.label} API error: {type(e).__name__}: {e}", retryable=True) from e
+
+        raise InferenceError(f"{self.label} API error: stream ended before generation completed", retryable=True)
+
+    def _observe_usage(self, model: str, generation: GenerationResult):
+        """
+        Record the token counts and timings of each response
+        """
+        metrics.OLLAMA_PROMPT_TOKENS.labels(model).observe(generation.prompt_tokens)
+        metrics.OLLAMA_COMPLETION_TOKENS.labels(model).observe(generation.completion_tokens)
+        metrics.OLLAMA_LOAD_DURATION.labels(model).observe(generation.load_ms / 1000)
+        if generation.eval_ms:
+            metrics.OLLAMA_EVAL_DURATION.labels(model).observe(generation.eval_ms / 1000)
+            if generation.completion_tokens:
+                metrics.OLLAMA_TOKENS_PER_SECOND.labels(model).observe(
+                    generation.completion_tokens / (generation.eval_ms / 1000)
+                )
+
+        # Breakdown of the call, as child spans of the chat span
+        if generation.load_ms:
+            tracing.record_span(f"{self.name}.model_load", generation.load_ms)
+        if generation.prompt_eval_ms:
+            tracing.record_span(f"{self.name}.prompt_eval", generation.prompt_eval_ms, tokens=generation.prompt_tokens)
+        if generation.eval_ms:
+            tracing.record_span(f"{self.name}.eval", generation.eval_ms, tokens=generation.completion_tokens)
+
+    @staticmethod
+    def _loads(data: str) -> Dict[str, Any]:
+        try:
+            return loads(data)
+        except ValueError as e:
+            raise InferenceError(f"Malformed stream chunk: {data[:200]}", retryable=True) from e
+
+    async def close(self):
+        """Close the HTTP client"""
+        await self.client.aclose()
+
+
+def backend_urls() -> List[str]:
+    """Base URLs of the configured backend and its fallbacks"""
+    if settings.INFERENCE_BACKEND == "openai":
+        return [settings.OPENAI_COMPAT_BASE_URL, *settings.OPENAI_COMPAT_FALLBACK_URLS]
+    return [settings.OLLAMA_BASE_URL, *settings.OLLAMA_FALLBACK_URLS]
+
+
+def get_inference_backend(model: str) -> BaseInferenceService:
+    """
+    Create a client for the configured inference backend (INFERENCE_BACKEND)
+
+    Args:
+        model: Model name as the backend knows it
+    """
+    if settings.INFERENCE_BACKEND == "openai":
+        from app.services.openai_compat_service import OpenAICompatService
+        return OpenAICompatService(base_url=settings.OPENAI_COMPAT_BASE_URL, model=model)
+
+    from app.services.ollama_service import OllamaService
+    return OllamaService(base_url=settings.OLLAMA_BASE_URL, model=model)
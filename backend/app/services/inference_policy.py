@@ -0,0 +1,159 @@
+"""
+Inference Call Policies
+Retries with jittered backoff and hedged requests for inference backend calls
+"""
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+import structlog
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential
+)
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+# Successful calls needed before hedging by percentile
+HEDGE_MIN_SAMPLES = 20
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Errors flagged as transient by the backend client (see InferenceError)"""
+    return getattr(error, "retryable", False)
+
+
+def _log_retry(retry_state: RetryCallState):
+    error = retry_state.outcome.exception()
+    logger.warning(
+        "Retrying inference call",
+        attempt=retry_state.attempt_number,
+        wait=round(retry_state.next_action.sleep, 2),
+        error=str(error)
+    )
+
+
+def retry_policy(before_sleep: Optional[Callable[[RetryCallState], None]] = None) -> AsyncRetrying:
+    """
+    Retry transient failures with exponential backoff and full jitter
+
+    Args:
+        before_sleep: Extra callback run before each backoff (e.g. metrics)
+    """
+    def on_retry(retry_state: RetryCallState):
+        _log_retry(retry_state)
+        if before_sleep is not None:
+            before_sleep(retry_state)
+
+    return AsyncRetrying(
+        stop=stop_after_attempt(settings.OLLAMA_RETRY_ATTEMPTS),
+        wait=wait_random_exponential(
+            multiplier=settings.OLLAMA_RETRY_BACKOFF,
+            max=settings.OLLAMA_RETRY_BACKOFF_MAX
+        ),
+        retry=retry_if_exception(is_retryable),
+        before_sleep=on_retry,
+        reraise=True
+    )
+
+
+class LatencyTracker:
+    """Sliding window of successful call durations"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(pct / 100 * len(ordered)), len(ordered) - 1)]
+
+
+_latencies: Dict[str, LatencyTracker] = {}
+
+
+def record_latency(model: str, seconds: float):
+    """Record a successful call's duration for the model's hedge delay"""
+    tracker = _latencies.get(model)
+    if tracker is None:
+        tracker = _latencies[model] = LatencyTracker()
+    tracker.record(seconds)
+
+
+def hedge_delay(model: str) -> Optional[float]:
+    """
+    How long to wait for a call before hedging it, None to not hedge yet
+
+    The delay is the OLLAMA_HEDGE_PERCENTILE latency of recent successful
+    calls for the model, so only the slowest calls are duplicated.
+    """
+    tracker = _latencies.get(model)
+    if tracker is None or len(tracker) < HEDGE_MIN_SAMPLES:
+        return None
+    return max(tracker.percentile(settings.OLLAMA_HEDGE_PERCENTILE), settings.OLLAMA_HEDGE_MIN_DELAY)
+
+
+async def hedged(
+    attempts: List[Callable[[], Awaitable[T]]],
+    delay: float,
+    on_hedge: Optional[Callable[[int], None]] = None
+) -> T:
+    """
+    Run the first attempt, starting the next one whenever delay passes without a result
+
+    A failed attempt starts the next one immediately. The first success wins
+    and the attempts still running are cancelled (closing their streams).
+
+    Args:
+        attempts: Coroutine factories, e.g. the same call on different backends
+        delay: Seconds to wait for a result before hedging
+        on_hedge: Called with the index of each attempt started by the delay
+
+    Raises:
+        The last attempt's error if every attempt fails
+    """
+    pending = set()
+    error: Optional[BaseException] = None
+    try:
+        for index, attempt in enumerate(attempts):
+            if index and error is None and on_hedge is not None:
+                on_hedge(index)
+            error = None
+            pending.add(asyncio.ensure_future(attempt()))
+
+            last = index == len(attempts) - 1
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if last else delay,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break  # Too slow: hedge
+                for finished in done:
+                    if finished.exception() is None:
+                        return finished.result()
+                    error = finished.exception()
+                if not last:
+                    break  # Failed: start the next attempt now
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
@@ -0,0 +1,139 @@
+"""
+Inference Record / Replay
+Records inference calls to an on-disk corpus and serves them back for deterministic benchmarks
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from collections import defaultdict
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+from app.core.config import settings
+from app.services.inference_backend import GenerationResult, InferenceError
+
+logger = structlog.get_logger(__name__)
+
+# Request fields that do not change what the model generates
+VOLATILE_FIELDS = {"keep_alive", "stream", "stream_options"}
+
+
+class ReplayMissError(InferenceError):
+    """Replay mode got a request the corpus has no recording of"""
+
+    def __init__(self, fingerprint: str):
+        # A client error as far as retries and circuit breakers are concerned
+        super().__init__(
+            f"No recorded response for request {fingerprint[:16]}; record the corpus again",
+            status_code=404
+        )
+        self.fingerprint = fingerprint
+
+
+def fingerprint(backend: str, body: Dict[str, Any]) -> str:
+    """
+    Stable hash of what determines a response: backend type, model, messages and options
+
+    Args:
+        backend: Backend type (e.g. "ollama"); base URLs are left out so a
+            corpus replays against any deployment
+        body: Chat request body
+    """
+    request = {key: value for key, value in body.items() if key not in VOLATILE_FIELDS}
+    # SegmentedText prompts and images hash as the strings they stand for
+    canonical = json.dumps(
+        [backend, request], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class InferenceCorpus:
+    """
+    Recorded inference calls in a gzip-compressed JSON-lines file
+
+    Each record holds the request fingerprint, the GenerationResult (text,
+    token counts, backend timings) and the wall time of the call. Records
+    are appended as separate gzip members in a single write, so several
+    workers can record into the same file.
+
+    Replay serves a fingerprint's recordings in the order they were made,
+    starting over when they run out, after sleeping the recorded wall time
+    multiplied by latency_scale (0 answers immediately).
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self._records: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._served: Dict[str, int] = defaultdict(int)
+
+    def record(self, backend: str, body: Dict[str, Any], generation: GenerationResult, elapsed: float):
+        """Append a completed call"""
+        line = json.dumps({
+            "fingerprint": fingerprint(backend, body),
+            "backend": backend,
+            "model": body.get("model"),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "result": asdict(generation)
+        }, separators=(",", ":"), ensure_ascii=False)
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, gzip.compress((line + "\n").encode()))
+        finally:
+            os.close(fd)
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Recordings by fingerprint, read once"""
+        if self._records is None:
+            records: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record["fingerprint"]].append(record)
+            self._records = records
+            logger.info(
+                "Inference corpus loaded",
+                path=self.path,
+                requests=len(records),
+                recordings=sum(len(r) for r in records.values())
+            )
+        return self._records
+
+    async def replay(self, backend: str, body: Dict[str, Any]) -> GenerationResult:
+        """
+        Serve the recorded response for a request
+
+        Raises:
+            ReplayMissError: If the request was never recorded
+        """
+        key = fingerprint(backend, body)
+        recordings = self.load().get(key)
+        if not recordings:
+            raise ReplayMissError(key)
+        record = recordings[self._served[key] % len(recordings)]
+        self._served[key] += 1
+
+        if self.latency_scale > 0:
+            await asyncio.sleep(record["elapsed_ms"] / 1000 * self.latency_scale)
+        return GenerationResult(**record["result"])
+
+
+_corpus: Optional[InferenceCorpus] = None
+
+
+def get_corpus() -> Optional[InferenceCorpus]:
+    """The corpus to record to or replay from, None in live mode (INFERENCE_MODE)"""
+    global _corpus
+    if settings.INFERENCE_MODE == "live":
+        return None
+    if _corpus is None:
+        _corpus = InferenceCorpus(settings.INFERENCE_CORPUS_PATH, settings.INFERENCE_REPLAY_LATENCY_SCALE)
+    return _corpus
@@ -0,0 +1,154 @@
+"""
+Model Readiness Service
+Startup warm-up of the configured inference models and cached readiness checks
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+from app.core.config import settings
+from app.services.inference_backend import get_inference_backend
+
+logger = structlog.get_logger(__name__)
+
+WARMUP_PROMPT = "Reply with OK."
+
+
+class ModelReadiness:
+    """
+    Tracks whether the configured models are loaded and answering
+
+    The warm-up checks every model with check_model_availability and issues a
+    one-token generation so the first real request does not pay the model
+    load. Until the warm-up has succeeded the service reports not ready.
+    Afterwards it stays ready: availability is still re-checked at most every
+    READINESS_CACHE_TTL seconds (however often the probe is called) and
+    reported, but a backend outage does not fail readiness. Every pod shares
+    the backend, so failing readiness would only take the whole API out of
+    the load balancer; the circuit breakers answer 503 per request instead.
+    """
+
+    def __init__(self, models: List[str]):
+        self.models = models
+        self.warmed_up = False
+        self._models_status: Dict[str, bool] = {model: False for model in models}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Run the warm-up in the background until it succeeds"""
+        if not settings.WARMUP_ENABLED:
+            # Readiness then only reflects model availability, checked on first probe
+            self.warmed_up = True
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._warm_up_until_ready())
+
+    async def stop(self):
+        """Cancel a warm-up still in progress"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _warm_up_until_ready(self):
+        while not self.warmed_up:
+            if await self.warm_up():
+                return
+            await asyncio.sleep(settings.WARMUP_RETRY_INTERVAL)
+
+    async def warm_up(self) -> bool:
+        """
+        Check and prime every configured model
+
+        Returns:
+            True if all models are available and answered a priming request
+        """
+        started = time.monotonic()
+        for model in self.models:
+            service = get_inference_backend(model)
+            try:
+                if not await service.check_model_availability(model):
+                    logger.warning("Model not available on the inference backend", model=model)
+                    self._models_status[model] = False
+                    return False
+
+                model_started = time.monotonic()
+                await service.generate(prompt=WARMUP_PROMPT, temperature=0.0, max_tokens=1)
+                self._models_status[model] = True
+                logger.info(
+                    "Model warmed up",
+                    model=model,
+                    duration_ms=round((time.monotonic() - model_started) * 1000, 2)
+                )
+            except Exception as e:
+                logger.warning("Model warm-up failed", model=model, error=str(e))
+                self._models_status[model] = False
+                return False
+            finally:
+                await service.close()
+
+        self.warmed_up = True
+        self._checked_at = time.monotonic()
+        logger.info(
+            "Model warm-up complete",
+            models=self.models,
+            duration_ms=round((time.monotonic() - started) * 1000, 2)
+        )
+        return True
+
+    async def status(self) -> Dict[str, Any]:
+        """
+        Readiness of the AI service, re-checked at most every READINESS_CACHE_TTL seconds
+
+        ready is False only until the warm-up succeeds; status and models
+        report the latest availability check.
+        """
+        if self.warmed_up and time.monotonic() - self._checked_at >= settings.READINESS_CACHE_TTL:
+            async with self._lock:
+                # Another probe may have refreshed while we waited for the lock
+                if time.monotonic() - self._checked_at >= settings.READINESS_CACHE_TTL:
+                    await self._refresh()
+
+        if not self.warmed_up:
+            state = "warming_up"
+        elif all(self._models_status.values()):
+            state = "ok"
+        else:
+            state = "unavailable"
+
+        return {
+            "ready": self.warmed_up,
+            "status": state,
+            "models": dict(self._models_status)
+        }
+
+    async def _refresh(self):
+        service = get_inference_backend(self.models[0])
+        try:
+            for model in self.models:
+                self._models_status[model] = await service.check_model_availability(model)
+        except Exception as e:
+            logger.warning("Model availability check failed", error=str(e))
+            self._models_status = dict.fromkeys(self.models, False)
+        finally:
+            await service.close()
+        self._checked_at = time.monotonic()
+
+
+def _configured_models() -> List[str]:
+    # The model loaded last stays resident; the code model also serves SVG/OCR diagrams
+    models = []
+    if settings.ENABLE_DIAGRAM_ANALYSIS:
+        models.append(settings.OLLAMA_MODEL_VISION)
+    models.append(settings.OLLAMA_MODEL_CODE)
+    return list(dict.fromkeys(models))
+
+
+model_readiness = ModelReadiness(_configured_models())
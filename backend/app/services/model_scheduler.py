@@ -0,0 +1,415 @@
+"""
+Model Scheduler
+Groups inference calls by model so a GPU that holds one model at a time swaps as rarely as possible,
+and orders each model's calls by priority class and fair share between clients
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+
+import structlog
+
+from app.core import metrics
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+# keep_alive values understood by Ollama: duration string or seconds (0 unloads)
+KeepAlive = Union[str, int]
+
+# Highest priority first
+PRIORITY_CLASSES = ("interactive", "ci", "bulk")
+
+_sequence = itertools.count()
+
+
+@dataclass
+class _Job:
+    model: str
+    enqueued_at: float
+    client: str = ""
+    priority: int = 0  # Index into PRIORITY_CLASSES
+    cost: float = 1.0
+    seq: int = field(default_factory=lambda: next(_sequence))
+    admitted: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+    def __lt__(self, other: "_Job") -> bool:
+        # Shortest-job-first order within a client's queue
+        return (self.cost, self.seq) < (other.cost, other.seq)
+
+
+class _ClassQueue:
+    """
+    Calls of one priority class, shared fairly between clients
+
+    Start-time fair queuing: each client's next call is tagged with
+    start = max(virtual time, the client's previous finish tag) and
+    finish = start + cost / weight, and the call with the smallest finish
+    tag goes first. A client submitting hundreds of calls therefore only gets
+    its weighted share of admissions while others are waiting. Each client's
+    own calls are FIFO, or shortest first when sjf is set.
+    """
+
+    def __init__(self, sjf: bool, weights: Dict[str, float]):
+        self.sjf = sjf
+        self.weights = weights
+        self.vtime = 0.0
+        self._clients: Dict[str, List[_Job]] = {}
+        self._last_finish: Dict[str, float] = {}
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def jobs(self):
+        for queue in self._clients.values():
+            yield from queue
+
+    def push(self, job: _Job):
+        queue = self._clients.setdefault(job.client, [])
+        if self.sjf:
+            heapq.heappush(queue, job)
+        else:
+            queue.append(job)
+        self._len += 1
+
+    def remove(self, job: _Job) -> bool:
+        queue = self._clients.get(job.client)
+        if not queue or job not in queue:
+            return False
+        queue.remove(job)
+        if self.sjf:
+            heapq.heapify(queue)
+        self._len -= 1
+        self._forget_idle(job.client)
+        return True
+
+    def pop(self) -> _Job:
+        best: Optional[Tuple[float, int, str, float]] = None
+        for client, queue in self._clients.items():
+            head = queue[0]
+            start = max(self.vtime, self._last_finish.get(client, 0.0))
+            finish = start + head.cost / self.weights.get(client, 1.0)
+            if best is None or (finish, head.seq) < best[:2]:
+                best = (finish, head.seq, client, start)
+
+        finish, _, client, start = best
+        queue = self._clients[client]
+        job = heapq.heappop(queue) if self.sjf else queue.pop(0)
+        self._len -= 1
+        self.vtime = start
+        self._last_finish[client] = finish
+        self._forget_idle(client)
+        return job
+
+    def _forget_idle(self, client: str):
+        if not self._clients[client]:
+            del self._clients[client]
+            # A finish tag behind the virtual time no longer affects ordering
+            if self._last_finish.get(client, 0.0) <= self.vtime:
+                self._last_finish.pop(client, None)
+
+
+class _ModelQueue:
+    """Calls waiting for one model: strict priority between classes"""
+
+    def __init__(self, sjf: bool, weights: Dict[str, float]):
+        self._classes = [_ClassQueue(sjf, weights) for _ in PRIORITY_CLASSES]
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._classes)
+
+    def append(self, job: _Job):
+        self._classes[job.priority].push(job)
+
+    def remove(self, job: _Job) -> bool:
+        return self._classes[job.priority].remove(job)
+
+    def popleft(self) -> _Job:
+        for queue in self._classes:
+            if queue:
+                return queue.pop()
+        raise IndexError("pop from an empty queue")
+
+    def oldest(self) -> float:
+        """Enqueue time of the longest-waiting call"""
+        return min(job.enqueued_at for queue in self._classes for job in queue.jobs())
+
+    def top_priority(self) -> int:
+        """Most urgent class with waiting calls"""
+        return next(i for i, queue in enumerate(self._classes) if queue)
+
+
+@dataclass
+class SchedulerStats:
+    """Counters describing scheduler behaviour"""
+    swaps: int = 0
+    admitted: Dict[str, int] = field(default_factory=dict)
+    forced_swaps: int = 0  # Swaps triggered by max_wait rather than an idle model
+
+
+class ModelScheduler:
+    """
+    Admit inference calls so that one model stays resident for as long as useful
+
+    Calls for the resident model are admitted (up to max_concurrency in
+    flight). Once the resident model has no queued work and has been idle for
+    batch_window seconds, the scheduler swaps to the model with the oldest
+    waiting call. To keep either workload from starving, it also stops
+    admitting resident-model calls as soon as another model's oldest call has
+    waited max_wait seconds (counted from when the resident model was loaded),
+    and swaps when the in-flight calls drain.
+
+    Admitted calls get keep_alive so the resident model survives between
+    windows. Models are never unloaded explicitly: the backend evicts the
+    least recently used one when the next is loaded (Ollama's
+    OLLAMA_MAX_LOADED_MODELS), or when its keep_alive runs out.
+
+    Within a model, waiting calls are admitted by priority class first
+    (interactive, then ci, then bulk; lower classes wait while higher ones
+    have work) and by weighted fair share between clients within a class.
+    With sjf set, each client's own calls go shortest (by cost) first. When
+    swapping, the model with the most urgent waiting call goes next.
+
+    One scheduler coordinates the calls of one process against one backend.
+    Grouping only works within a worker: with several uvicorn workers each
+    groups its own calls, and the backend sees their models interleaved.
+    That is why nothing is unloaded here; an unload from one worker would
+    evict a model another worker is still using.
+    """
+
+    def __init__(
+        self,
+        batch_window: float,
+        max_wait: float,
+        max_concurrency: int,
+        keep_alive: KeepAlive,
+        sjf: bool = False,
+        client_weights: Optional[Dict[str, float]] = None
+    ):
+        self.batch_window = batch_window
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.keep_alive = keep_alive
+        self.sjf = sjf
+        self.client_weights = client_weights or {}
+        self.stats = SchedulerStats()
+
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._resident: Optional[str] = None
+        self._active = 0
+        self._draining = False
+        self._swapping = False
+        self._last_admitted = 0.0
+        self._resident_since = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._swap_task: Optional[asyncio.Task] = None
+
+    @property
+    def resident_model(self) -> Optional[str]:
+        return self._resident
+
+    def queued(self, model: Optional[str] = None) -> int:
+        """Number of calls waiting for admission"""
+        if model is not None:
+            return len(self._queues.get(model, ()))
+        return sum(len(q) for q in self._queues.values())
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[KeepAlive], Awaitable[T]],
+        client: str = "",
+        priority: str = "interactive",
+        cost: float = 1.0
+    ) -> T:
+        """
+        Wait until the model may run, then execute the call
+
+        Args:
+            model: Model the call needs resident
+            call: Coroutine factory receiving the keep_alive to send to Ollama
+            client: Client the call is made for (fair share)
+            priority: One of PRIORITY_CLASSES
+            cost: Estimated size of the call, e.g. prompt characters (fair share, sjf)
+
+        Returns:
+            The call's result
+        """
+        job = _Job(
+            model=model,
+            enqueued_at=time.monotonic(),
+            client=client,
+            priority=PRIORITY_CLASSES.index(priority),
+            cost=max(cost, 1.0)
+        )
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self.sjf, self.client_weights)
+        queue.append(job)
+        self._dispatch()
+
+        try:
+            await job.admitted
+        except asyncio.CancelledError:
+            if job.admitted.done() and not job.admitted.cancelled():
+                # Admitted in the same tick the waiter was cancelled
+                self._release()
+            else:
+                queue.remove(job)
+                self._dispatch()
+            raise
+
+        try:
+            return await call(self.keep_alive)
+        finally:
+            self._release()
+
+    def _release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit whatever may run now and arm a timer for the next decision"""
+        if self._swapping:
+            return
+        now = time.monotonic()
+
+        if self._resident is None:
+            nxt = self._next_waiting(exclude=None)
+            if nxt is None:
+                return
+            self._start_swap(nxt, forced=False)
+            return
+
+        other = self._next_waiting(exclude=self._resident)
+        if other is not None and now >= self._starvation_deadline(other):
+            self._draining = True
+
+        queue = self._queues.get(self._resident)
+        if not self._draining:
+            while queue and self._active < self.max_concurrency:
+                job = queue.popleft()
+                if job.admitted.done():
+                    continue
+                self._active += 1
+                self._last_admitted = now
+                self.stats.admitted[job.model] = self.stats.admitted.get(job.model, 0) + 1
+                job.admitted.set_result(None)
+
+        if other is None or self._active:
+            self._arm_timer(other, now)
+            return
+
+        if self._draining:
+            self._start_swap(other, forced=True)
+        elif not queue and now - self._last_admitted >= self.batch_window:
+            self._start_swap(other, forced=False)
+        else:
+            self._arm_timer(other, now)
+
+    def _starvation_deadline(self, model: str) -> float:
+        """
+        When a waiting model may preempt the resident one
+
+        Waiting only counts from the start of the current residency, so every
+        model gets up to max_wait of service before being swapped out again.
+        """
+        return max(self._queues[model].oldest(), self._resident_since) + self.max_wait
+
+    def _next_waiting(self, exclude: Optional[str]) -> Optional[str]:
+        """Model with the most urgent waiting call, oldest first among equals"""
+        best = None
+        best_key = None
+        for model, queue in self._queues.items():
+            if model == exclude or not queue:
+                continue
+            key = (queue.top_priority(), queue.oldest())
+            if best_key is None or key < best_key:
+                best, best_key = model, key
+        return best
+
+    def _arm_timer(self, other: Optional[str], now: float):
+        """Re-dispatch when the batch window closes or max_wait is reached"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if other is None:
+            return
+
+        # Completions re-dispatch on their own; only time-based transitions need a timer
+        deadlines = []
+        if not self._draining:
+            deadlines.append(self._starvation_deadline(other))
+        if not self._active and not self._queues.get(self._resident):
+            deadlines.append(self._last_admitted + self.batch_window)
+        if deadlines:
+            delay = max(min(deadlines) - now, 0.0)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _start_swap(self, model: str, forced: bool):
+        self._swapping = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._swap_task = asyncio.get_running_loop().create_task(self._swap(model, forced))
+
+    async def _swap(self, model: str, forced: bool):
+        previous = self._resident
+        try:
+            if previous is not None:
+                self.stats.swaps += 1
+                if forced:
+                    self.stats.forced_swaps += 1
+                metrics.MODEL_SWAPS.labels(
+                    metrics.model_label(model),
+                    "max_wait" if forced else "idle"
+                ).inc()
+                logger.info(
+                    "Swapping resident model",
+                    previous=previous,
+                    model=model,
+                    forced=forced,
+                    queued=self.queued(model)
+                )
+        finally:
+            self._resident = model
+            self._draining = False
+            self._swapping = False
+            self._last_admitted = self._resident_since = time.monotonic()
+            self._dispatch()
+
+
+_schedulers: Dict[str, ModelScheduler] = {}
+
+
+def get_model_scheduler(
+    key: str,
+    max_concurrency: Optional[int] = None
+) -> ModelScheduler:
+    """
+    Get the process-wide scheduler for a backend
+
+    Args:
+        key: Backend base URL, or whatever else identifies the GPU the calls share
+        max_concurrency: Calls in flight (defaults to MODEL_SCHEDULER_MAX_CONCURRENCY)
+    """
+    from app.core.config import settings
+
+    scheduler = _schedulers.get(key)
+    if scheduler is None:
+        scheduler = ModelScheduler(
+            batch_window=settings.MODEL_SCHEDULER_BATCH_WINDOW,
+            max_wait=settings.MODEL_SCHEDULER_MAX_WAIT,
+            max_concurrency=max_concurrency or settings.MODEL_SCHEDULER_MAX_CONCURRENCY,
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            sjf=settings.MODEL_SCHEDULER_SJF,
+            client_weights=settings.MODEL_SCHEDULER_CLIENT_WEIGHTS
+        )
+        _schedulers[key] = scheduler
+    return scheduler
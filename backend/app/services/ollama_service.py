@@ -3,153 +3,114 @@ Ollama Integration Service
 Local LLM support using Ollama for free, privacy-focused AI analysis
 """
 
-import httpx
+from typing import Dict, Any, List, Optional, Union
+
 import structlog
-from typing import Dict, Any, Optional
+
+from app.core.config import settings
+from app.core.serialization import Text
+from app.services.inference_backend import (
+    BaseInferenceService,
+    GenerationResult,
+    InferenceError,
+    StreamChunk,
+    StreamTimings
+)
+from app.services.model_scheduler import ModelScheduler, get_model_scheduler
 
 logger = structlog.get_logger(__name__)
 
 
-class OllamaService:
+class OllamaService(BaseInferenceService):
     """
     Service for interacting with Ollama local LLM API
+
+    Streams /api/chat as NDJSON; the final chunk carries Ollama's token
+    counts and its load, prompt evaluation and generation durations.
     """
 
+    name = "ollama"
+    label = "Ollama"
+    chat_path = "/api/chat"
+
     def __init__(
         self,
         base_url: str = "http://ollama:11434",
-        model: str = "llama3.1:8b"
+        model: str = "llama3.1:8b",
+        scheduler: Optional[ModelScheduler] = None,
+        fallback_urls: Optional[List[str]] = None
     ):
-        self.base_url = base_url
-        self.model = model
-        self.client = httpx.AsyncClient(timeout=300.0)
-
-    async def generate(
-        self,
-        prompt: str,
-        system_prompt: Optional[str] = None,
-        temperature: float = 0.1,
-        max_tokens: int = 4096
-    ) -> str:
-        """
-        Generate text using Ollama
-
-        Args:
-            prompt: User prompt
-            system_prompt: System prompt for context
-            temperature: Sampling temperature (0.0 to 1.0)
-            max_tokens: Maximum tokens to generate
+        if fallback_urls is None:
+            fallback_urls = settings.OLLAMA_FALLBACK_URLS
+        super().__init__(base_url, model, scheduler=scheduler, fallback_urls=fallback_urls)
 
-        Returns:
-            Generated text
-        """
-        try:
-            logger.info(
-                "Calling Ollama",
-                model=self.model,
-                prompt_length=len(prompt)
-            )
-
-            # Prepare messages
-            messages = []
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
-
-            messages.append({
-                "role": "user",
-                "content": prompt
-            })
-
-            # Call Ollama API
-            response = await self.client.post(
-                f"{self.base_url}/api/chat",
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "num_predict": max_tokens
-                    }
-                }
-            )
-
-            response.raise_for_status()
-            result = response.json()
-
-            # Extract generated text
-            generated_text = result.get("message", {}).get("content", "")
-
-            logger.info(
-                "Ollama generation complete",
-                response_length=len(generated_text)
-            )
+    def _get_scheduler(self, base_url: str) -> ModelScheduler:
+        return get_model_scheduler(base_url)
 
-            return generated_text
+    def _user_message(self, prompt: Text, image_data: Optional[Text], image_type: str) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"role": "user", "content": prompt}
+        if image_data is not None:
+            message["images"] = [image_data]
+        return message
 
-        except httpx.HTTPError as e:
-            logger.error("Ollama HTTP error", error=str(e))
-            raise Exception(f"Ollama API error: {str(e)}")
-        except Exception as e:
-            logger.error("Ollama generation failed", error=str(e))
-            raise
-
-    async def generate_with_vision(
+    def _chat_body(
         self,
-        prompt: str,
-        image_data: str,
-        system_prompt: Optional[str] = None
-    ) -> str:
-        """
-        Generate text from image using LLaVA model
-
-        Args:
-            prompt: Text prompt
-            image_data: Base64 encoded image
-            system_prompt: System prompt
-
-        Returns:
-            Generated analysis
-        """
-        try:
-            logger.info("Calling Ollama vision model")
-
-            # Use LLaVA model for vision tasks
-            vision_model = "llava:13b"
-
-            messages = []
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
-
-            messages.append({
-                "role": "user",
-                "content": prompt,
-                "images": [image_data]
-            })
-
-            response = await self.client.post(
-                f"{self.base_url}/api/chat",
-                json={
-                    "model": vision_model,
-                    "messages": messages,
-                    "stream": False
-                }
-            )
-
-            response.raise_for_status()
-            result = response.json()
-
-            return result.get("message", {}).get("content", "")
-
-        except Exception as e:
-            logger.error("Ollama vision generation failed", error=str(e))
-            raise
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        json_mode: bool
+    ) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True
+        }
+        options = {}
+        if temperature is not None:
+            options["temperature"] = temperature
+        if max_tokens is not None:
+            options["num_predict"] = max_tokens
+        if options:
+            body["options"] = options
+        if json_mode:
+            body["format"] = "json"
+        return body
+
+    def _apply_keep_alive(self, body: Dict[str, Any], keep_alive: Optional[Union[str, int]]):
+        if keep_alive is not None:
+            body["keep_alive"] = keep_alive
+
+    def _parse_line(self, line: str) -> Optional[StreamChunk]:
+        if not line:
+            return None
+        chunk = self._loads(line)
+        if "error" in chunk:
+            raise InferenceError(f"Ollama API error: {chunk['error']}")
+        content = chunk.get("message", {}).get("content", "")
+        if not chunk.get("done"):
+            return StreamChunk(content=content)
+        return StreamChunk(content=content, done=True, stats=chunk)
+
+    def _result(
+        self,
+        text: str,
+        stats: Dict[str, Any],
+        chunks: int,
+        timings: StreamTimings,
+        backend: str
+    ) -> GenerationResult:
+        # Ollama reports durations in nanoseconds
+        return GenerationResult(
+            text=text,
+            model=stats.get("model", ""),
+            backend=backend,
+            prompt_tokens=stats.get("prompt_eval_count") or 0,
+            completion_tokens=stats.get("eval_count") or 0,
+            load_ms=(stats.get("load_duration") or 0) / 1e6,
+            prompt_eval_ms=(stats.get("prompt_eval_duration") or 0) / 1e6,
+            eval_ms=(stats.get("eval_duration") or 0) / 1e6,
+            total_ms=(stats.get("total_duration") or 0) / 1e6
+        )
 
     async def check_model_availability(self, model_name: str) -> bool:
         """
@@ -200,7 +161,3 @@ class OllamaService:
         except Exception as e:
             logger.error(f"Failed to pull model {model_name}", error=str(e))
             return False
-
-    async def close(self):
-        """Close the HTTP client"""
-        await self.client.aclose()
@@ -0,0 +1,160 @@
+"""
+OpenAI-Compatible Inference Service
+Chat completions against continuous-batching servers such as vLLM or llama.cpp-server
+"""
+
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+from app.core.config import settings
+from app.core.serialization import SegmentedText, Text
+from app.services.inference_backend import (
+    BaseInferenceService,
+    GenerationResult,
+    InferenceError,
+    StreamChunk,
+    StreamTimings
+)
+from app.services.model_scheduler import ModelScheduler, get_model_scheduler
+
+logger = structlog.get_logger(__name__)
+
+SSE_DATA = "data:"
+SSE_DONE = "[DONE]"
+
+
+class OpenAICompatService(BaseInferenceService):
+    """
+    Service for servers exposing the OpenAI /v1/chat/completions API
+
+    Responses are streamed as server-sent events with usage requested on the
+    last chunk (stream_options.include_usage). These servers report token
+    counts but no durations, so prompt evaluation is timed as the time to the
+    first token and generation as the rest of the stream.
+
+    The server batches concurrent requests itself and keeps its models
+    loaded, so each model gets its own scheduler (no swaps) that only
+    orders calls by priority and fair share.
+    """
+
+    name = "openai"
+    label = "OpenAI-compatible"
+    chat_path = "/v1/chat/completions"
+
+    def __init__(
+        self,
+        base_url: str = "http://vllm:8000",
+        model: str = "llama3.1:8b",
+        scheduler: Optional[ModelScheduler] = None,
+        fallback_urls: Optional[List[str]] = None
+    ):
+        if fallback_urls is None:
+            fallback_urls = settings.OPENAI_COMPAT_FALLBACK_URLS
+        super().__init__(base_url, model, scheduler=scheduler, fallback_urls=fallback_urls)
+
+    def _headers(self) -> Dict[str, str]:
+        if settings.OPENAI_COMPAT_API_KEY:
+            return {"Authorization": f"Bearer {settings.OPENAI_COMPAT_API_KEY}"}
+        return {}
+
+    def _get_scheduler(self, base_url: str) -> ModelScheduler:
+        return get_model_scheduler(
+            f"{base_url}#{self.model}",
+            max_concurrency=settings.OPENAI_COMPAT_MAX_CONCURRENCY
+        )
+
+    def _user_message(self, prompt: Text, image_data: Optional[Text], image_type: str) -> Dict[str, Any]:
+        if image_data is None:
+            return {"role": "user", "content": prompt}
+        return {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": SegmentedText(f"data:{image_type};base64,", image_data)}}
+            ]
+        }
+
+    def _chat_body(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        json_mode: bool
+    ) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        if temperature is not None:
+            body["temperature"] = temperature
+        if max_tokens is not None:
+            body["max_tokens"] = max_tokens
+        if json_mode:
+            body["response_format"] = {"type": "json_object"}
+        return body
+
+    def _parse_line(self, line: str) -> Optional[StreamChunk]:
+        if not line.startswith(SSE_DATA):
+            return None  # Blank separators, comments, other SSE fields
+        data = line[len(SSE_DATA):].strip()
+        if data == SSE_DONE:
+            return StreamChunk(done=True)
+
+        chunk = self._loads(data)
+        if "error" in chunk:
+            error = chunk["error"]
+            message = error.get("message", error) if isinstance(error, dict) else error
+            raise InferenceError(f"{self.label} API error: {message}")
+
+        content = "".join(
+            (choice.get("delta") or {}).get("content") or ""
+            for choice in chunk.get("choices") or []
+        )
+        stats = {"model": chunk["model"]} if chunk.get("model") else {}
+        if chunk.get("usage"):
+            stats.update(chunk["usage"])
+        return StreamChunk(content=content, stats=stats or None)
+
+    def _result(
+        self,
+        text: str,
+        stats: Dict[str, Any],
+        chunks: int,
+        timings: StreamTimings,
+        backend: str
+    ) -> GenerationResult:
+        return GenerationResult(
+            text=text,
+            model=stats.get("model", ""),
+            backend=backend,
+            prompt_tokens=stats.get("prompt_tokens") or 0,
+            # Servers that ignore include_usage send one token per chunk
+            completion_tokens=stats.get("completion_tokens") or chunks,
+            prompt_eval_ms=timings.first_token_ms,
+            eval_ms=timings.total_ms - timings.first_token_ms,
+            total_ms=timings.total_ms
+        )
+
+    async def check_model_availability(self, model_name: str) -> bool:
+        """
+        Check if the server serves a model
+
+        Args:
+            model_name: Name of the model to check
+
+        Returns:
+            True if model is available
+        """
+        try:
+            response = await self.client.get(f"{self.base_url}/v1/models")
+            response.raise_for_status()
+
+            models = response.json().get("data", [])
+            return model_name in [m.get("id") for m in models]
+
+        except Exception as e:
+            logger.error("Failed to check model availability", error=str(e))
+            return False
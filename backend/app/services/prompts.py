@@ -122,6 +122,11 @@ Return ONLY valid JSON with the following structure (no markdown, no explanation
 
 Perform the security analysis now."""
 
+CODE_SYSTEM_PROMPT = """You are an expert security analyst specializing in code security,
+vulnerability detection, and secure coding practices. You have deep knowledge of OWASP Top 10,
+CWE Top 25, and security frameworks. Analyze code thoroughly and provide detailed,
+actionable security findings in JSON format."""
+
 DIAGRAM_ANALYSIS_PROMPT = """You are an expert security architect specializing in Zero Trust architecture, Secure-by-Design principles, and infrastructure security. Your task is to analyze this architecture diagram and provide a comprehensive security assessment.
 
 **Analysis Framework:**
@@ -288,6 +293,24 @@ Return ONLY valid JSON with the following structure:
 
 Analyze the diagram now."""
 
+DIAGRAM_TOPOLOGY_PROMPT = """The architecture diagram below was extracted from a vector (SVG) file instead of being shown as an image. Component names are taken verbatim from the diagram labels, nesting reflects shapes drawn inside other shapes (networks, zones, trust boundaries), and connections follow the drawn connectors, directed where the diagram shows arrowheads.
+
+**Diagram Topology:**
+```
+{topology}
+```
+
+""" + DIAGRAM_ANALYSIS_PROMPT
+
+DIAGRAM_OCR_PROMPT = """The architecture diagram below was read with OCR instead of being shown as an image. You are given every text label found in the diagram with its position (coarse region and extent as a percentage of the image width and height). Infer components from the labels, group labels that sit close together, and infer containment and connections from the layout; state assumptions where the layout is ambiguous.
+
+**Diagram Labels:**
+```
+{layout}
+```
+
+""" + DIAGRAM_ANALYSIS_PROMPT
+
 SECURE_CODE_REWRITE_PROMPT = """You are a security-focused software engineer. Rewrite the following vulnerable code to be secure while maintaining functionality.
 
 **Original Code:**
@@ -0,0 +1,293 @@
+"""
+Report Writers
+Streaming SARIF 2.1.0 and JSON Lines reports of code analyses, one file at a time
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import orjson
+
+from app.core.config import settings
+from app.core.metrics import severity_label
+
+SARIF_MEDIA_TYPE = "application/sarif+json"
+JSONL_MEDIA_TYPE = "application/x-ndjson"
+
+# Accept header media types of each format
+MEDIA_TYPES = {
+    SARIF_MEDIA_TYPE: "sarif",
+    JSONL_MEDIA_TYPE: "jsonl",
+    "application/jsonl": "jsonl",
+    "application/x-jsonlines": "jsonl",
+}
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_LEVELS = {"CRITICAL": "error", "HIGH": "error", "MEDIUM": "warning", "LOW": "note", "INFO": "note"}
+# GitHub code scanning ranks alerts by the rule's security-severity (CVSS-like, 0-10)
+SECURITY_SEVERITY = {"CRITICAL": "9.5", "HIGH": "8.0", "MEDIUM": "5.5", "LOW": "3.0"}
+SEVERITY_ORDER = ("OTHER", "INFO", "LOW", "MEDIUM", "HIGH", "CRITICAL")
+SUMMARY_SEVERITIES = ("critical", "high", "medium", "low", "info")
+
+DEPENDENCY_RULE = "vulnerable-dependency"
+SECRET_RULE = "hardcoded-secret"
+
+
+def report_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Report format an Accept header asks for ("sarif" or "jsonl"), None for plain JSON
+
+    Media types are taken by decreasing q value, then in the order listed.
+    """
+    if not accept:
+        return None
+    ranges = []
+    for position, media_range in enumerate(accept.split(",")):
+        media_type, *parameters = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for parameter in parameters:
+            if parameter.startswith("q="):
+                try:
+                    quality = float(parameter[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranges.append((-quality, position, media_type.lower()))
+    for _, _, media_type in sorted(ranges):
+        if media_type in MEDIA_TYPES:
+            return MEDIA_TYPES[media_type]
+        if media_type in ("application/json", "*/*", "application/*"):
+            return None
+    return None
+
+
+@dataclass
+class ReportSummary:
+    """Counts over the files written so far"""
+    files: int = 0
+    failed: int = 0
+    findings: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(SUMMARY_SEVERITIES, 0))
+    vulnerable_dependencies: int = 0
+    secrets: int = 0
+
+    def add(self, result: Dict[str, Any]):
+        self.files += 1
+        for vulnerability in result.get("vulnerabilities", []):
+            severity = severity_label(vulnerability.get("severity", "")).lower()
+            if severity in self.findings:
+                self.findings[severity] += 1
+        self.vulnerable_dependencies += len(result.get("dependencies", []))
+        self.secrets += len(result.get("secrets", []))
+
+    def add_error(self):
+        self.files += 1
+        self.failed += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "failed": self.failed,
+            "findings": dict(self.findings, total=sum(self.findings.values())),
+            "vulnerable_dependencies": self.vulnerable_dependencies,
+            "secrets": self.secrets,
+        }
+
+
+class ReportWriter(ABC):
+    """
+    Base class: a report as a sequence of byte chunks
+
+    start() comes first, then add() or add_error() once per file as each
+    completes, then finish(). Only per-report state (summary counts, SARIF
+    rules) is kept, never earlier files' results, so a report of any number
+    of files is written in constant memory.
+    """
+
+    media_type = "application/octet-stream"
+
+    def __init__(self):
+        self.summary = ReportSummary()
+
+    def start(self) -> bytes:
+        """Opening bytes of the report"""
+        return b""
+
+    @abstractmethod
+    def add(self, path: str, result: Dict[str, Any]) -> bytes:
+        """Bytes reporting one analyzed file"""
+
+    @abstractmethod
+    def add_error(self, path: str, error: str) -> bytes:
+        """Bytes reporting one file whose analysis failed"""
+
+    @abstractmethod
+    def finish(self) -> bytes:
+        """Closing bytes of the report, with the summary"""
+
+
+class JsonLinesReportWriter(ReportWriter):
+    """
+    One JSON object a line: {"type": "file", "path", "result"} per analyzed
+    file, {"type": "error", "path", "error"} per failed one, and a final
+    {"type": "summary", ...} with the counts
+    """
+
+    media_type = JSONL_MEDIA_TYPE
+
+    def add(self, path: str, result: Dict[str, Any]) -> bytes:
+        self.summary.add(result)
+        return orjson.dumps({"type": "file", "path": path, "result": result}) + b"\n"
+
+    def add_error(self, path: str, error: str) -> bytes:
+        self.summary.add_error()
+        return orjson.dumps({"type": "error", "path": path, "error": error}) + b"\n"
+
+    def finish(self) -> bytes:
+        return orjson.dumps({"type": "summary", **self.summary.to_dict()}) + b"\n"
+
+
+class SarifReportWriter(ReportWriter):
+    """
+    SARIF 2.1.0 log with one run
+
+    Results are written inside runs[0].results as files complete; the
+    run's tool (with the rules seen), invocation and summary properties
+    follow them in finish(). Member order does not matter in JSON, so
+    SARIF consumers (GitHub code scanning, IDE viewers) read the log as
+    usual.
+    """
+
+    media_type = SARIF_MEDIA_TYPE
+
+    def __init__(self):
+        super().__init__()
+        self._rules: Dict[str, Dict[str, Any]] = {}
+        self._rule_severities: Dict[str, str] = {}
+        self._notifications: List[Dict[str, Any]] = []
+        self._first = True
+
+    def start(self) -> bytes:
+        return b'{"$schema":"' + SARIF_SCHEMA.encode() + b'","version":"2.1.0","runs":[{"results":['
+
+    def _rule(self, rule_id: str, title: str, severity: str, help_uri: Optional[str] = None):
+        """Record a rule, rated by the most severe result reported under it"""
+        if rule_id not in self._rules:
+            rule = {"id": rule_id, "shortDescription": {"text": title or rule_id}, "properties": {"tags": ["security"]}}
+            if help_uri:
+                rule["helpUri"] = help_uri
+            self._rules[rule_id] = rule
+            self._rule_severities[rule_id] = severity
+        elif SEVERITY_ORDER.index(severity) > SEVERITY_ORDER.index(self._rule_severities[rule_id]):
+            self._rule_severities[rule_id] = severity
+
+    def _results(self, path: str, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        uri = quote(path, safe="/")
+        results = []
+        for vulnerability in result.get("vulnerabilities", []):
+            severity = severity_label(vulnerability.get("severity", ""))
+            rule_id = str(vulnerability.get("id") or "UNKNOWN")
+            references = vulnerability.get("references") or []
+            self._rule(rule_id, vulnerability.get("title", ""), severity, references[0] if references else None)
+
+            region = None
+            line = (vulnerability.get("location") or {}).get("line")
+            if isinstance(line, int) and line >= 1:
+                region = {"startLine": line}
+            text = vulnerability.get("title") or rule_id
+            if vulnerability.get("description"):
+                text = f"{text}: {vulnerability['description']}"
+            properties = {"severity": severity, "confidence": vulnerability.get("confidence")}
+            if vulnerability.get("remediation"):
+                properties["remediation"] = vulnerability["remediation"]
+            results.append(_sarif_result(rule_id, severity, text, uri, region, properties))
+
+        for dependency in result.get("dependencies", []):
+            severity = severity_label(dependency.get("severity", ""))
+            self._rule(DEPENDENCY_RULE, "Dependency with known vulnerabilities", severity)
+            text = (
+                f"{dependency['name']} {dependency['version']} has "
+                f"{dependency.get('vulnerabilities', 0)} known vulnerabilities"
+            )
+            if dependency.get("advisories"):
+                text += f" ({', '.join(dependency['advisories'])})"
+            if dependency.get("recommendation"):
+                text += f". {dependency['recommendation']}"
+            properties = {"severity": severity, "package": dependency["name"], "version": dependency["version"]}
+            results.append(_sarif_result(DEPENDENCY_RULE, severity, text, uri, None, properties))
+
+        for secret in result.get("secrets", []):
+            self._rule(SECRET_RULE, "Hardcoded secret", "HIGH")
+            line = secret.get("line")
+            region = {"startLine": line} if isinstance(line, int) and line >= 1 else None
+            text = f"{secret.get('type', 'Secret')}: {secret.get('description', '')}".rstrip(": ")
+            results.append(_sarif_result(SECRET_RULE, "HIGH", text, uri, region, {"severity": "HIGH"}))
+        return results
+
+    def add(self, path: str, result: Dict[str, Any]) -> bytes:
+        self.summary.add(result)
+        chunks = []
+        for sarif_result in self._results(path, result):
+            chunks.append(b"" if self._first else b",")
+            chunks.append(orjson.dumps(sarif_result))
+            self._first = False
+        return b"".join(chunks)
+
+    def add_error(self, path: str, error: str) -> bytes:
+        self.summary.add_error()
+        self._notifications.append({
+            "level": "error",
+            "message": {"text": error},
+            "locations": [{"physicalLocation": {"artifactLocation": {"uri": quote(path, safe="/")}}}]
+        })
+        return b""
+
+    def finish(self) -> bytes:
+        rules = []
+        for rule_id, rule in self._rules.items():
+            security_severity = SECURITY_SEVERITY.get(self._rule_severities[rule_id])
+            if security_severity is not None:
+                rule["properties"]["security-severity"] = security_severity
+            rules.append(rule)
+        tail = {
+            "tool": {"driver": {"name": settings.APP_NAME, "version": settings.VERSION, "rules": rules}},
+            "invocations": [{
+                "executionSuccessful": self.summary.failed == 0,
+                "toolExecutionNotifications": self._notifications
+            }],
+            "properties": {"summary": self.summary.to_dict()}
+        }
+        # Close results, then the run's remaining members, the run, runs and the log
+        return b"]," + orjson.dumps(tail)[1:] + b"]}"
+
+
+def _sarif_result(
+    rule_id: str,
+    severity: str,
+    text: str,
+    uri: str,
+    region: Optional[Dict[str, int]],
+    properties: Dict[str, Any]
+) -> Dict[str, Any]:
+    physical_location: Dict[str, Any] = {"artifactLocation": {"uri": uri}}
+    if region is not None:
+        physical_location["region"] = region
+    return {
+        "ruleId": rule_id,
+        "level": SARIF_LEVELS.get(severity, "warning"),
+        "message": {"text": text},
+        "locations": [{"physicalLocation": physical_location}],
+        "properties": properties
+    }
+
+
+WRITERS = {
+    "sarif": SarifReportWriter,
+    "jsonl": JsonLinesReportWriter,
+}
+
+
+def report_writer(report: str) -> ReportWriter:
+    """A new writer for a report format ("sarif" or "jsonl")"""
+    return WRITERS[report]()
@@ -0,0 +1,187 @@
+"""
+Source Files
+Which files are analyzed as code, in which language, and reading them from uploaded archives
+"""
+
+import io
+import os
+import posixpath
+import tarfile
+import zipfile
+import zlib
+from typing import Callable, IO, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.dependency_manifests import (
+    manifest_parser,
+    parse_cargo_toml,
+    parse_go_mod,
+    parse_package_json,
+    parse_requirements,
+)
+
+MAX_CODE_CHARS = 1_000_000  # CodeAnalysisRequest.code max_length
+MAX_SOURCE_BYTES = MAX_CODE_CHARS * 4  # UTF-8 is at most 4 bytes a character
+
+LANGUAGES = {
+    ".py": "python", ".js": "javascript", ".jsx": "javascript", ".ts": "typescript", ".tsx": "typescript",
+    ".java": "java", ".go": "go", ".rs": "rust", ".c": "c", ".cpp": "cpp", ".php": "php", ".rb": "ruby",
+    ".cs": "csharp", ".swift": "swift", ".kt": "kotlin",
+}
+MANIFEST_LANGUAGES = {
+    parse_requirements: "python",
+    parse_package_json: "javascript",
+    parse_go_mod: "go",
+    parse_cargo_toml: "rust",
+}
+
+
+class SourceSkipped(Exception):
+    """A file that is not analyzed (binary, empty or over the size limits); the message says why"""
+
+
+def language_for(path: str) -> str:
+    """Language of a file, from its name"""
+    parser = manifest_parser(path)
+    if parser is not None:
+        return MANIFEST_LANGUAGES[parser]
+    extension = os.path.splitext(path)[1].lower()
+    return LANGUAGES.get(extension, extension.lstrip("."))
+
+
+def is_source_file(path: str, include_manifests: bool) -> bool:
+    """Whether a file is analyzed: ALLOWED_CODE_EXTENSIONS, and dependency manifests if asked"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in {allowed.lower() for allowed in settings.ALLOWED_CODE_EXTENSIONS}:
+        return True
+    return include_manifests and manifest_parser(path) is not None
+
+
+def decode_source(data: bytes) -> str:
+    """
+    Text of a file the API would accept
+
+    Raises:
+        SourceSkipped: If the file is binary, empty or over CodeAnalysisRequest's limits
+    """
+    if b"\0" in data[:8192]:
+        raise SourceSkipped("binary")
+    text = data.decode("utf-8", errors="replace")
+    if not text.strip():
+        raise SourceSkipped("empty")
+    if len(text) > MAX_CODE_CHARS:
+        raise SourceSkipped(f"over {MAX_CODE_CHARS:,} characters")
+    if text.count("\n") + 1 > settings.CODE_MAX_LINES:
+        raise SourceSkipped(f"over {settings.CODE_MAX_LINES:,} lines")
+    return text
+
+
+def _member_path(name: str) -> Optional[str]:
+    """Archive member name as a relative path, None if it points outside the archive"""
+    path = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if path in ("", ".") or path == ".." or path.startswith("../"):
+        return None
+    return path
+
+
+# Archive errors that mean the upload is not a readable archive
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, zlib.error)
+
+# (name, opener) of each archive entry; the opener is None for directories, links and devices
+ArchiveEntry = Tuple[str, Optional[Callable[[], IO[bytes]]]]
+
+
+def _zip_entries(archive: zipfile.ZipFile) -> Iterator[ArchiveEntry]:
+    for info in archive.infolist():
+        yield info.filename, None if info.is_dir() else (lambda info=info: archive.open(info))
+
+
+def _tar_entries(archive: tarfile.TarFile, max_expanded: int) -> Iterator[ArchiveEntry]:
+    """
+    Entries of a tar, read one header at a time
+
+    Reaching the next header means decompressing the current member,
+    skipped or not, so the walk stops before any member that would end
+    past max_expanded bytes.
+    """
+    while True:
+        try:
+            member = archive.next()
+        except ARCHIVE_ERRORS as e:
+            raise ValueError("Not a readable zip or tar archive") from e
+        if member is None:
+            return
+        if member.offset_data + member.size > max_expanded:
+            raise ValueError(f"Archive expands to more than {max_expanded} bytes")
+        yield member.name, (lambda member=member: archive.extractfile(member)) if member.isfile() else None
+
+
+def read_archive(
+    data: bytes,
+    include_manifests: bool,
+    max_files: int,
+    max_total: int,
+    max_entries: int,
+    max_expanded: int
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """
+    Source files of a zip or tar (optionally gzip, bzip2 or xz compressed) archive
+
+    Nothing is extracted to disk, and tar headers are read one at a time
+    rather than listed upfront. Members are read up to MAX_SOURCE_BYTES
+    each, whatever size the archive declares, and reading stops at
+    max_total bytes in all. Blocks the calling thread: run it off the event
+    loop.
+
+    Args:
+        data: Archive contents
+        include_manifests: Also read dependency manifests
+        max_files: Most source files to read
+        max_total: Most bytes to read, over all files
+        max_entries: Most entries of any kind to walk
+        max_expanded: Most uncompressed tar bytes to walk through, skipped members included
+
+    Returns:
+        (path, code) of each source file and (path, reason) of each skipped one
+
+    Raises:
+        ValueError: If the data is not a readable archive, or exceeds one of the limits
+    """
+    try:
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            archive = zipfile.ZipFile(io.BytesIO(data))
+            entries = _zip_entries(archive)
+        else:
+            archive = tarfile.open(fileobj=io.BytesIO(data), mode="r:*")
+            entries = _tar_entries(archive, max_expanded)
+    except ARCHIVE_ERRORS as e:
+        raise ValueError("Not a readable zip or tar archive") from e
+
+    files, skipped = [], []
+    total = 0
+    with archive:
+        for count, (name, open_member) in enumerate(entries, 1):
+            if count > max_entries:
+                raise ValueError(f"Archive holds more than {max_entries} entries")
+            if open_member is None:
+                continue
+            path = _member_path(name)
+            if path is None or not is_source_file(path, include_manifests):
+                continue
+            if len(files) >= max_files:
+                raise ValueError(f"Archive holds more than {max_files} source files")
+            try:
+                with open_member() as member:
+                    content = member.read(min(MAX_SOURCE_BYTES, max_total - total) + 1)
+            except (*ARCHIVE_ERRORS, RuntimeError) as e:
+                # RuntimeError: encrypted zip members
+                skipped.append((path, f"unreadable: {e}"))
+                continue
+            total += len(content)
+            if total > max_total:
+                raise ValueError(f"Archive source files exceed {max_total} bytes")
+            try:
+                files.append((path, decode_source(content)))
+            except SourceSkipped as e:
+                skipped.append((path, str(e)))
+    return files, skipped
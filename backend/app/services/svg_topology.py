@@ -0,0 +1,557 @@
+"""
+SVG Topology Extraction
+Streaming, hardened SVG parser that turns diagram labels and connectors into a textual topology
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from xml.parsers import expat
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# Parser limits - SVG uploads are untrusted input
+SVG_CHUNK_SIZE = 64 * 1024
+# Label matching is pure Python over labels x shapes and labels x connectors:
+# these caps bound it (real diagrams stay well below them)
+SVG_MAX_ELEMENTS = 2_000
+SVG_MAX_CONNECTOR_POINTS = 20_000
+SVG_MAX_DEPTH = 256
+SVG_MAX_LABEL_LENGTH = 200
+
+# Geometry heuristics (in SVG user units)
+MIN_SHAPE_AREA = 150.0  # Ignore arrowheads, icons' decorations, etc.
+ENDPOINT_TOLERANCE = 24.0  # How far a connector may stop short of a component
+EDGE_LABEL_TOLERANCE = 40.0  # How far an edge label may sit from its connector
+
+SHAPE_TAGS = {"rect", "ellipse", "circle", "polygon", "image", "use"}
+CONNECTOR_TAGS = {"line", "polyline"}
+TEXT_TAGS = {"text", "foreignObject"}
+
+Matrix = Tuple[float, float, float, float, float, float]
+Point = Tuple[float, float]
+
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+_NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_TRANSFORM_RE = re.compile(r"(matrix|translate|scale)\s*\(([^)]*)\)")
+_PATH_TOKEN_RE = re.compile(r"[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class SVGTopologyError(ValueError):
+    """Raised when an SVG cannot be parsed into a topology"""
+
+
+class UnsafeSVGError(SVGTopologyError):
+    """Raised when an SVG uses entity declarations or external references"""
+
+
+@dataclass
+class TopologyComponent:
+    """A labelled shape in the diagram"""
+    id: str
+    name: str
+    bbox: Tuple[float, float, float, float]
+    parent: Optional[str] = None
+
+    @property
+    def area(self) -> float:
+        x0, y0, x1, y1 = self.bbox
+        return (x1 - x0) * (y1 - y0)
+
+
+@dataclass
+class TopologyEdge:
+    """A connector between two components"""
+    source: str
+    target: str
+    directed: bool = True
+    label: Optional[str] = None
+
+
+@dataclass
+class DiagramTopology:
+    """Components, containment and connections extracted from an SVG"""
+    components: List[TopologyComponent] = field(default_factory=list)
+    edges: List[TopologyEdge] = field(default_factory=list)
+    free_labels: List[str] = field(default_factory=list)
+
+    def to_prompt(self) -> str:
+        """
+        Render the topology as compact text for the text model
+        """
+        names = {c.id: c.name for c in self.components}
+        lines = [f"Components ({len(self.components)}):"]
+        for component in self.components:
+            line = f"- {component.id}: {component.name}"
+            if component.parent:
+                line += f" (inside {component.parent}: {names[component.parent]})"
+            lines.append(line)
+
+        lines.append(f"Connections ({len(self.edges)}):")
+        for edge in self.edges:
+            arrow = "->" if edge.directed else "<->"
+            line = f"- {edge.source} {names[edge.source]} {arrow} {edge.target} {names[edge.target]}"
+            if edge.label:
+                line += f" [{edge.label}]"
+            lines.append(line)
+
+        if self.free_labels:
+            lines.append("Other labels: " + "; ".join(self.free_labels))
+
+        return "\n".join(lines)
+
+
+@dataclass
+class _Label:
+    text: str
+    point: Point
+
+
+@dataclass
+class _Connector:
+    points: List[Point]
+    marker_start: bool
+    marker_end: bool
+    bbox: Tuple[float, float, float, float] = (0.0, 0.0, 0.0, 0.0)
+
+
+def _multiply(m: Matrix, n: Matrix) -> Matrix:
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + c * b2,
+        b * a2 + d * b2,
+        a * c2 + c * d2,
+        b * c2 + d * d2,
+        a * e2 + c * f2 + e,
+        b * e2 + d * f2 + f,
+    )
+
+
+def _apply(m: Matrix, point: Point) -> Point:
+    a, b, c, d, e, f = m
+    x, y = point
+    return (a * x + c * y + e, b * x + d * y + f)
+
+
+def _parse_transform(value: Optional[str]) -> Matrix:
+    """
+    Parse the translate/scale/matrix subset of the SVG transform attribute
+    """
+    matrix = IDENTITY
+    if not value:
+        return matrix
+
+    for name, args in _TRANSFORM_RE.findall(value):
+        nums = [float(n) for n in _NUMBER_RE.findall(args)]
+        if name == "matrix" and len(nums) == 6:
+            step = tuple(nums)
+        elif name == "translate" and nums:
+            step = (1.0, 0.0, 0.0, 1.0, nums[0], nums[1] if len(nums) > 1 else 0.0)
+        elif name == "scale" and nums:
+            step = (nums[0], 0.0, 0.0, nums[1] if len(nums) > 1 else nums[0], 0.0, 0.0)
+        else:
+            continue
+        matrix = _multiply(matrix, step)  # type: ignore[arg-type]
+
+    return matrix
+
+
+def _number(attrs: Dict[str, str], name: str, default: float = 0.0) -> float:
+    match = _NUMBER_RE.match(attrs.get(name, "").strip())
+    return float(match.group()) if match else default
+
+
+def _path_points(d: str) -> Tuple[List[Point], bool]:
+    """
+    Return the vertices of an SVG path and whether its last subpath is closed
+
+    Curves are reduced to their end points, which is all the topology needs.
+    """
+    points: List[Point] = []
+    closed = False
+    current = (0.0, 0.0)
+    start = current
+    command = ""
+    # Number of arguments consumed per command
+    arity = {"M": 2, "L": 2, "T": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "A": 7, "Z": 0}
+
+    tokens = _PATH_TOKEN_RE.findall(d)
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.isalpha():
+            command = token
+            i += 1
+            if command in "Zz":
+                current = start
+                closed = True
+                points.append(current)
+            continue
+
+        upper = command.upper()
+        count = arity.get(upper)
+        if not count or i + count > len(tokens):
+            break
+        try:
+            args = [float(t) for t in tokens[i:i + count]]
+        except ValueError:
+            break
+        i += count
+        relative = command.islower()
+        x, y = current
+
+        if upper == "H":
+            x = x + args[0] if relative else args[0]
+        elif upper == "V":
+            y = y + args[0] if relative else args[0]
+        else:
+            dx, dy = args[-2], args[-1]
+            x, y = (x + dx, y + dy) if relative else (dx, dy)
+
+        current = (x, y)
+        points.append(current)
+        if upper == "M":
+            start = current
+            closed = False
+            # Subsequent coordinate pairs after a moveto are implicit linetos
+            command = "l" if relative else "L"
+        else:
+            closed = False
+
+    return points, closed
+
+
+def _bbox(points: List[Point]) -> Tuple[float, float, float, float]:
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def _contains(bbox: Tuple[float, float, float, float], point: Point, margin: float = 0.0) -> bool:
+    x0, y0, x1, y1 = bbox
+    x, y = point
+    return x0 - margin <= x <= x1 + margin and y0 - margin <= y <= y1 + margin
+
+
+def _distance_to_bbox(bbox: Tuple[float, float, float, float], point: Point) -> float:
+    x0, y0, x1, y1 = bbox
+    x, y = point
+    dx = max(x0 - x, 0.0, x - x1)
+    dy = max(y0 - y, 0.0, y - y1)
+    return math.hypot(dx, dy)
+
+
+def _distance_to_segment(point: Point, a: Point, b: Point) -> float:
+    (px, py), (ax, ay), (bx, by) = point, a, b
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+class _SVGCollector:
+    """
+    Expat handlers collecting shapes, connectors and labels in one pass
+    """
+
+    def __init__(self):
+        self.shapes: List[Tuple[float, float, float, float]] = []
+        self.connectors: List[_Connector] = []
+        self.labels: List[_Label] = []
+        self.element_count = 0
+        self.connector_points = 0
+        self._transforms: List[Matrix] = [IDENTITY]
+        self._text_stack: List[Tuple[Point, List[str]]] = []
+
+    def forbid_entities(self, *args):
+        raise UnsafeSVGError("SVG entity declarations are not allowed")
+
+    def forbid_external(self, *args):
+        raise UnsafeSVGError("SVG external references are not allowed")
+
+    def start(self, name: str, attrs: Dict[str, str]):
+        self.element_count += 1
+        if self.element_count > SVG_MAX_ELEMENTS:
+            raise SVGTopologyError("SVG has too many elements")
+        if len(self._transforms) > SVG_MAX_DEPTH:
+            raise SVGTopologyError("SVG nesting is too deep")
+
+        tag = name.rsplit(":", 1)[-1]
+        matrix = _multiply(self._transforms[-1], _parse_transform(attrs.get("transform")))
+        self._transforms.append(matrix)
+
+        if self._text_stack:
+            # Nested tspan/div inside a label keeps accumulating text
+            if tag == "tspan" and not self._text_stack[-1][1] and "x" in attrs:
+                self._text_stack[-1] = (
+                    _apply(matrix, (_number(attrs, "x"), _number(attrs, "y"))),
+                    self._text_stack[-1][1]
+                )
+            return
+
+        if tag in TEXT_TAGS:
+            x, y = _number(attrs, "x"), _number(attrs, "y")
+            if tag == "foreignObject":
+                x += _number(attrs, "width") / 2
+                y += _number(attrs, "height") / 2
+            self._text_stack.append((_apply(matrix, (x, y)), []))
+        elif tag in SHAPE_TAGS:
+            self._add_shape(tag, attrs, matrix)
+        elif tag in CONNECTOR_TAGS or tag == "path":
+            self._add_path(tag, attrs, matrix)
+
+    def end(self, name: str):
+        self._transforms.pop()
+        tag = name.rsplit(":", 1)[-1]
+        if tag in TEXT_TAGS and self._text_stack:
+            point, parts = self._text_stack.pop()
+            text = _WHITESPACE_RE.sub(" ", " ".join(parts)).strip()
+            if text:
+                self.labels.append(_Label(text[:SVG_MAX_LABEL_LENGTH], point))
+
+    def data(self, text: str):
+        if self._text_stack:
+            parts = self._text_stack[-1][1]
+            if sum(len(p) for p in parts) < SVG_MAX_LABEL_LENGTH:
+                parts.append(text)
+
+    def _add_shape(self, tag: str, attrs: Dict[str, str], matrix: Matrix):
+        if tag in ("rect", "image", "use"):
+            x, y = _number(attrs, "x"), _number(attrs, "y")
+            corners = [(x, y), (x + _number(attrs, "width"), y + _number(attrs, "height"))]
+        elif tag == "circle":
+            cx, cy, r = _number(attrs, "cx"), _number(attrs, "cy"), _number(attrs, "r")
+            corners = [(cx - r, cy - r), (cx + r, cy + r)]
+        elif tag == "ellipse":
+            cx, cy = _number(attrs, "cx"), _number(attrs, "cy")
+            rx, ry = _number(attrs, "rx"), _number(attrs, "ry")
+            corners = [(cx - rx, cy - ry), (cx + rx, cy + ry)]
+        else:
+            nums = [float(n) for n in _NUMBER_RE.findall(attrs.get("points", ""))]
+            corners = list(zip(nums[0::2], nums[1::2]))
+            if not corners:
+                return
+
+        bbox = _bbox([_apply(matrix, p) for p in corners])
+        if (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) >= MIN_SHAPE_AREA:
+            self.shapes.append(bbox)
+
+    def _add_path(self, tag: str, attrs: Dict[str, str], matrix: Matrix):
+        closed = False
+        if tag == "line":
+            points = [
+                (_number(attrs, "x1"), _number(attrs, "y1")),
+                (_number(attrs, "x2"), _number(attrs, "y2")),
+            ]
+        elif tag == "polyline":
+            nums = [float(n) for n in _NUMBER_RE.findall(attrs.get("points", ""))]
+            points = list(zip(nums[0::2], nums[1::2]))
+        else:
+            points, closed = _path_points(attrs.get("d", ""))
+
+        if len(points) < 2:
+            return
+        points = [_apply(matrix, p) for p in points]
+
+        # Closed, filled paths are shapes (draw.io renders boxes as paths)
+        fill = attrs.get("fill", "").strip().lower()
+        if closed and fill not in ("none", "transparent"):
+            bbox = _bbox(points)
+            if (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) >= MIN_SHAPE_AREA:
+                self.shapes.append(bbox)
+            return
+
+        self.connector_points += len(points)
+        if self.connector_points > SVG_MAX_CONNECTOR_POINTS:
+            raise SVGTopologyError("SVG connectors have too many points")
+        self.connectors.append(_Connector(
+            points=points,
+            marker_start="marker-start" in attrs,
+            marker_end="marker-end" in attrs,
+            bbox=_bbox(points)
+        ))
+
+
+def _parse(chunks: Iterable[bytes]) -> _SVGCollector:
+    collector = _SVGCollector()
+    parser = expat.ParserCreate()
+    parser.SetParamEntityParsing(expat.XML_PARAM_ENTITY_PARSING_NEVER)
+    parser.EntityDeclHandler = collector.forbid_entities
+    parser.UnparsedEntityDeclHandler = collector.forbid_entities
+    parser.ExternalEntityRefHandler = collector.forbid_external
+    parser.StartElementHandler = collector.start
+    parser.EndElementHandler = collector.end
+    parser.CharacterDataHandler = collector.data
+
+    try:
+        for chunk in chunks:
+            parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+    except expat.ExpatError as e:
+        raise SVGTopologyError(f"Invalid SVG: {e}") from e
+
+    return collector
+
+
+def _iter_chunks(content: bytes) -> Iterable[bytes]:
+    view = memoryview(content)
+    for offset in range(0, len(view), SVG_CHUNK_SIZE):
+        yield bytes(view[offset:offset + SVG_CHUNK_SIZE])
+
+
+def extract_svg_topology(content: bytes) -> DiagramTopology:
+    """
+    Extract components and connections from SVG bytes
+
+    The document is fed to expat in chunks and never materialized as a tree.
+    Entity declarations and external references are rejected outright, which
+    blocks XXE and entity-expansion payloads. This is pure Python that holds
+    the GIL throughout: call it through offload.run with the process pool.
+
+    Args:
+        content: Raw SVG file bytes
+
+    Returns:
+        Extracted diagram topology
+
+    Raises:
+        UnsafeSVGError: If the SVG declares entities or external references
+        SVGTopologyError: If the SVG is malformed or exceeds parser limits
+    """
+    collector = _parse(_iter_chunks(content))
+
+    # Assign every label to the smallest shape that contains it
+    shape_labels: Dict[int, List[str]] = {}
+    loose_labels: List[_Label] = []
+    for label in collector.labels:
+        containing = [
+            i for i, bbox in enumerate(collector.shapes)
+            if _contains(bbox, label.point, margin=2.0)
+        ]
+        if not containing:
+            loose_labels.append(label)
+            continue
+        smallest = min(containing, key=lambda i: _area(collector.shapes[i]))
+        if _labels_connector_within(collector.connectors, collector.shapes[smallest], label.point):
+            # A connector label drawn inside a container, not the container's name
+            loose_labels.append(label)
+        else:
+            shape_labels.setdefault(smallest, []).append(label.text)
+
+    topology = DiagramTopology()
+    for index in sorted(shape_labels, key=lambda i: (collector.shapes[i][1], collector.shapes[i][0])):
+        topology.components.append(TopologyComponent(
+            id=f"C{len(topology.components) + 1}",
+            name=" / ".join(dict.fromkeys(shape_labels[index])),
+            bbox=collector.shapes[index]
+        ))
+
+    # Containment: the smallest strictly larger component that encloses this one
+    for component in topology.components:
+        x0, y0, x1, y1 = component.bbox
+        parents = [
+            other for other in topology.components
+            if other is not component
+            and other.area > component.area
+            and _contains(other.bbox, (x0, y0)) and _contains(other.bbox, (x1, y1))
+        ]
+        if parents:
+            component.parent = min(parents, key=lambda c: c.area).id
+
+    edge_paths: List[Tuple[List[Point], Tuple[float, float, float, float]]] = []
+    for connector in collector.connectors:
+        source = _nearest_component(topology.components, connector.points[0])
+        target = _nearest_component(topology.components, connector.points[-1])
+        if source is None or target is None or source is target:
+            continue
+        if connector.marker_start and not connector.marker_end:
+            source, target = target, source
+        topology.edges.append(TopologyEdge(
+            source=source.id,
+            target=target.id,
+            directed=connector.marker_start != connector.marker_end
+        ))
+        edge_paths.append((connector.points, connector.bbox))
+
+    # Labels outside any shape either annotate a connector or stand alone
+    edge_labels: Dict[int, List[str]] = {}
+    for label in loose_labels:
+        best: Optional[Tuple[float, int]] = None
+        for index, (points, bbox) in enumerate(edge_paths):
+            if not _contains(bbox, label.point, margin=EDGE_LABEL_TOLERANCE):
+                continue
+            distance = _polyline_distance(points, label.point)
+            if distance <= EDGE_LABEL_TOLERANCE and (best is None or distance < best[0]):
+                best = (distance, index)
+        if best is not None:
+            edge_labels.setdefault(best[1], []).append(label.text)
+        else:
+            topology.free_labels.append(label.text)
+
+    for index, texts in edge_labels.items():
+        topology.edges[index].label = " / ".join(texts)
+
+    logger.debug(
+        "SVG topology extracted",
+        shapes=len(collector.shapes),
+        connectors=len(collector.connectors),
+        labels=len(collector.labels),
+        components=len(topology.components),
+        edges=len(topology.edges)
+    )
+
+    return topology
+
+
+def _polyline_distance(points: List[Point], point: Point) -> float:
+    return min(_distance_to_segment(point, a, b) for a, b in zip(points, points[1:]))
+
+
+def _labels_connector_within(
+    connectors: List[_Connector],
+    bbox: Tuple[float, float, float, float],
+    point: Point
+) -> bool:
+    """
+    Whether a point sits on a connector that runs entirely inside the given shape
+    """
+    # Bounding boxes first: only connectors near the point and inside the shape are measured
+    return any(
+        _contains(c.bbox, point, margin=EDGE_LABEL_TOLERANCE / 2)
+        and _contains(bbox, (c.bbox[0], c.bbox[1])) and _contains(bbox, (c.bbox[2], c.bbox[3]))
+        and _polyline_distance(c.points, point) <= EDGE_LABEL_TOLERANCE / 2
+        for c in connectors
+    )
+
+
+def _area(bbox: Tuple[float, float, float, float]) -> float:
+    return (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+
+
+def _nearest_component(
+    components: List[TopologyComponent],
+    point: Point
+) -> Optional[TopologyComponent]:
+    """
+    The innermost component at a connector endpoint, or the closest within tolerance
+    """
+    containing = [c for c in components if _contains(c.bbox, point)]
+    if containing:
+        return min(containing, key=lambda c: c.area)
+
+    best = None
+    best_distance = ENDPOINT_TOLERANCE
+    for component in components:
+        distance = _distance_to_bbox(component.bbox, point)
+        if distance <= best_distance:
+            best, best_distance = component, distance
+    return best
+
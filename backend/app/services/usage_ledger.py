@@ -0,0 +1,165 @@
+"""
+Usage Ledger
+Per-client token and GPU-time totals for capacity planning and chargeback
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Optional
+
+import structlog
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = structlog.get_logger(__name__)
+
+KEY_PREFIX = "shadowscan:usage:"
+# Sorted set of client IDs scored by their last recorded request
+CLIENTS_KEY = KEY_PREFIX + "clients:active"
+
+# Integer totals; everything else is accumulated as a float
+COUNT_FIELDS = ("requests", "cached_requests", "prompt_tokens", "completion_tokens")
+
+
+def _increments(generation: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Totals one analysis adds to its client's usage
+
+    Args:
+        generation: The analysis metadata["generation"], None if nothing was generated
+    """
+    if generation is None:
+        return {"requests": 1, "cached_requests": 1}
+
+    model = generation["model"]
+    gpu_seconds = generation["gpu_seconds"]
+    return {
+        "requests": 1,
+        "prompt_tokens": generation["prompt_tokens"],
+        "completion_tokens": generation["completion_tokens"],
+        "gpu_seconds": gpu_seconds,
+        "load_seconds": generation["load_ms"] / 1000,
+        f"gpu_seconds:{model}": gpu_seconds
+    }
+
+
+def _format(totals: Dict[str, Any]) -> Dict[str, Any]:
+    """Group raw totals into the API shape"""
+    usage: Dict[str, Any] = {field: 0 for field in COUNT_FIELDS}
+    usage.update({"gpu_seconds": 0.0, "load_seconds": 0.0, "gpu_seconds_by_model": {}})
+    for field, value in totals.items():
+        if field.startswith("gpu_seconds:"):
+            usage["gpu_seconds_by_model"][field.split(":", 1)[1]] = round(float(value), 3)
+        elif field in COUNT_FIELDS:
+            usage[field] = int(float(value))
+        else:
+            usage[field] = round(float(value), 3)
+    return usage
+
+
+class MemoryUsageLedger:
+    """
+    Per-process ledger
+
+    Each worker only sees its own requests; use it for local development and
+    single-worker deployments. Only the USAGE_LEDGER_MAX_CLIENTS most
+    recently active clients are kept.
+    """
+
+    def __init__(self):
+        self._totals: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+
+    async def record(self, client_id: str, generation: Optional[Dict[str, Any]]):
+        totals = self._totals.get(client_id)
+        if totals is None:
+            totals = self._totals[client_id] = defaultdict(float)
+        self._totals.move_to_end(client_id)
+        for field, amount in _increments(generation).items():
+            totals[field] += amount
+        while len(self._totals) > settings.USAGE_LEDGER_MAX_CLIENTS:
+            self._totals.popitem(last=False)
+
+    async def get(self, client_id: str) -> Optional[Dict[str, Any]]:
+        totals = self._totals.get(client_id)
+        return _format(totals) if totals is not None else None
+
+    async def all(self) -> Dict[str, Dict[str, Any]]:
+        return {client_id: _format(totals) for client_id, totals in self._totals.items()}
+
+
+class RedisUsageLedger:
+    """
+    Ledger shared by every worker and pod
+
+    Recording is best-effort: an unreachable Redis is logged and never fails
+    the analysis that was already served. A client's totals expire
+    USAGE_LEDGER_TTL seconds after its last request, and only the
+    USAGE_LEDGER_MAX_CLIENTS most recently active clients are listed.
+    """
+
+    async def record(self, client_id: str, generation: Optional[Dict[str, Any]]):
+        key = KEY_PREFIX + client_id
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for field, amount in _increments(generation).items():
+                    if field in COUNT_FIELDS:
+                        pipe.hincrby(key, field, int(amount))
+                    else:
+                        pipe.hincrbyfloat(key, field, amount)
+                pipe.expire(key, settings.USAGE_LEDGER_TTL)
+                now = time.time()
+                pipe.zadd(CLIENTS_KEY, {client_id: now})
+                pipe.zremrangebyscore(CLIENTS_KEY, "-inf", now - settings.USAGE_LEDGER_TTL)
+                pipe.zremrangebyrank(CLIENTS_KEY, 0, -settings.USAGE_LEDGER_MAX_CLIENTS - 1)
+                pipe.expire(CLIENTS_KEY, settings.USAGE_LEDGER_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to record usage", client_id=client_id, error=str(e))
+
+    async def get(self, client_id: str) -> Optional[Dict[str, Any]]:
+        totals = await get_redis().hgetall(KEY_PREFIX + client_id)
+        return _format(totals) if totals else None
+
+    async def all(self) -> Dict[str, Dict[str, Any]]:
+        redis = get_redis()
+        client_ids = sorted(await redis.zrange(CLIENTS_KEY, 0, -1))
+        async with redis.pipeline(transaction=False) as pipe:
+            for client_id in client_ids:
+                pipe.hgetall(KEY_PREFIX + client_id)
+            totals = await pipe.execute()
+        return {
+            client_id: _format(values)
+            for client_id, values in zip(client_ids, totals)
+            if values
+        }
+
+
+def _create_ledger():
+    if settings.USAGE_LEDGER_BACKEND == "redis":
+        return RedisUsageLedger()
+    return MemoryUsageLedger()
+
+
+usage_ledger = _create_ledger()
+
+
+async def record_usage(client_id: str, metadata: Dict[str, Any]):
+    """
+    Charge an analysis to its client
+
+    Args:
+        client_id: Client the analysis was run for
+        metadata: The analysis metadata
+    """
+    generation = metadata.get("generation")
+    logger.info(
+        "Analysis usage",
+        client_id=client_id,
+        gpu_seconds=generation["gpu_seconds"] if generation else 0.0,
+        prompt_tokens=generation["prompt_tokens"] if generation else 0,
+        completion_tokens=generation["completion_tokens"] if generation else 0
+    )
+    # Shielded so a client disconnecting after the analysis is still charged
+    await asyncio.shield(usage_ledger.record(client_id, generation))
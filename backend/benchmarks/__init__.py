@@ -0,0 +1,4 @@
+"""
+ShadowScan Benchmarks
+Performance benchmarks for the analysis pipeline (run with `python -m benchmarks.<name>`)
+"""
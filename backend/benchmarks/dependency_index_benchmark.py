@@ -0,0 +1,108 @@
+"""
+Dependency Index Benchmark
+Build time, file size and manifest matching latency of the offline OSV index
+
+Usage:
+    python -m benchmarks.dependency_index_benchmark
+    python -m benchmarks.dependency_index_benchmark --advisories 200000 --dependencies 500
+
+Advisories are synthetic, spread over PyPI, npm, Go and crates.io packages
+with one to three ranges each (about the shape of the OSV exports). A
+requirements.txt and a package.json of --dependencies entries each are
+matched --rounds times; the median is reported.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import structlog
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production-use")
+
+from app.services.dependency_index import DependencyIndex, build_index  # noqa: E402
+from app.services.dependency_manifests import CRATES, GO, NPM, PYPI, manifest_parser  # noqa: E402
+
+ECOSYSTEMS = (PYPI, NPM, GO, CRATES)
+
+
+def _advisories(directory: str, count: int, seed: int) -> int:
+    """Write synthetic OSV advisories, one JSON file each; returns the package count per ecosystem"""
+    rng = random.Random(seed)
+    packages = max(count // 4, 1)
+    for i in range(count):
+        ecosystem = ECOSYSTEMS[i % len(ECOSYSTEMS)]
+        ranges = []
+        major = rng.randint(0, 5)
+        for _ in range(rng.randint(1, 3)):
+            events = [{"introduced": f"{major}.0.0"}, {"fixed": f"{major}.{rng.randint(1, 20)}.{rng.randint(0, 9)}"}]
+            ranges.append({"type": "ECOSYSTEM", "events": events})
+            major += 1
+        advisory = {
+            "id": f"SYN-{i}",
+            "aliases": [f"CVE-2024-{i}"],
+            "summary": f"Synthetic advisory {i}",
+            "database_specific": {"severity": rng.choice(("LOW", "MODERATE", "HIGH", "CRITICAL"))},
+            "affected": [{"package": {"ecosystem": ecosystem, "name": f"pkg{rng.randrange(packages)}"}, "ranges": ranges}]
+        }
+        path = os.path.join(directory, ecosystem, f"SYN-{i}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(advisory, file)
+    return packages
+
+
+def _manifests(packages: int, dependencies: int, seed: int):
+    rng = random.Random(seed + 1)
+    names = [f"pkg{rng.randrange(packages)}" for _ in range(dependencies)]
+    # Even entries can fall in an affected range, odd ones are above every fix
+    versions = [f"{rng.randint(0, 5)}.0.1" if i % 2 == 0 else "99.0.0" for i in range(dependencies)]
+    requirements = "".join(f"{name}=={version}\n" for name, version in zip(names, versions))
+    package_json = json.dumps({"dependencies": {name: f"^{version}" for name, version in zip(names, versions)}})
+    return {"requirements.txt": requirements, "package.json": package_json}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--advisories", type=int, default=50_000)
+    parser.add_argument("--dependencies", type=int, default=200, help="Entries per manifest")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+    with tempfile.TemporaryDirectory() as directory:
+        packages = _advisories(os.path.join(directory, "osv"), args.advisories, args.seed)
+        output = os.path.join(directory, "osv.idx")
+
+        started = time.perf_counter()
+        counts = build_index([os.path.join(directory, "osv")], output)
+        build_seconds = time.perf_counter() - started
+        print(
+            f"built {counts['advisories']:,} advisories, {counts['packages']:,} packages, "
+            f"{counts['ranges']:,} ranges in {build_seconds:.1f} s, {os.path.getsize(output) / 2**20:.1f} MB"
+        )
+
+        started = time.perf_counter()
+        index = DependencyIndex(output)
+        print(f"open {(time.perf_counter() - started) * 1000:.2f} ms")
+
+        print(f"{'manifest':<18} {'dependencies':>12} {'vulnerable':>10} {'median ms':>10}")
+        for filename, text in _manifests(packages, args.dependencies, args.seed).items():
+            parse = manifest_parser(filename)
+            timings = []
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                results = index.scan(parse(text))
+                timings.append(time.perf_counter() - started)
+            print(f"{filename:<18} {args.dependencies:>12} {len(results):>10} {statistics.median(timings) * 1000:>10.2f}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Disconnect Benchmark
+GPU time spent on generations whose clients already went away, with and without cancellation
+
+Usage:
+    python -m benchmarks.disconnect_benchmark --requests 60 --disconnect-rate 0.5
+
+Runs the same workload twice against the fake Ollama server: once letting
+abandoned generations run to completion (no disconnect handling) and once
+cancelling them when the client disconnects, which closes the stream.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Tuple
+
+import structlog
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production-use")
+os.environ.setdefault("MODEL_SCHEDULER_ENABLED", "false")
+
+from app.services.ollama_service import OllamaService  # noqa: E402
+from benchmarks.fake_ollama import FakeOllama  # noqa: E402
+
+
+def _workload(args) -> List[Tuple[float, float]]:
+    """(arrival time, disconnect after seconds or -1 to stay connected) per request"""
+    rng = random.Random(args.seed)
+    generation = args.completion_tokens / args.tokens_per_second
+    now = 0.0
+    jobs = []
+    for _ in range(args.requests):
+        now += rng.expovariate(args.rate)
+        if rng.random() < args.disconnect_rate:
+            jobs.append((now, rng.uniform(0.1, 0.9) * generation))
+        else:
+            jobs.append((now, -1.0))
+    return jobs
+
+
+async def _run(args, cancel: bool) -> Dict[str, float]:
+    fake = FakeOllama(
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens
+    ).start()
+    service = OllamaService(base_url=fake.url, model="llama3.1:8b")
+    abandoned: List[str] = []
+    start = time.monotonic()
+
+    async def request(i: int, arrival: float, disconnect_after: float):
+        await asyncio.sleep(max(arrival - (time.monotonic() - start), 0))
+        prompt = f"request-{i}"
+        task = asyncio.create_task(service.generate(prompt=prompt))
+        if disconnect_after < 0:
+            await task
+            return
+        abandoned.append(prompt)
+        done, _ = await asyncio.wait({task}, timeout=disconnect_after)
+        if not done and cancel:
+            task.cancel()
+        await asyncio.wait({task})
+
+    try:
+        await asyncio.gather(*(request(i, *job) for i, job in enumerate(_workload(args))))
+        # Let the server notice the last closed connections
+        await asyncio.sleep(0.2)
+    finally:
+        await service.close()
+        fake.stop()
+
+    wasted = sum(fake.decode_seconds.get(p, 0.0) for p in abandoned)
+    return {
+        "gpu_seconds": fake.total_decode_seconds,
+        "wasted": wasted,
+        "abandoned": len(abandoned),
+        "aborted": fake.aborted,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--rate", type=float, default=10.0, help="Arrivals per second")
+    parser.add_argument("--disconnect-rate", type=float, default=0.5, help="Share of clients that disconnect")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+
+    print(
+        f"{args.requests} requests, {args.disconnect_rate:.0%} disconnect mid-generation, "
+        f"{args.completion_tokens} tokens at {args.tokens_per_second} tok/s"
+    )
+    print(f"{'mode':<10} {'gpu s':>8} {'wasted s':>9} {'abandoned':>10} {'aborted':>8}")
+    results = {}
+    for cancel in (False, True):
+        mode = "cancel" if cancel else "ignore"
+        results[mode] = r = asyncio.run(_run(args, cancel))
+        print(f"{mode:<10} {r['gpu_seconds']:>8.1f} {r['wasted']:>9.1f} {r['abandoned']:>10} {r['aborted']:>8}")
+
+    reclaimed = results["ignore"]["gpu_seconds"] - results["cancel"]["gpu_seconds"]
+    print(
+        f"reclaimed {reclaimed:.1f} GPU-seconds "
+        f"({reclaimed / results['ignore']['gpu_seconds']:.0%} of the unmanaged total)"
+    )
+
+
+if __name__ == "__main__":
+    main()
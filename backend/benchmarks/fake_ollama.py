@@ -0,0 +1,382 @@
+"""
+Fake Ollama Server
+Stdlib HTTP server speaking enough of the Ollama and OpenAI chat APIs to benchmark the backend without a GPU
+
+Usage:
+    python -m benchmarks.fake_ollama --port 11434 --tokens-per-second 40 --latency 0.3 --load-delay 4
+
+Generation is simulated by sleeping: load_delay when a request needs a
+model other than the one loaded (one model fits on the fake GPU), latency
+for prompt evaluation, then one sleep per token. The durations reported
+in the final chunk are the simulated ones. A streaming response stops
+"decoding" as soon as a write to the client fails, the way Ollama stops when
+the client closes the connection, and the server records how many seconds
+it spent on each request after the model load.
+
+The same server answers /v1/models and /v1/chat/completions (server-sent
+events, with a usage chunk when stream_options.include_usage is set) like
+vLLM or llama.cpp-server.
+
+Nothing is random: the same requests always get the same canned outputs.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# A plausible code analysis, so response parsing costs what it does in production
+CANNED_ANALYSIS = json.dumps({
+    "vulnerabilities": [
+        {
+            "id": "CWE-89",
+            "title": "SQL Injection",
+            "severity": "HIGH",
+            "confidence": 0.92,
+            "location": {
+                "file": "app.py",
+                "line": 3,
+                "snippet": "db.execute(\"SELECT * FROM users WHERE id = \" + user_id)"
+            },
+            "description": "User input is concatenated into a SQL statement.",
+            "impact": "Attackers can read or modify arbitrary rows.",
+            "exploitability": "HIGH",
+            "remediation": "Use parameterized queries.",
+            "secure_code": "db.execute(\"SELECT * FROM users WHERE id = ?\", (user_id,))",
+            "references": ["OWASP-A03:2021", "CWE-89"]
+        },
+        {
+            "id": "CWE-798",
+            "title": "Hard-coded Credentials",
+            "severity": "MEDIUM",
+            "confidence": 0.8,
+            "location": {"file": "app.py", "line": 1, "snippet": "password = 'hunter2'"},
+            "description": "A password literal is assigned in source code.",
+            "impact": "Anyone with the source can authenticate.",
+            "exploitability": "MEDIUM",
+            "remediation": "Load secrets from the environment or a vault.",
+            "references": ["CWE-798"]
+        }
+    ],
+    "secrets": [{"type": "Password", "line": 1, "description": "Hardcoded password detected"}],
+    "dependencies": [],
+    "compliance": {
+        "OWASP-2025": {"compliant": False, "issues": 1},
+        "CWE-Top-25": {"compliant": False, "issues": 2}
+    }
+})
+
+
+class FakeOllama:
+    """
+    In-process fake Ollama backend
+
+    Usage:
+        with FakeOllama(tokens_per_second=50, completion_tokens=200) as fake:
+            service = OllamaService(base_url=fake.url, model="llama3.1:8b")
+
+    Args:
+        tokens_per_second: Simulated generation speed
+        completion_tokens: Tokens per response
+        prompt_tokens: Prompt tokens reported per request
+        response_text: Output for models without an entry in responses
+        models: Models listed by /api/tags and /v1/models
+        latency: Seconds of prompt evaluation before the first token
+        load_delay: Seconds to load a model that is not the loaded one
+        responses: Canned output per model
+    """
+
+    def __init__(
+        self,
+        tokens_per_second: float = 50.0,
+        completion_tokens: int = 200,
+        prompt_tokens: int = 1000,
+        response_text: str = "{}",
+        models: Optional[List[str]] = None,
+        latency: float = 0.0,
+        load_delay: float = 0.0,
+        responses: Optional[Dict[str, str]] = None
+    ):
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.prompt_tokens = prompt_tokens
+        self.response_text = response_text
+        self.models = models or ["llama3.1:8b", "llava:13b"]
+        self.latency = latency
+        self.load_delay = load_delay
+        self.responses = responses or {}
+
+        self.lock = threading.Lock()
+        self.decode_seconds: Dict[str, float] = {}  # Last user message -> seconds decoded
+        self.aborted = 0
+        self.completed = 0
+        self.loads = 0
+        self.loaded_model: Optional[str] = None
+        self.requests: List[dict] = []  # Chat request bodies, in arrival order
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def total_decode_seconds(self) -> float:
+        with self.lock:
+            return sum(self.decode_seconds.values())
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeOllama":
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self) -> "FakeOllama":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def text_for(self, model: Optional[str]) -> str:
+        return self.responses.get(model, self.response_text)
+
+    def _load(self, model: Optional[str]) -> float:
+        """Simulate loading the model if another one is loaded; returns the seconds spent"""
+        with self.lock:
+            if model == self.loaded_model or not self.load_delay:
+                self.loaded_model = model
+                return 0.0
+            self.loaded_model = model
+            self.loads += 1
+        time.sleep(self.load_delay)
+        return self.load_delay
+
+    def _unload(self, model: Optional[str]):
+        with self.lock:
+            if model == self.loaded_model:
+                self.loaded_model = None
+
+    def _record(self, key: str, seconds: float, aborted: bool):
+        with self.lock:
+            self.decode_seconds[key] = self.decode_seconds.get(key, 0.0) + seconds
+            if aborted:
+                self.aborted += 1
+            else:
+                self.completed += 1
+
+
+def _handler_for(fake: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": [{"name": m} for m in fake.models]})
+            elif self.path == "/v1/models":
+                self._send_json({"object": "list", "data": [{"id": m, "object": "model"} for m in fake.models]})
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/api/generate":
+                if body.get("keep_alive") == 0:
+                    fake._unload(body.get("model"))
+                self._send_json({"model": body.get("model"), "done": True})
+            elif self.path == "/api/chat":
+                self._chat(body)
+            elif self.path == "/v1/chat/completions":
+                self._chat_completions(body)
+            else:
+                self.send_error(404)
+
+        def _key(self, body: dict) -> str:
+            """Text of the last message (OpenAI content may be a list of parts)"""
+            with fake.lock:
+                fake.requests.append(body)
+            content = (body.get("messages") or [{}])[-1].get("content", "")
+            if isinstance(content, list):
+                return "".join(part.get("text", "") for part in content)
+            return content
+
+        def _start(self, body: dict) -> Tuple[float, float]:
+            """Load the model and evaluate the prompt; returns (load seconds, decode start)"""
+            load = fake._load(body.get("model"))
+            started = time.perf_counter()
+            if fake.latency:
+                time.sleep(fake.latency)
+            return load, started
+
+        def _pieces(self, model: Optional[str]):
+            """Yield the response text a token at a time, sleeping per token"""
+            tokens = fake.completion_tokens
+            text = fake.text_for(model)
+            step = max(len(text) // tokens, 1)
+            for i in range(tokens):
+                time.sleep(1 / fake.tokens_per_second)
+                yield text[i * step:(i + 1) * step] if i < tokens - 1 else text[i * step:]
+
+        def _chat(self, body: dict):
+            key = self._key(body)
+            load, started = self._start(body)
+
+            if not body.get("stream", True):
+                text = "".join(self._pieces(body.get("model")))
+                fake._record(key, time.perf_counter() - started, aborted=False)
+                self._send_json(self._final(body, text, load, started))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                for piece in self._pieces(body.get("model")):
+                    chunk = {"model": body.get("model"), "message": {"role": "assistant", "content": piece}, "done": False}
+                    self.wfile.write(json.dumps(chunk).encode() + b"\n")
+                    self.wfile.flush()
+                self.wfile.write(json.dumps(self._final(body, "", load, started)).encode() + b"\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                fake._record(key, time.perf_counter() - started, aborted=True)
+                return
+            fake._record(key, time.perf_counter() - started, aborted=False)
+
+        def _chat_completions(self, body: dict):
+            key = self._key(body)
+            _, started = self._start(body)
+            model = body.get("model")
+
+            if not body.get("stream"):
+                text = "".join(self._pieces(model))
+                fake._record(key, time.perf_counter() - started, aborted=False)
+                self._send_json({
+                    "object": "chat.completion",
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": self._usage()
+                })
+                return
+
+            def event(data: dict):
+                self.wfile.write(b"data: " + json.dumps(data).encode() + b"\n\n")
+                self.wfile.flush()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            try:
+                for piece in self._pieces(model):
+                    event({
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                    })
+                event({
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                })
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    event({"object": "chat.completion.chunk", "model": model, "choices": [], "usage": self._usage()})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                fake._record(key, time.perf_counter() - started, aborted=True)
+                return
+            fake._record(key, time.perf_counter() - started, aborted=False)
+
+        def _usage(self) -> dict:
+            return {
+                "prompt_tokens": fake.prompt_tokens,
+                "completion_tokens": fake.completion_tokens,
+                "total_tokens": fake.prompt_tokens + fake.completion_tokens
+            }
+
+        def _final(self, body: dict, content: str, load: float, started: float) -> dict:
+            elapsed = time.perf_counter() - started
+            prompt_eval = min(fake.latency, elapsed)
+            return {
+                "model": body.get("model"),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "prompt_eval_count": fake.prompt_tokens,
+                "eval_count": fake.completion_tokens,
+                "load_duration": int(load * 1e9),
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_duration": int((elapsed - prompt_eval) * 1e9),
+                "total_duration": int((load + elapsed) * 1e9)
+            }
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--prompt-tokens", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="Seconds to swap in another model")
+    parser.add_argument("--models", nargs="+", default=None)
+    parser.add_argument("--response-file", help="File whose content every model returns")
+    parser.add_argument(
+        "--model-response",
+        action="append",
+        default=[],
+        metavar="MODEL=FILE",
+        help="File whose content one model returns (repeatable)"
+    )
+    args = parser.parse_args()
+
+    response_text = CANNED_ANALYSIS
+    if args.response_file:
+        with open(args.response_file) as f:
+            response_text = f.read()
+    responses: Dict[str, str] = {}
+    for item in args.model_response:
+        model, _, path = item.partition("=")
+        with open(path) as f:
+            responses[model] = f.read()
+
+    fake = FakeOllama(
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        prompt_tokens=args.prompt_tokens,
+        response_text=response_text,
+        models=args.models,
+        latency=args.latency,
+        load_delay=args.load_delay,
+        responses=responses
+    ).start(args.host, args.port)
+    print(f"Fake Ollama listening on {fake.url} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Findings History Benchmark
+Latency of the findings history queries from the rollups vs the same aggregates over the raw findings
+
+Usage:
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.history_benchmark --analyses 200000
+    DATABASE_URL=sqlite+aiosqlite:///history.db python -m benchmarks.history_benchmark --analyses 20000
+
+Seeds --analyses code analyses spread over --days days (about
+--findings-per-analysis findings each, drawn from a skewed set of CWEs) through
+AnalysisStore's batch writer, so the rollups are maintained exactly as in
+production. Then times each history query (median of --rounds) next to the
+equivalent GROUP BY over the findings table.
+
+Use an empty database: the tables are created if missing, but existing rows
+are counted too.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+
+import structlog
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production-use")
+
+LANGUAGES = ("python", "javascript", "java", "go", "typescript", "php")
+SEVERITIES = ("CRITICAL", "HIGH", "MEDIUM", "LOW", "INFO")
+CWES = [f"CWE-{number}" for number in (79, 89, 20, 78, 22, 352, 434, 862, 476, 287, 190, 502, 77, 119, 798, 918, 306, 362, 269, 94)]
+
+
+def _result(rng: random.Random, now: datetime, args) -> Dict[str, Any]:
+    created_at = now - timedelta(seconds=rng.uniform(0, args.days * 86400))
+    findings = []
+    for _ in range(rng.randint(0, 2 * args.findings_per_analysis)):
+        findings.append({
+            # Skewed: a few CWEs make up most findings
+            "id": CWES[min(int(rng.expovariate(0.25)), len(CWES) - 1)],
+            "title": "Finding",
+            "severity": rng.choice(SEVERITIES),
+            "confidence": round(rng.random(), 2),
+            "location": {"file": "app.py", "line": rng.randint(1, 500)}
+        })
+    return {
+        "analysis_id": str(uuid.uuid4()),
+        "timestamp": created_at.replace(tzinfo=None).isoformat(),
+        "language": rng.choice(LANGUAGES),
+        "vulnerabilities": findings,
+        "metadata": {"code_hash": f"{rng.getrandbits(256):064x}", "ai_model": "llama3.1:8b"}
+    }
+
+
+async def _seed(args) -> str:
+    from app.services.analysis_store import AnalysisStore
+
+    store = AnalysisStore()
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    code_hash = None
+    started = time.perf_counter()
+    for start in range(0, args.analyses, args.batch):
+        batch = [("code", "benchmark", _result(rng, now, args)) for _ in range(min(args.batch, args.analyses - start))]
+        code_hash = code_hash or batch[0][2]["metadata"]["code_hash"]
+        await store._write(batch)
+    print(f"seeded {args.analyses:,} analyses in {time.perf_counter() - started:.1f}s")
+    return code_hash
+
+
+async def _median_ms(query: Callable[[], Awaitable[Any]], rounds: int) -> float:
+    await query()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await query()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def _run(args):
+    from sqlalchemy import func, select
+
+    from app.core.database import close_db, get_engine
+    from app.models.analysis import Finding
+    from app.services import findings_history
+
+    code_hash = await _seed(args) if args.analyses else None
+
+    async with get_engine().connect() as conn:
+        findings = (await conn.execute(select(func.count()).select_from(Finding))).scalar_one()
+    print(f"{findings:,} findings stored")
+
+    week = datetime.now(timezone.utc) - timedelta(days=7)
+    month = datetime.now(timezone.utc) - timedelta(days=30)
+
+    async def raw(query):
+        async with get_engine().connect() as conn:
+            return (await conn.execute(query)).all()
+
+    queries: List = [
+        (
+            "top CWEs this week",
+            lambda: findings_history.top_rules(7, 10),
+            lambda: raw(
+                select(Finding.rule_id, Finding.severity, func.count())
+                .where(Finding.created_at >= week)
+                .group_by(Finding.rule_id, Finding.severity)
+            )
+        ),
+        (
+            "severity trends 30 days",
+            lambda: findings_history.severity_trends(30),
+            lambda: raw(
+                select(func.date(Finding.created_at), Finding.language, Finding.severity, func.count())
+                .where(Finding.created_at >= month)
+                .group_by(func.date(Finding.created_at), Finding.language, Finding.severity)
+            )
+        ),
+    ]
+    if code_hash:
+        queries.append(("findings by code hash", lambda: findings_history.findings_by_code_hash(code_hash), None))
+
+    print(f"{'query':<26} {'rollup ms':>10} {'raw scan ms':>12}")
+    for name, rollup, scan in queries:
+        rollup_ms = await _median_ms(rollup, args.rounds)
+        scan_ms = f"{await _median_ms(scan, args.rounds):>12.1f}" if scan and not args.skip_raw else f"{'-':>12}"
+        print(f"{name:<26} {rollup_ms:>10.1f} {scan_ms}")
+
+    await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--analyses", type=int, default=20000, help="Analyses to seed, 0 to query existing data")
+    parser.add_argument("--findings-per-analysis", type=int, default=5, help="Mean findings per analysis")
+    parser.add_argument("--days", type=int, default=90, help="Days the analyses are spread over")
+    parser.add_argument("--batch", type=int, default=500, help="Analyses per write transaction")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-raw", action="store_true", help="Only time the rollup queries")
+    args = parser.parse_args()
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+JSON Offload Benchmark
+Event loop stall and total time of parsing model responses inline, in the thread pool and in the process pool
+
+Usage:
+    python -m benchmarks.json_offload_benchmark
+    python -m benchmarks.json_offload_benchmark --findings 500 5000 50000 --rounds 9
+
+Each response is a findings list shaped like a code analysis. While it is
+parsed, a ticker task sleeps 1 ms at a time and records the longest it was
+kept waiting beyond that: the stall other requests would see. Medians over
+--rounds runs are reported.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import orjson
+
+TICK = 0.001
+
+
+def _response(findings: int) -> str:
+    vulnerabilities = [
+        {
+            "id": f"CWE-{i}",
+            "title": "SQL Injection",
+            "severity": "HIGH",
+            "confidence": 0.9,
+            "location": {"file": "app.py", "line": i, "snippet": "db.execute(query + user_id)" * 3},
+            "description": "User input is concatenated into a SQL statement.",
+            "references": ["OWASP-A03:2021", "CWE-89"]
+        }
+        for i in range(findings)
+    ]
+    return orjson.dumps({"vulnerabilities": vulnerabilities, "secrets": []}).decode()
+
+
+async def _parse(text: str, executor: Optional[Executor]) -> Tuple[float, float]:
+    """(total seconds, longest loop stall in seconds) of one parse"""
+    loop = asyncio.get_running_loop()
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        while not done:
+            started = loop.time()
+            await asyncio.sleep(TICK)
+            stall = max(stall, loop.time() - started - TICK)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK * 5)
+    started = time.perf_counter()
+    if executor is None:
+        orjson.loads(text)
+    else:
+        await loop.run_in_executor(executor, orjson.loads, text)
+    total = time.perf_counter() - started
+    done = True
+    await task
+    return total, stall
+
+
+async def _run(args):
+    pools = {
+        "inline": None,
+        "thread": ThreadPoolExecutor(max_workers=2),
+        "process": ProcessPoolExecutor(max_workers=2),
+    }
+    # Start the worker processes before timing
+    await asyncio.get_running_loop().run_in_executor(pools["process"], orjson.loads, "{}")
+
+    print(f"{'response':>10} {'mode':<8} {'total ms':>9} {'stall ms':>9}")
+    for findings in args.findings:
+        text = _response(findings)
+        for mode, executor in pools.items():
+            runs = [await _parse(text, executor) for _ in range(args.rounds)]
+            total = statistics.median(run[0] for run in runs)
+            stall = statistics.median(run[1] for run in runs)
+            print(f"{len(text) / 2**20:>7.2f} MB {mode:<8} {total * 1000:>9.1f} {stall * 1000:>9.1f}")
+
+    for executor in pools.values():
+        if executor is not None:
+            executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--findings", type=int, nargs="+", default=[500, 5000, 50000])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+Load Test
+End-to-end throughput, latency percentiles and server memory of the analysis endpoints
+
+Usage:
+    python -m benchmarks.load_test --concurrency 16 --requests 400 --mix code=3,diagram=1
+    python -m benchmarks.load_test --url http://localhost:8000 --server-pid 1234 --label staging
+
+By default the harness starts the fake Ollama server in-process and the API
+under uvicorn pointed at it, with rate limits lifted and Redis-backed
+components switched to their in-memory variants. --url targets a server that
+is already running (its OLLAMA_BASE_URL is then up to you; --fake-port
+starts the fake on a fixed port for it); pass --server-pid to sample its
+memory.
+
+Closed-loop clients keep --concurrency requests in flight. Each run appends
+one JSON record (configuration, git revision, per-endpoint throughput,
+p50/p95/p99 latency, errors, peak and final server RSS) to --output and is
+compared with the previous run that has the same label.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.fake_ollama import CANNED_ANALYSIS, FakeOllama
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_OUTPUT = BACKEND_DIR / "benchmarks" / "results" / "load_test.jsonl"
+
+# Server settings for a self-contained run; --env overrides them
+SERVER_ENV = {
+    "SECRET_KEY": "benchmark-secret-key-not-for-production-use",
+    "ENVIRONMENT": "development",
+    "WARMUP_ENABLED": "false",
+    "RATE_LIMIT_BACKEND": "memory",
+    "RATE_LIMIT_INTERACTIVE_CAPACITY": "1000000000",
+    "RATE_LIMIT_INTERACTIVE_REFILL_RATE": "1000000000",
+    "RATE_LIMIT_CI_CAPACITY": "1000000000",
+    "RATE_LIMIT_CI_REFILL_RATE": "1000000000",
+    "USAGE_LEDGER_BACKEND": "memory",
+    "DIAGRAM_CACHE_ENABLED": "false",
+    "ANALYSIS_STORE_ENABLED": "false",
+    "LOG_LEVEL": "WARNING",
+}
+
+CODE_SAMPLES = [
+    (
+        "python",
+        "app.py",
+        "password = 'hunter2'\n"
+        "def get_user(db, user_id):\n"
+        "    return db.execute(\"SELECT * FROM users WHERE id = \" + user_id)\n"
+    ),
+    (
+        "javascript",
+        "render.js",
+        "function render(req, res) {\n"
+        "  res.send('<h1>' + req.query.name + '</h1>');\n"
+        "}\n"
+    ),
+    (
+        "go",
+        "exec.go",
+        "func run(w http.ResponseWriter, r *http.Request) {\n"
+        "\tout, _ := exec.Command(\"sh\", \"-c\", r.URL.Query().Get(\"cmd\")).Output()\n"
+        "\tw.Write(out)\n"
+        "}\n"
+    ),
+]
+
+
+def code_payload(rng: random.Random, index: int, max_repeat: int) -> dict:
+    language, filename, snippet = rng.choice(CODE_SAMPLES)
+    comment = "//" if language != "python" else "#"
+    # The request number keeps every submission distinct for any cache in the path
+    code = f"{comment} load test request {index}\n" + snippet * rng.randint(1, max_repeat)
+    return {"code": code, "language": language, "filename": filename}
+
+
+def _diagram_svg(rng: random.Random, index: int) -> bytes:
+    """A small architecture diagram: labelled boxes in a row joined by lines"""
+    names = ["Load Balancer", "Web App", "API Gateway", "Auth Service", "Orders DB", "Cache", "Queue"]
+    count = rng.randint(3, len(names))
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{count * 200}" height="200">']
+    parts.append(f"<!-- load test request {index} -->")
+    for i, name in enumerate(names[:count]):
+        x = 20 + i * 200
+        parts.append(f'<rect x="{x}" y="60" width="140" height="60"/>')
+        parts.append(f'<text x="{x + 10}" y="95">{name}</text>')
+        if i:
+            parts.append(f'<line x1="{x - 60}" y1="90" x2="{x}" y2="90"/>')
+            parts.append(f'<text x="{x - 55}" y="80">HTTP</text>')
+    parts.append("</svg>")
+    return "\n".join(parts).encode()
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """Resident memory of a process and its descendants (uvicorn workers), from /proc"""
+    try:
+        parents: Dict[int, int] = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        # The command name may contain spaces; fields resume after the last ')'
+                        parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+    except OSError:
+        return None
+
+    tree = {pid}
+    grew = True
+    while grew:
+        children = {child for child, parent in parents.items() if parent in tree} - tree
+        grew = bool(children)
+        tree |= children
+
+    total = 0
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total or None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _api_key(client: int) -> str:
+    return f"load-{client}"
+
+
+def start_server(args, ollama_url: str) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = {**os.environ, **SERVER_ENV, "OLLAMA_BASE_URL": ollama_url}
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    log = tempfile.TemporaryFile(mode="w+")
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(args.workers),
+            "--log-level", "warning"
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        # A file rather than a pipe nobody drains, which would block a chatty server
+        stderr=log
+    )
+    process.log = log
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                process.log.seek(0)
+                raise RuntimeError(f"Server exited with {process.returncode}:\n{process.log.read()[-2000:]}")
+            try:
+                if (await client.get(f"{url}/health", timeout=2.0)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server at {url} not healthy after {timeout}s")
+
+
+async def _drive(args, url: str, server_pid: Optional[int]) -> Dict[str, object]:
+    mix = []
+    for item in args.mix.split(","):
+        endpoint, _, weight = item.partition("=")
+        mix.append((endpoint.strip(), float(weight or 1)))
+    endpoints = [endpoint for endpoint, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    rng = random.Random(args.seed)
+    plan = rng.choices(endpoints, weights=weights, k=args.warmup + args.requests)
+    latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in endpoints}
+    errors: Dict[str, Dict[str, int]] = {endpoint: {} for endpoint in endpoints}
+    rss_samples: List[int] = []
+    next_index = 0
+
+    async def sample_rss():
+        while True:
+            rss = _rss_bytes(server_pid)
+            if rss:
+                rss_samples.append(rss)
+            await asyncio.sleep(args.rss_interval)
+
+    async def send(client: httpx.AsyncClient, index: int) -> Tuple[str, float, Optional[str]]:
+        endpoint = plan[index]
+        payload_rng = random.Random(args.seed * 1_000_003 + index)
+        headers = {"X-API-Key": _api_key(index % args.concurrency)}
+        started = time.perf_counter()
+        try:
+            if endpoint == "code":
+                response = await client.post(
+                    f"{url}/api/v1/analyze/code",
+                    json=code_payload(payload_rng, index, args.code_repeat),
+                    headers=headers
+                )
+            else:
+                response = await client.post(
+                    f"{url}/api/v1/analyze/diagram",
+                    files={"file": (f"diagram-{index}.svg", _diagram_svg(payload_rng, index), "image/svg+xml")},
+                    headers=headers
+                )
+            error = None if response.status_code == 200 else str(response.status_code)
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        return endpoint, time.perf_counter() - started, error
+
+    async def worker(client: httpx.AsyncClient, stop_at: int, record: bool):
+        nonlocal next_index
+        while next_index < stop_at:
+            index = next_index
+            next_index += 1
+            endpoint, seconds, error = await send(client, index)
+            if not record:
+                continue
+            if error is None:
+                latencies[endpoint].append(seconds)
+            else:
+                errors[endpoint][error] = errors[endpoint].get(error, 0) + 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        if args.warmup:
+            await asyncio.gather(*(worker(client, args.warmup, False) for _ in range(args.concurrency)))
+
+        sampler = asyncio.create_task(sample_rss()) if server_pid else None
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, args.warmup + args.requests, True) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+        if sampler is not None:
+            sampler.cancel()
+        final_rss = _rss_bytes(server_pid) if server_pid else None
+
+    def summary(values: List[float], failed: Dict[str, int]) -> Dict[str, object]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 1)
+        return {
+            "requests": len(values) + sum(failed.values()),
+            "errors": failed,
+            "throughput": round(len(values) / elapsed, 2),
+            "p50_ms": ms(_percentile(values, 50)),
+            "p95_ms": ms(_percentile(values, 95)),
+            "p99_ms": ms(_percentile(values, 99)),
+        }
+
+    every_error: Dict[str, int] = {}
+    for failed in errors.values():
+        for code, count in failed.items():
+            every_error[code] = every_error.get(code, 0) + count
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "overall": summary([v for values in latencies.values() for v in values], every_error),
+        "endpoints": {endpoint: summary(latencies[endpoint], errors[endpoint]) for endpoint in endpoints},
+        "rss_peak_mb": round(max(rss_samples + [final_rss or 0]) / 2**20, 1) if server_pid else None,
+        "rss_final_mb": round(final_rss / 2**20, 1) if final_rss else None,
+    }
+
+
+def _previous(output: Path, label: str) -> Optional[dict]:
+    if not output.exists():
+        return None
+    previous = None
+    with open(output) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("label") == label:
+                    previous = record
+    return previous
+
+
+def _print_report(record: dict, previous: Optional[dict]):
+    results = record["results"]
+    print(f"{'endpoint':<10} {'n':>6} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("overall", results["overall"])] + list(results["endpoints"].items())
+    for name, r in rows:
+        def fmt(value):
+            return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+        print(
+            f"{name:<10} {r['requests']:>6} {sum(r['errors'].values()):>7} {r['throughput']:>8.2f} "
+            f"{fmt(r['p50_ms'])} {fmt(r['p95_ms'])} {fmt(r['p99_ms'])}"
+        )
+    if results["rss_peak_mb"] is not None:
+        print(f"server RSS: peak {results['rss_peak_mb']} MB, final {results['rss_final_mb']} MB")
+
+    if previous is None:
+        return
+    before = previous["results"]
+    print(f"vs previous '{record['label']}' run ({previous.get('git_revision')}, {previous['timestamp']}):")
+    for key in ("throughput", "p50_ms", "p95_ms", "p99_ms"):
+        old, new = before["overall"].get(key), results["overall"].get(key)
+        if old and new is not None:
+            print(f"  {key:<11} {old:>9} -> {new:<9} ({(new - old) / old:+.1%})")
+    if before.get("rss_peak_mb") and results["rss_peak_mb"]:
+        old, new = before["rss_peak_mb"], results["rss_peak_mb"]
+        print(f"  {'rss_peak_mb':<11} {old:>9} -> {new:<9} ({(new - old) / old:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument("--requests", type=int, default=400, help="Measured requests")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests first")
+    parser.add_argument("--mix", default="code=3,diagram=1", help="Endpoint weights")
+    parser.add_argument("--code-repeat", type=int, default=20, help="Largest number of times a snippet repeats")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--label", default="default", help="Runs with the same label are compared")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--rss-interval", type=float, default=0.5)
+
+    server = parser.add_argument_group("server under test")
+    server.add_argument("--url", help="Running server to test instead of starting one")
+    server.add_argument("--server-pid", type=int, help="PID of the --url server, to sample its RSS")
+    server.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the server")
+    server.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Server setting (repeatable)")
+
+    fake = parser.add_argument_group("fake Ollama")
+    fake.add_argument("--fake-port", type=int, default=0)
+    fake.add_argument("--tokens-per-second", type=float, default=200.0)
+    fake.add_argument("--completion-tokens", type=int, default=100)
+    fake.add_argument("--latency", type=float, default=0.05, help="Seconds before the first token")
+    fake.add_argument("--load-delay", type=float, default=0.0, help="Seconds to swap models")
+    args = parser.parse_args()
+
+    fake_server = FakeOllama(
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        response_text=CANNED_ANALYSIS,
+        latency=args.latency,
+        load_delay=args.load_delay
+    ).start(port=args.fake_port)
+
+    process = None
+    try:
+        if args.url:
+            url, server_pid = args.url.rstrip("/"), args.server_pid
+        else:
+            # One API key per closed-loop client, so usage and fair share are per client
+            api_keys = {hashlib.sha256(_api_key(i).encode()).hexdigest(): _api_key(i) for i in range(args.concurrency)}
+            args.env = [f"CLIENT_API_KEYS={json.dumps(api_keys)}"] + args.env
+            process, url = start_server(args, fake_server.url)
+            server_pid = process.pid
+        asyncio.run(wait_ready(url, process))
+
+        print(
+            f"{args.requests} requests ({args.mix}) at concurrency {args.concurrency} against {url}, "
+            f"fake model {args.tokens_per_second} tok/s x {args.completion_tokens} tokens"
+        )
+        results = asyncio.run(_drive(args, url, server_pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        fake_server.stop()
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "label": args.label,
+        "git_revision": _git_revision(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "mix": args.mix,
+            "code_repeat": args.code_repeat,
+            "workers": None if args.url else args.workers,
+            "env": args.env,
+            "seed": args.seed,
+            "fake": {
+                "tokens_per_second": args.tokens_per_second,
+                "completion_tokens": args.completion_tokens,
+                "latency": args.latency,
+                "load_delay": args.load_delay,
+            },
+        },
+        "results": results,
+    }
+    previous = _previous(args.output, args.label)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    _print_report(record, previous)
+    print(f"results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Event Loop Lag Benchmark
+/health and small-analysis latency while large analyses run, with CPU-bound steps inline vs offloaded
+
+Usage:
+    python -m benchmarks.loop_lag_benchmark --duration 20 --background 4 --diagram-mb 20
+
+The API is started twice under uvicorn against the fake Ollama server (in
+its own process): once with OFFLOAD_MIN_BYTES so high that every step runs
+on the event loop, once with the default policy. In each run a separate
+process keeps --background large analyses in flight (code of about
+--code-kb, PNG diagrams of --diagram-mb for the vision model) while this
+process probes /health and submits small code analyses. The model
+scheduler is disabled so that small analyses never queue behind large ones
+for a model slot; what is left of their latency is time spent waiting for
+the event loop.
+
+Reported per run: p50/p99 of both probes and the server's own event loop
+lag histogram (shadowscan_event_loop_lag_seconds, from /metrics).
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import re
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.load_test import BACKEND_DIR, CODE_SAMPLES, free_port, start_server, wait_ready
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Every step inline: no input reaches the threshold
+INLINE_THRESHOLD = str(2**62)
+
+LAG_BUCKET = re.compile(r'^shadowscan_event_loop_lag_seconds_bucket\{le="([^"]+)"\} ([0-9.e+]+)$', re.MULTILINE)
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _large_code(rng: random.Random, index: int, target_bytes: int) -> dict:
+    """A source file of about target_bytes, under the CODE_MAX_LINES limit (lines are padded)"""
+    language, filename, snippet = rng.choice(CODE_SAMPLES)
+    comment = "//" if language != "python" else "#"
+    lines = []
+    size = 0
+    for line in snippet.splitlines() * (target_bytes // len(snippet) + 1):
+        line = f"{line}  {comment} {'x' * 60}"
+        lines.append(line)
+        size += len(line) + 1
+        if size >= target_bytes:
+            break
+    code = f"{comment} loop lag request {index}\n" + "\n".join(lines)
+    return {"code": code, "language": language, "filename": filename}
+
+
+def _background(url: str, args, stop: multiprocessing.Event):
+    """Keep large analyses in flight until stopped (runs in a child process)"""
+
+    async def worker(client: httpx.AsyncClient, worker_id: int):
+        rng = random.Random(args.seed + worker_id)
+        # Random bytes do not compress: the upload and base64 costs are the full size
+        image = PNG_SIGNATURE + rng.randbytes(args.diagram_mb * 2**20)
+        index = 0
+        while not stop.is_set():
+            index += 1
+            try:
+                if args.diagram_mb and index % 2:
+                    await client.post(
+                        f"{url}/api/v1/analyze/diagram",
+                        files={"file": (f"large-{worker_id}-{index}.png", image, "image/png")}
+                    )
+                else:
+                    await client.post(
+                        f"{url}/api/v1/analyze/code",
+                        json=_large_code(rng, index, args.code_kb * 1024)
+                    )
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+
+    async def run():
+        async with httpx.AsyncClient(timeout=args.timeout) as client:
+            await asyncio.gather(*(worker(client, i) for i in range(args.background)))
+
+    asyncio.run(run())
+
+
+async def _probe(url: str, args) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = {"health": [], "small_code": []}
+    errors: Dict[str, int] = {"health": 0, "small_code": 0}
+    stop_at = time.monotonic() + args.duration
+
+    async def health(client: httpx.AsyncClient):
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            response = await client.get(f"{url}/health")
+            if response.status_code == 200:
+                latencies["health"].append(time.perf_counter() - started)
+            else:
+                errors["health"] += 1
+            await asyncio.sleep(args.health_interval)
+
+    async def small_code(client: httpx.AsyncClient):
+        rng = random.Random(args.seed)
+        index = 0
+        while time.monotonic() < stop_at:
+            index += 1
+            language, filename, snippet = rng.choice(CODE_SAMPLES)
+            started = time.perf_counter()
+            response = await client.post(
+                f"{url}/api/v1/analyze/code",
+                json={"code": f"# probe {index}\n{snippet}", "language": language, "filename": filename}
+            )
+            if response.status_code == 200:
+                latencies["small_code"].append(time.perf_counter() - started)
+            else:
+                errors["small_code"] += 1
+            await asyncio.sleep(args.small_interval)
+
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        await asyncio.gather(health(client), small_code(client))
+    latencies["errors"] = errors
+    return latencies
+
+
+def _lag_p99(metrics_text: str) -> Optional[str]:
+    """Upper bound of the histogram bucket holding the 99th percentile lag sample"""
+    buckets = [(le, float(count)) for le, count in LAG_BUCKET.findall(metrics_text)]
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    total = buckets[-1][1]
+    for le, count in buckets:
+        if count >= 0.99 * total:
+            return le
+    return None
+
+
+def _run(args, mode: str, ollama_url: str) -> Dict[str, object]:
+    env = ["MODEL_SCHEDULER_ENABLED=false", f"EVENT_LOOP_LAG_INTERVAL={args.lag_interval}"]
+    if mode == "inline":
+        env.append(f"OFFLOAD_MIN_BYTES={INLINE_THRESHOLD}")
+    process, url = start_server(SimpleNamespace(env=env + args.env, workers=1), ollama_url)
+    background = None
+    try:
+        asyncio.run(wait_ready(url, process))
+        stop = multiprocessing.Event()
+        background = multiprocessing.Process(target=_background, args=(url, args, stop), daemon=True)
+        background.start()
+        # Let the large analyses get going before measuring
+        time.sleep(args.ramp_up)
+        latencies = asyncio.run(_probe(url, args))
+        stop.set()
+        lag_p99 = _lag_p99(httpx.get(f"{url}/metrics/", timeout=10.0).text)
+    finally:
+        if background is not None:
+            background.terminate()
+            background.join(timeout=10)
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        probe: {
+            "n": len(latencies[probe]),
+            "errors": latencies["errors"][probe],
+            "p50_ms": ms(_percentile(latencies[probe], 50)),
+            "p99_ms": ms(_percentile(latencies[probe], 99)),
+        }
+        for probe in ("health", "small_code")
+    } | {"lag_p99_le_s": lag_p99}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of probing per run")
+    parser.add_argument("--ramp-up", type=float, default=3.0, help="Seconds of background load before probing")
+    parser.add_argument("--background", type=int, default=4, help="Large analyses in flight")
+    parser.add_argument("--code-kb", type=int, default=900, help="Size of the large code submissions")
+    parser.add_argument("--diagram-mb", type=int, default=20, help="Size of the large diagrams, 0 for code only")
+    parser.add_argument("--health-interval", type=float, default=0.02)
+    parser.add_argument("--small-interval", type=float, default=0.1)
+    parser.add_argument("--lag-interval", type=float, default=0.05, help="Server EVENT_LOOP_LAG_INTERVAL")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Server setting (repeatable)")
+    parser.add_argument("--modes", nargs="+", default=["inline", "offload"], choices=["inline", "offload"])
+    args = parser.parse_args()
+
+    # The fake gets its own process: decoding tens of MB of JSON there must
+    # not slow this process's probes
+    port = free_port()
+    fake = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_ollama",
+            "--port", str(port), "--tokens-per-second", "2000", "--completion-tokens", "100"
+        ],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL
+    )
+    ollama_url = f"http://127.0.0.1:{port}"
+
+    results = {}
+    try:
+        for mode in args.modes:
+            print(f"{mode}: {args.duration:.0f}s of probes behind {args.background} large analyses ...", flush=True)
+            results[mode] = _run(args, mode, ollama_url)
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+
+    print(f"{'mode':<8} {'probe':<11} {'n':>5} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9}   loop lag p99")
+    for mode, result in results.items():
+        for probe in ("health", "small_code"):
+            r = result[probe]
+            lag = f"<= {result['lag_p99_le_s']} s" if probe == "health" and result["lag_p99_le_s"] else ""
+            print(
+                f"{mode:<8} {probe:<11} {r['n']:>5} {r['errors']:>7} "
+                f"{r['p50_ms'] or 0:>9.1f} {r['p99_ms'] or 0:>9.1f}   {lag}"
+            )
+    if set(results) == {"inline", "offload"}:
+        for probe in ("health", "small_code"):
+            before, after = results["inline"][probe]["p99_ms"], results["offload"][probe]["p99_ms"]
+            if before and after:
+                print(f"{probe} p99: {before} ms -> {after} ms ({(after - before) / before:+.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Model Swap Benchmark
+Compares FIFO dispatch with the ModelScheduler on a GPU that holds one model at a time
+
+Usage:
+    python -m benchmarks.model_swap_benchmark --requests 400 --swap-cost 10
+
+All durations are in simulated seconds; --time-scale sets how many real
+seconds one simulated second takes.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import structlog
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production-use")
+
+from app.services.model_scheduler import ModelScheduler  # noqa: E402
+
+CODE_MODEL = "llama3.1:8b"
+VISION_MODEL = "llava:13b"
+
+
+class SimulatedGPU:
+    """
+    Ollama-like backend: one resident model, FIFO admission, parallel slots
+
+    A request for a model other than the resident one waits until in-flight
+    requests finish, then pays swap_cost to load its model.
+    """
+
+    def __init__(self, swap_cost: float, parallel: int, scale: float):
+        self.swap_cost = swap_cost
+        self.parallel = parallel
+        self.scale = scale
+        self.resident: Optional[str] = None
+        self.loads = 0
+        self._last_loaded: Optional[str] = None
+        self._active = 0
+        self._waiting: Deque[Tuple[str, asyncio.Future]] = deque()
+
+    @property
+    def swaps(self) -> int:
+        return max(self.loads - 1, 0)
+
+    def _pump(self):
+        """Admit requests from the head of the line while they fit"""
+        while self._waiting:
+            model, admitted = self._waiting[0]
+            if admitted.cancelled():
+                self._waiting.popleft()
+                continue
+            if self._active and (self.resident != model or self._active >= self.parallel):
+                return
+            self._waiting.popleft()
+            self._active += 1
+            load = self.resident != model
+            if load:
+                self.resident = model
+                if self._last_loaded != model:
+                    self.loads += 1
+                self._last_loaded = model
+            admitted.set_result(load)
+
+    async def generate(self, model: str, duration: float):
+        admitted = asyncio.get_running_loop().create_future()
+        self._waiting.append((model, admitted))
+        self._pump()
+        load = await admitted
+
+        try:
+            if load:
+                await asyncio.sleep(self.swap_cost * self.scale)
+            await asyncio.sleep(duration * self.scale)
+        finally:
+            self._active -= 1
+            self._pump()
+
+
+def _workload(count: int, rate: float, seed: int) -> List[Tuple[float, str, float]]:
+    """(arrival time, model, generation time) for interleaved code and diagram calls"""
+    rng = random.Random(seed)
+    now = 0.0
+    jobs = []
+    for _ in range(count):
+        now += rng.expovariate(rate)
+        if rng.random() < 0.5:
+            jobs.append((now, CODE_MODEL, rng.uniform(4.0, 12.0)))
+        else:
+            jobs.append((now, VISION_MODEL, rng.uniform(8.0, 22.0)))
+    return jobs
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+async def _run(args, scheduled: bool) -> Dict[str, object]:
+    gpu = SimulatedGPU(args.swap_cost, args.parallel, args.time_scale)
+    scheduler = None
+    if scheduled:
+        scheduler = ModelScheduler(
+            batch_window=args.batch_window * args.time_scale,
+            max_wait=args.max_wait * args.time_scale,
+            max_concurrency=args.parallel,
+            keep_alive=-1
+        )
+
+    latencies: Dict[str, List[float]] = {CODE_MODEL: [], VISION_MODEL: []}
+    start = time.monotonic()
+
+    async def request(arrival: float, model: str, duration: float):
+        await asyncio.sleep(max(arrival * args.time_scale - (time.monotonic() - start), 0))
+        submitted = time.monotonic()
+        if scheduler is None:
+            await gpu.generate(model, duration)
+        else:
+            await scheduler.run(model, lambda keep_alive: gpu.generate(model, duration))
+        latencies[model].append((time.monotonic() - submitted) / args.time_scale)
+
+    await asyncio.gather(*(
+        request(*job) for job in _workload(args.requests, args.rate, args.seed)
+    ))
+
+    every = latencies[CODE_MODEL] + latencies[VISION_MODEL]
+    return {
+        "mode": "scheduled" if scheduled else "fifo",
+        "swaps": gpu.swaps,
+        "p50": _percentile(every, 50),
+        "p95": _percentile(every, 95),
+        "p95_code": _percentile(latencies[CODE_MODEL], 95),
+        "p95_vision": _percentile(latencies[VISION_MODEL], 95),
+        "max": max(every),
+        "makespan": (time.monotonic() - start) / args.time_scale,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=0.25, help="Arrivals per simulated second")
+    parser.add_argument("--swap-cost", type=float, default=10.0, help="Model load time (s)")
+    parser.add_argument("--parallel", type=int, default=4, help="Concurrent requests per model")
+    parser.add_argument("--batch-window", type=float, default=1.0)
+    parser.add_argument("--max-wait", type=float, default=30.0)
+    parser.add_argument("--time-scale", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    print(
+        f"{args.requests} requests at {args.rate}/s, swap cost {args.swap_cost}s, "
+        f"{args.parallel} parallel slots"
+    )
+    print(f"{'mode':<10} {'swaps':>6} {'p50':>8} {'p95':>8} {'p95 code':>9} {'p95 vis':>8} {'max':>8} {'makespan':>9}")
+    for scheduled in (False, True):
+        r = asyncio.run(_run(args, scheduled))
+        print(
+            f"{r['mode']:<10} {r['swaps']:>6} {r['p50']:>8.1f} {r['p95']:>8.1f} "
+            f"{r['p95_code']:>9.1f} {r['p95_vision']:>8.1f} {r['max']:>8.1f} {r['makespan']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Payload Benchmark
+Memory and latency of building, sending and decoding the largest allowed analysis payloads
+
+Usage:
+    python -m benchmarks.payload_benchmark
+    python -m benchmarks.payload_benchmark --skip-end-to-end --rounds 10
+
+Payloads: a code submission at the schema limit (1,000,000 characters in
+CODE_MAX_LINES lines) and a raster diagram at MAX_UPLOAD_SIZE.
+
+The first part compares the stdlib path (str.format prompt, base64 text,
+json.dumps(...).encode() body, json response decode and render) with the
+orjson path the services use (SegmentedText prompt and base64 slices
+spliced by encode_json, orjson decode, ORJSONResponse). Peak memory is the
+tracemalloc peak above what was allocated before the step; time is the
+median of --rounds untraced runs.
+
+The second part runs CodeAnalyzerService and DiagramAnalyzerService end to
+end against the fake Ollama server (in its own process, so its decoding is
+not traced) and reports the same two numbers per analysis.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import structlog
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production-use")
+
+from benchmarks.fake_ollama import CANNED_ANALYSIS  # noqa: E402
+from benchmarks.load_test import BACKEND_DIR, CODE_SAMPLES, free_port  # noqa: E402
+
+MAX_CODE_CHARS = 1_000_000  # CodeAnalysisRequest.code max_length
+
+
+def _largest_code() -> str:
+    """Code at the length limit in CODE_MAX_LINES lines, with quotes and tabs to escape"""
+    from app.core.config import settings
+
+    width = MAX_CODE_CHARS // settings.CODE_MAX_LINES - 1
+    snippet_lines = [line for _, _, snippet in CODE_SAMPLES for line in snippet.splitlines()]
+    lines = [
+        snippet_lines[i % len(snippet_lines)].ljust(width, " ")[:width]
+        for i in range(settings.CODE_MAX_LINES)
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _largest_image(seed: int) -> bytes:
+    from app.core.config import settings
+
+    # Random bytes, so nothing about the image is cheaper than its size
+    return b"\x89PNG\r\n\x1a\n" + random.Random(seed).randbytes(settings.MAX_UPLOAD_SIZE - 8)
+
+
+def _large_result(findings: int) -> Dict[str, Any]:
+    """An analysis result as the API returns it, with many findings"""
+    vulnerability = json.loads(CANNED_ANALYSIS)["vulnerabilities"][0]
+    return {
+        "analysis_id": "benchmark",
+        "vulnerabilities": [dict(vulnerability, id=f"VULN-{i}") for i in range(findings)],
+        "summary": {"total_issues": findings},
+        "metadata": {"code_hash": "0" * 64},
+    }
+
+
+def _measure(func: Callable[[], Any], rounds: int) -> Tuple[float, float]:
+    """(median ms over untraced rounds, traced peak MB above the starting allocation)"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    del result
+    tracemalloc.stop()
+    return statistics.median(timings) * 1000, peak / 2**20
+
+
+def _steps(code: str, image: bytes) -> List[Tuple[str, Callable[[], Any], Callable[[], Any]]]:
+    """(step, stdlib version, orjson version) of each per-request step"""
+    import orjson
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    from app.core.offload import _b64encode
+    from app.core.serialization import SegmentedText, encode_json
+    from app.services.prompts import CODE_ANALYSIS_PROMPT
+
+    def code_body(prompt: Any) -> Dict[str, Any]:
+        return {"model": "llama3.1:8b", "messages": [{"role": "user", "content": prompt}], "stream": True}
+
+    def image_body(image_data: Any) -> Dict[str, Any]:
+        return {
+            "model": "llava:13b",
+            "messages": [{"role": "user", "content": "Analyze this diagram", "images": [image_data]}],
+            "stream": True
+        }
+
+    # A streamed response: one JSON line per token, as Ollama sends them
+    stream_lines = [
+        json.dumps({"model": "llama3.1:8b", "message": {"role": "assistant", "content": f" token{i}"}, "done": False})
+        for i in range(4096)
+    ]
+    result = _large_result(2000)
+
+    return [
+        (
+            "code request body",
+            lambda: json.dumps(code_body(CODE_ANALYSIS_PROMPT.format(
+                language="python", code=code, filename="app.py"
+            ))).encode(),
+            lambda: encode_json(code_body(SegmentedText.format(
+                CODE_ANALYSIS_PROMPT, language="python", code=code, filename="app.py"
+            )))
+        ),
+        (
+            "image request body",
+            lambda: json.dumps(image_body(base64.b64encode(image).decode())).encode(),
+            lambda: encode_json(image_body(_b64encode(image)))
+        ),
+        (
+            "response stream decode",
+            lambda: [json.loads(line) for line in stream_lines],
+            lambda: [orjson.loads(line) for line in stream_lines]
+        ),
+        (
+            "API response render",
+            lambda: JSONResponse(result).body,
+            lambda: ORJSONResponse(result).body
+        ),
+    ]
+
+
+async def _end_to_end(ollama_url: str, code: str, image: bytes, rounds: int) -> Dict[str, Tuple[float, float]]:
+    from app.core.config import settings
+    from app.services.code_analyzer import CodeAnalyzerService
+    from app.services.diagram_analyzer import DiagramAnalyzerService
+
+    settings.OLLAMA_BASE_URL = ollama_url
+    settings.MODEL_SCHEDULER_ENABLED = False
+    settings.DIAGRAM_CACHE_ENABLED = False
+    code_analyzer = CodeAnalyzerService()
+    diagram_analyzer = DiagramAnalyzerService()
+
+    analyses = {
+        "code analysis": lambda: code_analyzer.analyze(code, "python", "app.py"),
+        "diagram analysis": lambda: diagram_analyzer.analyze(image, "diagram.png", "image/png"),
+    }
+    results = {}
+    for name, analyze in analyses.items():
+        await analyze()  # Warm-up: connections, pools
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            await analyze()
+            timings.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await analyze()
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        results[name] = (statistics.median(timings) * 1000, peak / 2**20)
+
+    for service in (code_analyzer.llm, diagram_analyzer.vision_llm, diagram_analyzer.text_llm):
+        await service.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5, help="Untraced runs per measurement")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-end-to-end", action="store_true")
+    args = parser.parse_args()
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+    code = _largest_code()
+    image = _largest_image(args.seed)
+    print(f"code {len(code):,} characters, image {len(image):,} bytes, {args.rounds} rounds")
+
+    print(f"{'step':<24} {'stdlib ms':>10} {'orjson ms':>10} {'stdlib MB':>10} {'orjson MB':>10}")
+    for step, stdlib, fast in _steps(code, image):
+        stdlib_ms, stdlib_mb = _measure(stdlib, args.rounds)
+        fast_ms, fast_mb = _measure(fast, args.rounds)
+        print(f"{step:<24} {stdlib_ms:>10.1f} {fast_ms:>10.1f} {stdlib_mb:>10.1f} {fast_mb:>10.1f}")
+
+    if args.skip_end_to_end:
+        return
+
+    port = free_port()
+    fake = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_ollama",
+            "--port", str(port), "--tokens-per-second", "100000", "--completion-tokens", "100"
+        ],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        time.sleep(1.0)
+        results = asyncio.run(_end_to_end(f"http://127.0.0.1:{port}", code, image, args.rounds))
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+
+    print(f"{'end to end':<24} {'median ms':>10} {'peak MB':>10}")
+    for name, (ms, mb) in results.items():
+        print(f"{name:<24} {ms:>10.1f} {mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
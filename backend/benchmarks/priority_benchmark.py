@@ -0,0 +1,125 @@
+"""
+Priority Benchmark
+Interactive latency behind CI bursts with FIFO admission, priority + fair share, and shortest-job-first
+
+Usage:
+    python -m benchmarks.priority_benchmark --ci-clients 3 --ci-jobs 80
+
+Several CI clients each submit a burst of large analyses at the start while
+interactive users keep arriving. Generation time grows with prompt size.
+All durations are in simulated seconds; --time-scale sets how many real
+seconds one simulated second takes.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Tuple
+
+import structlog
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production-use")
+
+from app.services.model_scheduler import ModelScheduler  # noqa: E402
+
+MODEL = "llama3.1:8b"
+CHARS_PER_SECOND = 2000.0  # Simulated prompt processing + generation speed
+
+
+def _workload(args) -> List[Tuple[float, str, str, int]]:
+    """(arrival time, client, class, prompt characters) per call"""
+    rng = random.Random(args.seed)
+    jobs = []
+    for c in range(args.ci_clients):
+        for _ in range(args.ci_jobs):
+            jobs.append((rng.uniform(0, args.ci_burst), f"ci-{c}", "ci", rng.randint(2_000, 30_000)))
+
+    now = 0.0
+    horizon = args.ci_clients * args.ci_jobs * 9.0 / args.parallel
+    while now < horizon:
+        now += rng.expovariate(args.interactive_rate)
+        user = f"user-{rng.randrange(args.users)}"
+        jobs.append((now, user, "interactive", rng.randint(1_000, 10_000)))
+    return sorted(jobs)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+async def _run(args, mode: str) -> Dict[str, object]:
+    scheduler = ModelScheduler(
+        batch_window=1.0 * args.time_scale,
+        max_wait=30.0 * args.time_scale,
+        max_concurrency=args.parallel,
+        keep_alive=-1,
+        sjf=mode == "fair+sjf"
+    )
+    latencies: Dict[str, List[float]] = {"interactive": [], "ci": []}
+    start = time.monotonic()
+
+    async def generate(chars: int, keep_alive):
+        await asyncio.sleep((1.0 + chars / CHARS_PER_SECOND) * args.time_scale)
+
+    async def request(arrival: float, client: str, client_class: str, chars: int):
+        await asyncio.sleep(max(arrival * args.time_scale - (time.monotonic() - start), 0))
+        submitted = time.monotonic()
+        if mode == "fifo":
+            await scheduler.run(MODEL, lambda keep_alive: generate(chars, keep_alive))
+        else:
+            await scheduler.run(
+                MODEL,
+                lambda keep_alive: generate(chars, keep_alive),
+                client=client,
+                priority=client_class,
+                cost=chars
+            )
+        latencies[client_class].append((time.monotonic() - submitted) / args.time_scale)
+
+    await asyncio.gather(*(request(*job) for job in _workload(args)))
+
+    return {
+        "mode": mode,
+        "interactive": len(latencies["interactive"]),
+        "p50_interactive": _percentile(latencies["interactive"], 50),
+        "p95_interactive": _percentile(latencies["interactive"], 95),
+        "p95_ci": _percentile(latencies["ci"], 95),
+        "mean_ci": sum(latencies["ci"]) / len(latencies["ci"]),
+        "makespan": (time.monotonic() - start) / args.time_scale,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ci-clients", type=int, default=3)
+    parser.add_argument("--ci-jobs", type=int, default=80, help="Calls per CI client")
+    parser.add_argument("--ci-burst", type=float, default=5.0, help="Seconds over which CI calls arrive")
+    parser.add_argument("--users", type=int, default=5, help="Distinct interactive users")
+    parser.add_argument("--interactive-rate", type=float, default=0.2, help="Interactive arrivals per second")
+    parser.add_argument("--parallel", type=int, default=4, help="Concurrent calls (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--time-scale", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    print(
+        f"{args.ci_clients} CI clients x {args.ci_jobs} calls, interactive at "
+        f"{args.interactive_rate}/s, {args.parallel} parallel slots"
+    )
+    print(f"{'mode':<10} {'n int':>6} {'p50 int':>8} {'p95 int':>8} {'p95 ci':>8} {'mean ci':>8} {'makespan':>9}")
+    for mode in ("fifo", "fair", "fair+sjf"):
+        r = asyncio.run(_run(args, mode))
+        print(
+            f"{r['mode']:<10} {r['interactive']:>6} {r['p50_interactive']:>8.1f} {r['p95_interactive']:>8.1f} "
+            f"{r['p95_ci']:>8.1f} {r['mean_ci']:>8.1f} {r['makespan']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
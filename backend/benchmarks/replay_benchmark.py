@@ -0,0 +1,178 @@
+"""
+Replay Benchmark
+Post-processing overhead of CodeAnalyzerService.analyze on a recorded inference corpus
+
+Usage:
+    python -m benchmarks.replay_benchmark --record --corpus benchmarks/results/code_corpus.jsonl.gz
+    python -m benchmarks.replay_benchmark --corpus benchmarks/results/code_corpus.jsonl.gz
+
+--record runs the sample analyses once against the fake Ollama server (or
+a real one with --ollama-url) with INFERENCE_MODE=record. Without it the
+analyses are replayed from the corpus (INFERENCE_MODE=replay), by default
+without the recorded latency, so what is measured is everything around
+the model call: prompt building, scheduling, response parsing, merging,
+metrics and tracing.
+
+The median time per analysis is compared with the baseline file; the
+benchmark exits with status 1 when it is more than --tolerance slower.
+The first run, or --update-baseline, writes the baseline.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import structlog
+
+from benchmarks.fake_ollama import CANNED_ANALYSIS, FakeOllama
+from benchmarks.load_test import code_payload
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def _samples(args) -> List[dict]:
+    """The analyses to run; the same seed always gives the same inputs (and fingerprints)"""
+    return [code_payload(random.Random(args.seed * 1_000_003 + i), i, args.code_repeat) for i in range(args.samples)]
+
+
+def _configure(args):
+    """Settings are read at import, so they are set before the app is imported"""
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production-use")
+    os.environ["INFERENCE_MODE"] = "record" if args.record else "replay"
+    os.environ["INFERENCE_CORPUS_PATH"] = str(args.corpus)
+    os.environ["INFERENCE_REPLAY_LATENCY_SCALE"] = str(args.latency_scale)
+    os.environ["INFERENCE_BACKEND"] = "ollama"
+    if args.ollama_url:
+        os.environ["OLLAMA_BASE_URL"] = args.ollama_url
+
+
+async def _record(args):
+    from app.services.code_analyzer import CodeAnalyzerService
+
+    analyzer = CodeAnalyzerService()
+    try:
+        for sample in _samples(args):
+            await analyzer.analyze(sample["code"], sample["language"], sample["filename"])
+    finally:
+        await analyzer.llm.close()
+
+
+async def _replay(args) -> Dict[str, object]:
+    from app.services.code_analyzer import CodeAnalyzerService
+
+    analyzer = CodeAnalyzerService()
+    samples = _samples(args)
+    per_round: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    try:
+        for round_number in range(args.warmup + args.rounds):
+            started = time.perf_counter()
+            for sample in samples:
+                result = await analyzer.analyze(
+                    sample["code"], sample["language"], sample["filename"], include_timings=True
+                )
+                if round_number >= args.warmup:
+                    for stage, ms in result["metadata"]["timings"].items():
+                        stages.setdefault(stage, []).append(ms)
+            if round_number >= args.warmup:
+                per_round.append((time.perf_counter() - started) / len(samples))
+    finally:
+        await analyzer.llm.close()
+
+    return {
+        "per_analysis_us": round(statistics.median(per_round) * 1e6, 1),
+        "stages_us": {stage: round(statistics.median(ms) * 1000, 1) for stage, ms in sorted(stages.items())},
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=RESULTS_DIR / "code_corpus.jsonl.gz")
+    parser.add_argument("--record", action="store_true", help="Record the corpus instead of replaying it")
+    parser.add_argument("--ollama-url", help="Record against this server instead of the fake")
+    parser.add_argument("--samples", type=int, default=50, help="Distinct analyses")
+    parser.add_argument("--code-repeat", type=int, default=20, help="Largest number of times a snippet repeats")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--rounds", type=int, default=7, help="Measured passes over the samples")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured passes first")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="Replay latency multiplier")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "replay_baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+    _configure(args)
+
+    if args.record:
+        if args.corpus.exists():
+            args.corpus.unlink()
+        fake = None if args.ollama_url else FakeOllama(
+            tokens_per_second=2000.0,
+            completion_tokens=100,
+            response_text=CANNED_ANALYSIS
+        ).start()
+        if fake is not None:
+            os.environ["OLLAMA_BASE_URL"] = fake.url
+        try:
+            asyncio.run(_record(args))
+        finally:
+            if fake is not None:
+                fake.stop()
+        print(f"recorded {args.samples} analyses to {args.corpus} ({args.corpus.stat().st_size} bytes)")
+        return
+
+    result = asyncio.run(_replay(args))
+    print(f"{args.samples} analyses x {args.rounds} rounds replayed from {args.corpus}")
+    print(f"{'stage':<22} {'median us':>10}")
+    for stage, us in result["stages_us"].items():
+        print(f"{stage:<22} {us:>10.1f}")
+    print(f"{'per analysis':<22} {result['per_analysis_us']:>10.1f}")
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "samples": args.samples,
+        "seed": args.seed,
+        **result,
+    }
+    if args.update_baseline or not args.baseline.exists():
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(record, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    if (baseline.get("samples"), baseline.get("seed")) != (args.samples, args.seed):
+        sys.exit(f"{args.baseline} was measured on other samples; rerun with --update-baseline")
+    ratio = result["per_analysis_us"] / baseline["per_analysis_us"]
+    print(
+        f"baseline {baseline['per_analysis_us']:.1f} us ({baseline.get('git_revision')}): "
+        f"{ratio - 1:+.1%} (tolerance {args.tolerance:+.0%})"
+    )
+    if ratio > 1 + args.tolerance:
+        print("REGRESSION: post-processing overhead exceeds the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Test Configuration
+Settings for running the backend against the fake Ollama server, without Redis or a database
+"""
+
+import os
+
+# Settings are read at import time, so they are set before the app is imported
+os.environ.setdefault("SECRET_KEY", "test-secret-key-not-for-production-use")
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("USAGE_LEDGER_BACKEND", "memory")
+os.environ.setdefault("ANALYSIS_STORE_ENABLED", "false")
+os.environ.setdefault("WARMUP_ENABLED", "false")
+# Schedulers are per process and would outlive each test's event loop
+os.environ.setdefault("MODEL_SCHEDULER_ENABLED", "false")
+
+import pytest  # noqa: E402
+
+from benchmarks.fake_ollama import FakeOllama  # noqa: E402
+
+
+@pytest.fixture
+def fake():
+    """A fake Ollama / OpenAI-compatible server generating 20 tokens a response"""
+    with FakeOllama(
+        tokens_per_second=10_000,
+        completion_tokens=20,
+        prompt_tokens=321,
+        response_text='{"vulnerabilities": [], "secrets": []}'
+    ) as server:
+        yield server
@@ -0,0 +1,57 @@
+"""
+Analysis Store Tests
+Rows stored for code and manifest analyses match the response summary
+"""
+
+import uuid
+
+from app.services.analysis_store import _rows
+from app.services.report_writers import DEPENDENCY_RULE
+
+
+def _manifest_result():
+    return {
+        "analysis_id": str(uuid.uuid4()),
+        "timestamp": "2026-01-01T00:00:00",
+        "language": "python",
+        "vulnerabilities": [],
+        "summary": {"total_issues": 3, "critical": 1, "high": 1, "medium": 0, "low": 0, "info": 0},
+        "dependencies": [
+            {"name": "django", "version": "2.0", "vulnerabilities": 4, "severity": "CRITICAL"},
+            {"name": "requests", "version": "2.0", "vulnerabilities": 1, "severity": "HIGH"},
+            {"name": "left-pad", "version": "1.0", "vulnerabilities": 1, "severity": "UNKNOWN"},
+        ],
+        "metadata": {"filename": "requirements.txt", "analysis_mode": "dependency_index", "ai_model": None},
+    }
+
+
+def test_manifest_counts_follow_the_summary():
+    analysis_row, finding_rows = _rows("code", "team-a", _manifest_result())
+
+    assert analysis_row["total_issues"] == 3
+    assert (analysis_row["model"], analysis_row["prompt_version"]) == (None, None)
+    assert (analysis_row["critical"], analysis_row["high"]) == (1, 1)
+    assert [row[4] for row in finding_rows] == [DEPENDENCY_RULE] * 3
+    assert [row[6] for row in finding_rows] == ["CRITICAL", "HIGH", "OTHER"]
+    assert finding_rows[0][8] == "requirements.txt"
+
+
+def test_model_findings_are_stored_one_row_each():
+    result = {
+        "analysis_id": str(uuid.uuid4()),
+        "timestamp": "2026-01-01T00:00:00",
+        "language": "python",
+        "vulnerabilities": [
+            {"id": "CWE-89", "title": "SQL Injection", "severity": "HIGH", "location": {"line": 3}},
+            {"id": "CWE-798", "title": "Hard-coded Credentials", "severity": "medium"},
+        ],
+        "summary": {"total_issues": 2, "critical": 0, "high": 1, "medium": 1, "low": 0, "info": 0},
+        # Dependencies the model mentions are not counted in its summary
+        "dependencies": [{"name": "flask", "version": "0.1", "severity": "HIGH"}],
+        "metadata": {"analysis_mode": "llm", "ai_model": "llama3.1:8b", "prompt_version": "0123456789abcdef"},
+    }
+    analysis_row, finding_rows = _rows("code", "team-a", result)
+
+    assert (analysis_row["model"], analysis_row["prompt_version"]) == ("llama3.1:8b", "0123456789abcdef")
+    assert (analysis_row["total_issues"], analysis_row["high"], analysis_row["medium"]) == (2, 1, 1)
+    assert [(row[4], row[6], row[9]) for row in finding_rows] == [("CWE-89", "HIGH", 3), ("CWE-798", "MEDIUM", None)]
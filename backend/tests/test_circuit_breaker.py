@@ -0,0 +1,116 @@
+"""
+Circuit Breaker Tests
+Closed / open / half-open transitions of the per-backend breaker
+"""
+
+import pytest
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def _call(breaker: CircuitBreaker, failed: bool = False, duration: float = 0.1):
+    trial = breaker.acquire()
+    breaker.record(trial, duration, failed)
+    return trial
+
+
+def _opened(half_open_calls: int = 1) -> CircuitBreaker:
+    breaker = CircuitBreaker(
+        "test", window_size=4, min_calls=4, failure_rate=0.5, slow_call_seconds=10,
+        slow_call_rate=0.75, open_seconds=30, half_open_calls=half_open_calls
+    )
+    for failed in (False, True, False, True):
+        _call(breaker, failed)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_on_failure_rate_once_the_window_fills(clock):
+    breaker = CircuitBreaker("test", window_size=4, min_calls=4, failure_rate=0.5)
+    for _ in range(3):
+        _call(breaker, failed=True)
+    assert breaker.state == CLOSED
+    _call(breaker, failed=True)
+    assert breaker.state == OPEN
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = CircuitBreaker("test", window_size=4, min_calls=4, slow_call_seconds=10, slow_call_rate=0.75)
+    for duration in (11, 12, 0.5, 10):
+        _call(breaker, duration=duration)
+    assert breaker.state == OPEN
+
+
+def test_open_rejects_until_open_seconds_pass(clock):
+    breaker = _opened()
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as rejected:
+        breaker.acquire()
+    assert rejected.value.retry_after == pytest.approx(20)
+    assert breaker.is_open()
+
+    clock.now += 20
+    assert not breaker.is_open()
+    assert breaker.acquire() is True
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_admits_limited_trials_and_closes_on_success(clock):
+    breaker = _opened(half_open_calls=2)
+    clock.now += 30
+    first, second = breaker.acquire(), breaker.acquire()
+    assert first and second
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+    breaker.record(first, 0.1, failed=False)
+    assert breaker.state == HALF_OPEN
+    breaker.record(second, 0.1, failed=False)
+    assert breaker.state == CLOSED
+    assert _call(breaker) is False
+
+
+@pytest.mark.parametrize("failed, duration", [(True, 0.1), (False, 10)])
+def test_failed_or_slow_trial_reopens(clock, failed, duration):
+    breaker = _opened()
+    clock.now += 30
+    _call(breaker, failed, duration)
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == pytest.approx(30)
+
+
+def test_released_trial_frees_its_slot(clock):
+    breaker = _opened()
+    clock.now += 30
+    trial = breaker.acquire()
+    assert breaker.is_open()
+    breaker.release(trial)
+    assert not breaker.is_open()
+    assert breaker.acquire() is True
+
+
+def test_calls_admitted_before_opening_do_not_count(clock):
+    breaker = _opened()
+    clock.now += 30
+    trial = breaker.acquire()
+    # A call that started while closed ends during the trial
+    breaker.record(False, 0.1, failed=True)
+    assert breaker.state == HALF_OPEN
+    breaker.record(trial, 0.1, failed=False)
+    assert breaker.state == CLOSED
@@ -0,0 +1,97 @@
+"""
+Request Decompression Tests
+gzip / zstd request bodies under the decoded size and compression ratio limits
+"""
+
+import gzip
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.middleware.decompression import RATIO_CHECK_MIN_BYTES, RequestDecompressionMiddleware
+
+MAX_SIZE = 4 * 1024 * 1024
+
+
+async def _echo(request: Request) -> JSONResponse:
+    body = await request.body()
+    return JSONResponse({
+        "length": len(body),
+        "content_length": request.headers.get("content-length"),
+        "content_encoding": request.headers.get("content-encoding"),
+        "head": body[:16].decode("latin-1")
+    })
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[Route("/", _echo, methods=["POST"])])
+    app.add_middleware(RequestDecompressionMiddleware, max_size=MAX_SIZE, max_ratio=100)
+    with TestClient(app) as client:
+        yield client
+
+
+def _post(client, body: bytes, encoding: str):
+    return client.post("/", content=body, headers={"Content-Encoding": encoding})
+
+
+def test_decoded_body_reaches_the_app(client):
+    response = _post(client, gzip.compress(b'{"code": "x = 1"}'), "gzip")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "length": 17, "content_length": "17", "content_encoding": None, "head": '{"code": "x = 1"'
+    }
+
+
+def test_concatenated_gzip_members(client):
+    response = _post(client, gzip.compress(b"first ") + gzip.compress(b"second"), "gzip")
+    assert response.json()["head"] == "first second"
+
+
+def test_zstd(client):
+    try:
+        from compression.zstd import compress
+    except ImportError:
+        from backports.zstd import compress
+
+    response = _post(client, compress(b"zstd body"), "zstd")
+    assert response.json()["head"] == "zstd body"
+
+
+def test_decoded_size_limit(client):
+    # Random bytes barely compress, so only the size limit applies
+    response = _post(client, gzip.compress(os.urandom(MAX_SIZE + 1), compresslevel=1), "gzip")
+    assert response.status_code == 413
+    assert "exceeds" in response.json()["detail"]
+
+
+def test_compression_ratio_limit(client):
+    # Zeros compress about 1000:1, above the ratio limit once past RATIO_CHECK_MIN_BYTES
+    bomb = gzip.compress(bytes(2 * RATIO_CHECK_MIN_BYTES))
+    response = _post(client, bomb, "gzip")
+    assert response.status_code == 413
+    assert "ratio" in response.json()["detail"]
+
+    # Small bodies are not held to the ratio
+    assert _post(client, gzip.compress(bytes(RATIO_CHECK_MIN_BYTES // 2)), "gzip").status_code == 200
+
+
+def test_invalid_and_truncated_bodies(client):
+    assert _post(client, b"not gzip at all", "gzip").status_code == 400
+    assert _post(client, gzip.compress(b"x" * 1000)[:-10], "gzip").status_code == 400
+
+
+def test_unsupported_encoding(client):
+    response = _post(client, b"body", "br")
+    assert response.status_code == 415
+    assert "gzip" in response.headers["accept-encoding"]
+
+
+def test_identity_is_passed_through(client):
+    assert _post(client, b"plain", "identity").json()["head"] == "plain"
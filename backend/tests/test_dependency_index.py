@@ -0,0 +1,134 @@
+"""
+Dependency Index Tests
+Version ordering and OSV range matching against a freshly built index
+"""
+
+import json
+
+import pytest
+
+from app.services.dependency_index import DependencyIndex, build_index
+from app.services.dependency_manifests import NPM, PYPI, ManifestDependency, version_key
+
+ADVISORIES = [
+    {
+        # Two ranges, the second only fixed in a later minor release
+        "id": "GHSA-1111", "aliases": ["CVE-2024-0001"], "summary": "SQL injection",
+        "database_specific": {"severity": "HIGH"},
+        "affected": [{"package": {"ecosystem": "PyPI", "name": "Django"}, "ranges": [{
+            "type": "ECOSYSTEM",
+            "events": [{"introduced": "0"}, {"fixed": "3.2.25"}, {"introduced": "4.0"}, {"fixed": "4.2.11"}]
+        }]}]
+    },
+    {
+        # The same CVE from another database
+        "id": "PYSEC-2024-1", "aliases": ["CVE-2024-0001"], "summary": "SQL injection",
+        "affected": [{"package": {"ecosystem": "PyPI", "name": "django"}, "ranges": [{
+            "type": "ECOSYSTEM", "events": [{"introduced": "4.0"}, {"fixed": "4.2.11"}]
+        }]}]
+    },
+    {
+        "id": "GHSA-2222", "summary": "Prototype pollution",
+        "database_specific": {"severity": "MODERATE"},
+        "affected": [{"package": {"ecosystem": "npm", "name": "left-pad"}, "ranges": [{
+            "type": "SEMVER", "events": [{"introduced": "1.0.0-beta.2"}, {"last_affected": "1.3.0"}]
+        }]}]
+    },
+    {
+        "id": "GHSA-3333", "summary": "No fix yet",
+        "affected": [
+            {"package": {"ecosystem": "npm", "name": "abandoned"}, "ranges": [{
+                "type": "SEMVER", "events": [{"introduced": "2.0.0"}]
+            }]},
+            {"package": {"ecosystem": "npm", "name": "listed"}, "versions": ["0.1.0", "0.1.1"]}
+        ]
+    },
+    {"id": "GHSA-4444", "withdrawn": "2024-01-01T00:00:00Z", "affected": [
+        {"package": {"ecosystem": "PyPI", "name": "requests"}, "versions": ["2.0.0"]}
+    ]},
+]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("osv")
+    for advisory in ADVISORIES:
+        (directory / f"{advisory['id']}.json").write_text(json.dumps(advisory))
+    output = directory / "osv.idx"
+    counts = build_index([str(directory)], str(output))
+    assert counts == {"packages": 4, "ranges": 7, "advisories": 4}
+
+    index = DependencyIndex(str(output))
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize("lower, higher", [
+    ("1.2", "1.10"),
+    ("1.2", "1.2.1"),
+    ("1.2.dev0", "1.2a1"),
+    ("1.2a1", "1.2b1"),
+    ("1.2rc1", "1.2"),
+    ("1.2", "1.2.post1"),
+    ("1.0.0-alpha", "1.0.0-alpha.1"),
+    ("1.0.0-alpha.1", "1.0.0-beta"),
+    ("1.0.0-beta.2", "1.0.0-beta.11"),
+    ("1.0.0-rc.1", "1.0.0"),
+    ("v1.2.3", "1.2.4"),
+])
+def test_version_order(lower, higher):
+    assert version_key(lower) < version_key(higher)
+
+
+@pytest.mark.parametrize("first, second", [("1.2", "1.2.0"), ("v1.2.3", "1.2.3"), ("1.2.3+build.5", "1.2.3")])
+def test_equivalent_versions(first, second):
+    assert version_key(first) == version_key(second)
+
+
+@pytest.mark.parametrize("version, fixed", [
+    ("1.11", "3.2.25"),
+    ("3.2.24", "3.2.25"),
+    ("4.0", "4.2.11"),
+    ("4.2.10", "4.2.11"),
+])
+def test_fixed_ranges(index, version, fixed):
+    [match] = [match for match in index.lookup(PYPI, "django", version) if match.id == "GHSA-1111"]
+    assert (match.fixed, match.severity) == (fixed, "HIGH")
+
+
+@pytest.mark.parametrize("version", ["3.2.25", "3.3", "4.2.11", "5.0"])
+def test_fixed_versions_do_not_match(index, version):
+    assert index.lookup(PYPI, "Django", version) == []
+
+
+def test_last_affected_is_included(index):
+    assert index.lookup(NPM, "left-pad", "1.0.0-beta.1") == []
+    [match] = index.lookup(NPM, "left-pad", "1.3.0")
+    assert (match.last_affected, match.severity) == ("1.3.0", "MEDIUM")
+    assert index.lookup(NPM, "left-pad", "1.3.1") == []
+
+
+def test_open_ranges_and_version_lists(index):
+    assert index.lookup(NPM, "abandoned", "1.9.9") == []
+    assert [match.id for match in index.lookup(NPM, "abandoned", "9.0.0")] == ["GHSA-3333"]
+    assert [match.id for match in index.lookup(NPM, "listed", "0.1.1")] == ["GHSA-3333"]
+    assert index.lookup(NPM, "listed", "0.1.2") == []
+
+
+def test_withdrawn_advisories_are_skipped(index):
+    assert index.lookup(PYPI, "requests", "2.0.0") == []
+
+
+def test_scan_counts_aliases_once(index):
+    [django, abandoned] = index.scan([
+        ManifestDependency(PYPI, "django", "4.1"),
+        ManifestDependency(NPM, "abandoned", "2.1.0"),
+        ManifestDependency(NPM, "left-pad", "2.0.0"),
+    ])
+
+    assert django["advisories"] == ["GHSA-1111", "PYSEC-2024-1"]
+    assert (django["vulnerabilities"], django["severity"]) == (1, "HIGH")
+    assert django["recommendation"] == "Update to django>=4.2.11"
+    assert (abandoned["severity"], abandoned["recommendation"]) == (
+        "UNKNOWN", "No fixed version of abandoned is known; consider replacing it"
+    )
@@ -0,0 +1,48 @@
+"""
+Diagram Cache Tests
+Near-duplicate lookup, confirmation and eviction of the perceptual-hash index
+"""
+
+from app.services.diagram_cache import PerceptualHashIndex, label_set
+
+LABELS = label_set(["Web  Server", "db", "API"])
+
+
+def _index(**limits):
+    return PerceptualHashIndex(**{"max_distance": 6, "max_entries": 10, "max_bytes": 1024, "ttl": 3600, **limits})
+
+
+def test_near_match_needs_the_same_bytes_or_labels():
+    index = _index()
+    index.add("team-a", 0b1011, 1.5, "sha-a", LABELS, b'{"n": 1}')
+
+    # Four bits away, other bytes: near but unconfirmed until the labels agree
+    assert index.lookup("team-a", 0b0100, 1.5, "sha-b") is None
+    assert index.has_near("team-a", 0b0100, 1.5)
+    assert index.lookup("team-a", 0b0100, 1.5, "sha-b", label_set(["web server", "DB", "api"])) == (b'{"n": 1}', 4)
+    assert index.lookup("team-a", 0b0100, 1.5, "sha-b", label_set(["web server"])) is None
+    assert index.lookup("team-a", 0b1011, 1.5, "sha-a") == (b'{"n": 1}', 0)
+
+
+def test_matches_stay_within_the_client_distance_and_shape():
+    index = _index()
+    index.add("team-a", 0, 1.5, "sha-a", LABELS, b"{}")
+
+    assert not index.has_near("team-b", 0, 1.5)
+    assert not index.has_near("team-a", 0b1111111, 1.5)
+    assert not index.has_near("team-a", 0, 2.0)
+
+
+def test_eviction_by_entries_and_bytes():
+    index = _index(max_entries=2)
+    for i in range(3):
+        index.add("team-a", i << 32, 1.0, f"sha-{i}", None, b"x" * 10)
+    assert len(index) == 2
+    assert index.lookup("team-a", 0, 1.0, "sha-0") is None
+
+    index = _index(max_bytes=25)
+    for i in range(3):
+        index.add("team-a", i << 32, 1.0, f"sha-{i}", None, b"x" * 10)
+    assert len(index) == 2
+    index.add("team-a", 1 << 48, 1.0, "sha-large", None, b"x" * 26)
+    assert index.lookup("team-a", 1 << 48, 1.0, "sha-large") is None
@@ -0,0 +1,129 @@
+"""
+Inference Backend Tests
+Ollama and OpenAI-compatible clients against the fake server: streaming, JSON mode and usage accounting
+"""
+
+from urllib.parse import urlsplit
+
+import pytest
+
+from app.services.ollama_service import OllamaService
+from app.services.openai_compat_service import OpenAICompatService
+from app.services.usage_ledger import record_usage, usage_ledger
+
+MODEL = "llama3.1:8b"
+
+BACKENDS = {
+    "ollama": OllamaService,
+    "openai": OpenAICompatService,
+}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+async def service(request, fake):
+    """A client of each backend type pointed at the fake server"""
+    service = BACKENDS[request.param](base_url=fake.url, model=MODEL, fallback_urls=[])
+    yield service
+    await service.close()
+
+
+async def test_streamed_response_is_assembled(service, fake):
+    result = await service.generate(prompt="Analyze this", system_prompt="You are a reviewer")
+
+    assert result.text == fake.response_text
+    assert result.model == MODEL
+    assert result.backend == urlsplit(fake.url).netloc
+
+    body = fake.requests[-1]
+    assert body["stream"] is True
+    assert [message["role"] for message in body["messages"]] == ["system", "user"]
+    assert fake.completed == 1 and fake.aborted == 0
+
+
+async def test_openai_stream_requests_usage(fake):
+    service = OpenAICompatService(base_url=fake.url, model=MODEL, fallback_urls=[])
+    try:
+        await service.generate(prompt="Analyze this")
+    finally:
+        await service.close()
+
+    assert fake.requests[-1]["stream_options"] == {"include_usage": True}
+
+
+@pytest.mark.parametrize("json_mode", [True, False])
+async def test_ollama_json_mode_sets_format(fake, json_mode):
+    service = OllamaService(base_url=fake.url, model=MODEL, fallback_urls=[])
+    try:
+        await service.generate(prompt="Analyze this", json_mode=json_mode)
+    finally:
+        await service.close()
+
+    body = fake.requests[-1]
+    assert body.get("format") == ("json" if json_mode else None)
+    assert "response_format" not in body
+
+
+@pytest.mark.parametrize("json_mode", [True, False])
+async def test_openai_json_mode_sets_response_format(fake, json_mode):
+    service = OpenAICompatService(base_url=fake.url, model=MODEL, fallback_urls=[])
+    try:
+        await service.generate(prompt="Analyze this", json_mode=json_mode)
+    finally:
+        await service.close()
+
+    body = fake.requests[-1]
+    assert body.get("response_format") == ({"type": "json_object"} if json_mode else None)
+    assert "format" not in body
+
+
+async def test_generation_options_follow_the_wire_format(fake):
+    ollama = OllamaService(base_url=fake.url, model=MODEL, fallback_urls=[])
+    openai = OpenAICompatService(base_url=fake.url, model=MODEL, fallback_urls=[])
+    try:
+        await ollama.generate(prompt="Analyze this", temperature=0.2, max_tokens=64)
+        await openai.generate(prompt="Analyze this", temperature=0.2, max_tokens=64)
+    finally:
+        await ollama.close()
+        await openai.close()
+
+    ollama_body, openai_body = fake.requests[-2:]
+    assert ollama_body["options"] == {"temperature": 0.2, "num_predict": 64}
+    assert (openai_body["temperature"], openai_body["max_tokens"]) == (0.2, 64)
+
+
+async def test_usage_is_reported(service, fake):
+    result = await service.generate(prompt="Analyze this")
+
+    assert result.prompt_tokens == fake.prompt_tokens
+    assert result.completion_tokens == fake.completion_tokens
+    assert result.eval_ms > 0
+    assert result.total_ms >= result.prompt_eval_ms + result.eval_ms - 1e-6
+    assert result.gpu_seconds == pytest.approx((result.prompt_eval_ms + result.eval_ms) / 1000)
+
+    usage = result.usage()
+    assert "text" not in usage
+    assert usage["prompt_tokens"] == fake.prompt_tokens
+    assert usage["completion_tokens"] == fake.completion_tokens
+    assert usage["gpu_seconds"] == pytest.approx(result.gpu_seconds, abs=1e-6)
+
+
+async def test_usage_is_charged_to_the_client(service, fake, request):
+    client_id = f"test-{request.node.callspec.id}"
+    first = await service.generate(prompt="Analyze this")
+    second = await service.generate(prompt="Analyze that")
+    await record_usage(client_id, {"generation": first.usage()})
+    await record_usage(client_id, {"generation": second.usage()})
+    await record_usage(client_id, {})  # Served from a cache: no generation
+
+    usage = await usage_ledger.get(client_id)
+    assert usage["requests"] == 3
+    assert usage["cached_requests"] == 1
+    assert usage["prompt_tokens"] == 2 * fake.prompt_tokens
+    assert usage["completion_tokens"] == 2 * fake.completion_tokens
+    assert usage["gpu_seconds"] == pytest.approx(first.gpu_seconds + second.gpu_seconds, abs=1e-3)
+    assert set(usage["gpu_seconds_by_model"]) == {MODEL}
+
+
+async def test_model_availability(service):
+    assert await service.check_model_availability(MODEL)
+    assert not await service.check_model_availability("missing:1b")
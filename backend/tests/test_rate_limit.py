@@ -0,0 +1,80 @@
+"""
+Rate Limit Tests
+Token-bucket charges, settlement and eviction of the in-process buckets
+"""
+
+import pytest
+
+from app.core import rate_limit
+from app.core.rate_limit import Bucket, LocalTokenBuckets, RateLimitExceeded, TokenBucketLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter():
+    limiter = TokenBucketLimiter(LocalTokenBuckets())
+    limiter.buckets = {"interactive": Bucket(capacity=100, refill_rate=10), "ci": Bucket(capacity=400, refill_rate=40)}
+    return limiter
+
+
+async def test_charge_settle_and_refill(limiter, clock):
+    charge = await limiter.acquire("team-a", "interactive", 80)
+    assert charge.remaining == 20
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        await limiter.acquire("team-a", "interactive", 50)
+    assert exceeded.value.retry_after == pytest.approx(3.0)
+
+    # Used 30 tokens of the 80 estimated: 50 are refunded, once
+    await charge.settle(30)
+    await charge.settle(30)
+    assert (await limiter.acquire("team-a", "interactive", 70)).remaining == pytest.approx(0)
+
+    clock.now += 2
+    assert (await limiter.acquire("team-a", "interactive", 20)).remaining == pytest.approx(0)
+
+
+async def test_settle_charges_usage_above_the_estimate(limiter, clock):
+    charge = await limiter.acquire("team-a", "interactive", 10)
+    await charge.settle(60)
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire("team-a", "interactive", 41)
+
+
+async def test_costs_above_capacity_need_a_full_bucket(limiter, clock):
+    assert (await limiter.acquire("team-a", "interactive", 10_000)).charged == 100
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire("team-a", "interactive", 1)
+
+
+async def test_buckets_are_per_client_and_class(limiter, clock):
+    await limiter.acquire("team-a", "interactive", 100)
+    await limiter.acquire("team-b", "interactive", 100)
+    assert (await limiter.acquire("team-a", "ci", 100)).remaining == 300
+
+
+async def test_full_buckets_are_dropped(clock):
+    buckets = LocalTokenBuckets()
+    bucket = Bucket(capacity=100, refill_rate=10)
+    for i in range(1000):
+        await buckets.take(f"client-{i}", bucket, 50)
+    assert len(buckets) == 1000
+
+    # Every bucket has refilled five seconds later
+    clock.now += 5
+    await buckets.take("client-new", bucket, 50)
+    assert len(buckets) == 1
+    assert (await buckets.take("client-0", bucket, 100)).allowed
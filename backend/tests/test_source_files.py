@@ -0,0 +1,90 @@
+"""
+Source File Tests
+Archive walking under the entry, file and expanded size limits
+"""
+
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from app.services.source_files import read_archive
+
+LIMITS = dict(include_manifests=False, max_files=10, max_total=1 << 20, max_entries=100, max_expanded=1 << 20)
+
+
+class _Zeros(io.RawIOBase):
+    """Reads as n zero bytes without holding them in memory"""
+
+    def __init__(self, n: int):
+        self.left = n
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), self.left)
+        buffer[:n] = bytes(n)
+        self.left -= n
+        return n
+
+
+def _tgz(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz", compresslevel=1) as archive:
+        for name, size, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            archive.addfile(info, io.BytesIO(content) if content is not None else _Zeros(size))
+    return buffer.getvalue()
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_reads_source_files_from_tar_and_zip():
+    members = [("app/main.py", b"print('hi')\n"), ("README.md", b"# readme\n")]
+    for data in (_tgz([(name, len(content), content) for name, content in members]), _zip(members)):
+        files, skipped = read_archive(data, **LIMITS)
+        assert files == [("app/main.py", "print('hi')\n")]
+        assert skipped == []
+
+
+def test_tar_member_expanding_past_the_limit_is_rejected_before_decompression():
+    # A few hundred KB compressed, 64 MB expanded: the walk must stop at its header
+    data = _tgz([("blob.bin", 64 << 20, None)])
+    assert len(data) < 1 << 20
+
+    with pytest.raises(ValueError, match="expands to more than"):
+        read_archive(data, **LIMITS)
+
+
+def test_entry_limit():
+    members = [(f"dir/{i}.txt", b"x") for i in range(LIMITS["max_entries"] + 1)]
+    with pytest.raises(ValueError, match="entries"):
+        read_archive(_zip(members), **LIMITS)
+    with pytest.raises(ValueError, match="entries"):
+        read_archive(_tgz([(name, 1, content) for name, content in members]), **LIMITS)
+
+
+def test_source_file_limits():
+    too_many = [(f"src/{i}.py", b"x = 1\n") for i in range(LIMITS["max_files"] + 1)]
+    with pytest.raises(ValueError, match="source files"):
+        read_archive(_zip(too_many), **LIMITS)
+
+    too_large = [("src/a.py", b"#" * (LIMITS["max_total"] // 2 + 1)), ("src/b.py", b"#" * (LIMITS["max_total"] // 2 + 1))]
+    with pytest.raises(ValueError, match="exceed"):
+        read_archive(_zip(too_large), **LIMITS)
+
+
+def test_members_outside_the_archive_are_ignored():
+    files, _ = read_archive(_zip([("../evil.py", b"x = 1\n"), ("/abs.py", b"y = 2\n")]), **LIMITS)
+    assert files == [("abs.py", "y = 2\n")]
+
+
+def test_not_an_archive():
+    with pytest.raises(ValueError, match="Not a readable"):
+        read_archive(b"definitely not an archive", **LIMITS)
@@ -0,0 +1,77 @@
+"""
+SVG Topology Tests
+Component and connection extraction, expat hardening and parser limits
+"""
+
+import pytest
+
+from app.services import svg_topology
+from app.services.svg_topology import SVGTopologyError, UnsafeSVGError, extract_svg_topology
+
+DIAGRAM = b"""<svg xmlns="http://www.w3.org/2000/svg" width="400" height="200">
+  <rect x="10" y="10" width="100" height="60"/><text x="60" y="40">Web Server</text>
+  <g transform="translate(250, 0)">
+    <rect x="10" y="10" width="100" height="60"/><text x="60" y="40">Database</text>
+  </g>
+  <line x1="110" y1="40" x2="260" y2="40" marker-end="url(#arrow)"/>
+  <text x="185" y="35">TCP 5432</text>
+</svg>"""
+
+
+def _svg(body: str) -> bytes:
+    return f'<svg xmlns="http://www.w3.org/2000/svg">{body}</svg>'.encode()
+
+
+def test_extracts_components_and_labelled_edges():
+    topology = extract_svg_topology(DIAGRAM)
+
+    assert [component.name for component in topology.components] == ["Web Server", "Database"]
+    [edge] = topology.edges
+    assert (edge.source, edge.target, edge.directed, edge.label) == ("C1", "C2", True, "TCP 5432")
+    assert "C1 Web Server -> C2 Database [TCP 5432]" in topology.to_prompt()
+
+
+@pytest.mark.parametrize("document", [
+    # Entity expansion ("billion laughs")
+    b'<?xml version="1.0"?><!DOCTYPE svg [<!ENTITY a "aaaaaaaaaa"><!ENTITY b "&a;&a;&a;&a;&a;">]>'
+    b'<svg xmlns="http://www.w3.org/2000/svg"><text>&b;</text></svg>',
+    # External entity (XXE)
+    b'<?xml version="1.0"?><!DOCTYPE svg [<!ENTITY x SYSTEM "file:///etc/passwd">]>'
+    b'<svg xmlns="http://www.w3.org/2000/svg"><text>&x;</text></svg>',
+    # Parameter entity pulling in an external DTD
+    b'<?xml version="1.0"?><!DOCTYPE svg [<!ENTITY % dtd SYSTEM "http://169.254.169.254/x.dtd"> %dtd;]>'
+    b'<svg xmlns="http://www.w3.org/2000/svg"/>',
+])
+def test_entity_declarations_are_rejected(document):
+    with pytest.raises(UnsafeSVGError):
+        extract_svg_topology(document)
+
+
+def test_element_count_is_capped():
+    with pytest.raises(SVGTopologyError, match="too many elements"):
+        extract_svg_topology(_svg("<g/>" * svg_topology.SVG_MAX_ELEMENTS))
+
+
+def test_nesting_depth_is_capped():
+    depth = svg_topology.SVG_MAX_DEPTH + 1
+    with pytest.raises(SVGTopologyError, match="too deep"):
+        extract_svg_topology(_svg("<g>" * depth + "</g>" * depth))
+
+
+def test_connector_points_are_capped():
+    points = " ".join(f"{i},{i}" for i in range(svg_topology.SVG_MAX_CONNECTOR_POINTS + 1))
+    with pytest.raises(SVGTopologyError, match="too many points"):
+        extract_svg_topology(_svg(f'<polyline points="{points}"/>'))
+
+
+def test_label_length_is_capped():
+    topology = extract_svg_topology(_svg(
+        '<rect x="0" y="0" width="2000" height="100"/>'
+        f'<text x="10" y="50">{"x" * 10 * svg_topology.SVG_MAX_LABEL_LENGTH}</text>'
+    ))
+    assert len(topology.components[0].name) == svg_topology.SVG_MAX_LABEL_LENGTH
+
+
+def test_malformed_svg():
+    with pytest.raises(SVGTopologyError, match="Invalid SVG"):
+        extract_svg_topology(b"<svg><rect></svg>")